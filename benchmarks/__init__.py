@@ -0,0 +1 @@
+"""Benchmarks of this tool's own hot paths, run with `python -m benchmarks`"""
@@ -0,0 +1,140 @@
+"""
+Run the benchmarks and compare them against the stored baselines
+
+    python -m benchmarks              # fail if anything regressed
+    python -m benchmarks --save       # store new baselines
+    python -m benchmarks find/        # only benchmarks starting with find/
+
+Each time is divided by the time of a fixed calibration workload,
+measured right before the benchmark, and those relative times are what
+is compared. That way baselines recorded on one machine are usable on
+another that is uniformly faster or slower, and a machine that slows
+down during the run (e.g. from thermal throttling) doesn't show up as
+regressions.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+from .suite import BENCHMARKS
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'baseline.json')
+REPEAT = 5
+
+# Times that look like regressions are measured again up to this many
+# times, keeping the best, to rule out noise from other processes
+RETRIES = 2
+
+
+def calibration():
+    def workload():
+        sorted(str(value) for value in range(20000))
+    return measure(workload)
+
+
+def measure(function):
+    """Return the best time of a single call to function, in seconds"""
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    return min(timer.repeat(REPEAT, number)) / number
+
+
+def format_time(seconds):
+    for unit, scale in [('s', 1), ('ms', 1e3), ('us', 1e6)]:
+        if seconds * scale >= 1:
+            return '{:.2f}{}'.format(seconds * scale, unit)
+    return '{:.0f}ns'.format(seconds * 1e9)
+
+
+def run(setup):
+    """
+    Set up a benchmark in a new temporary directory and measure it,
+    returning its time in seconds and relative to the calibration workload
+    """
+    tmp = tempfile.mkdtemp(prefix='this-bench-')
+    cache_home = os.environ.get('XDG_CACHE_HOME')
+    os.environ['XDG_CACHE_HOME'] = os.path.join(tmp, 'cache')
+    try:
+        function = setup(tmp)
+        reference = calibration()
+        seconds = measure(function)
+        return dict(seconds=seconds, relative=seconds / reference)
+    finally:
+        if cache_home is None:
+            del os.environ['XDG_CACHE_HOME']
+        else:
+            os.environ['XDG_CACHE_HOME'] = cache_home
+        shutil.rmtree(tmp)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks')
+    parser.add_argument('names', nargs='*',
+                        help='only run benchmarks starting with these')
+    parser.add_argument('--save', action='store_true',
+                        help='store the results as the new baselines')
+    parser.add_argument('--tolerance', type=float, default=30,
+                        help='percent slower than the baseline that '
+                        'counts as a regression (default: 30)')
+    args = parser.parse_args()
+
+    try:
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        baseline = dict(benchmarks={})
+
+    results = {}
+    regressions = []
+    width = max(len(name) for name, setup in BENCHMARKS)
+    for name, setup in BENCHMARKS:
+        if args.names and not name.startswith(tuple(args.names)):
+            continue
+
+        previous = baseline['benchmarks'].get(name)
+        change = None
+        for attempt in range(RETRIES + 1):
+            result = run(setup)
+            if name not in results or (result['relative'] <
+                                       results[name]['relative']):
+                results[name] = result
+            if previous is None:
+                break
+            change = (results[name]['relative'] /
+                      previous['relative'] - 1) * 100
+            if change <= args.tolerance:
+                break
+
+        line = '{}  {:>10}'.format(name.ljust(width),
+                                   format_time(results[name]['seconds']))
+        if change is not None:
+            line += '  {:+6.0f}%'.format(change)
+            if change > args.tolerance:
+                line += '  REGRESSED'
+                regressions.append(name)
+        print(line, flush=True)
+
+    if args.save:
+        benchmarks = dict(baseline['benchmarks'], **{
+            name: {key: float('{:.4g}'.format(value))
+                   for key, value in result.items()}
+            for name, result in results.items()})
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump(dict(benchmarks=dict(sorted(benchmarks.items()))),
+                      f, indent=4)
+            f.write('\n')
+        print('Saved baselines to ' + BASELINE_PATH)
+    elif regressions:
+        print('{} benchmark(s) regressed by more than {:.0f}%: {}'.format(
+            len(regressions), args.tolerance, ', '.join(regressions)))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
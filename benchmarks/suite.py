@@ -0,0 +1,145 @@
+"""
+The benchmarks. Each one is a setup function registered with @benchmark
+that builds what it needs under a temporary directory and returns the
+function to time.
+"""
+
+import os
+import subprocess
+import sys
+
+from thiscli.project import PROJECT_TYPES, Project, project_class
+from thiscli.project import format_command
+from . import trees
+
+BENCHMARKS = []
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def benchmark(name):
+    def decorator(setup):
+        BENCHMARKS.append((name, setup))
+        return setup
+    return decorator
+
+
+def in_directory(path, function):
+    def run():
+        cwd = os.getcwd()
+        os.chdir(path)
+        try:
+            return function()
+        finally:
+            os.chdir(cwd)
+    return run
+
+
+def run_cli(cwd, cache_dir, *args):
+    subprocess.run([sys.executable, '-m', 'thiscli'] + list(args), cwd=cwd,
+                   env=dict(os.environ, XDG_CACHE_HOME=cache_dir,
+                            PYTHONPATH=ROOT),
+                   stdout=subprocess.DEVNULL, check=True)
+
+
+@benchmark('startup/python')
+def python_startup(tmp):
+    # For reference, as it is included in every other startup benchmark
+    return lambda: subprocess.run([sys.executable, '-c', 'pass'], check=True)
+
+
+@benchmark('startup/import')
+def import_startup(tmp):
+    return lambda: subprocess.run([sys.executable, '-c', 'import thiscli.cli'],
+                                  env=dict(os.environ, PYTHONPATH=ROOT),
+                                  check=True)
+
+
+@benchmark('startup/cli-cold')
+def cold_startup(tmp):
+    path = trees.project_tree(os.path.join(tmp, 'project'), ['Makefile'])
+    runs = []
+
+    def run():
+        # A new cache directory each time, as on the first run
+        runs.append(None)
+        run_cli(path, os.path.join(tmp, 'cache{}'.format(len(runs))))
+    return run
+
+
+@benchmark('startup/cli-warm')
+def warm_startup(tmp):
+    path = trees.project_tree(os.path.join(tmp, 'project'), ['Makefile'])
+    cache_dir = os.path.join(tmp, 'cache')
+    run_cli(path, cache_dir)
+    return lambda: run_cli(path, cache_dir)
+
+
+@benchmark('find/deep')
+def find_deep(tmp):
+    path = trees.deep_tree(tmp, depth=40)
+    return in_directory(path, Project.find)
+
+
+@benchmark('find/wide')
+def find_wide(tmp):
+    # The glob marker of .NET projects requires listing the directory
+    path = trees.wide_tree(tmp, files=10000)
+    return in_directory(path, Project.find)
+
+
+@benchmark('find/cached')
+def find_cached(tmp):
+    path = trees.deep_tree(tmp, depth=40)
+    in_directory(path, Project.find_cached)()
+    return in_directory(path, Project.find_cached)
+
+
+@benchmark('find/monorepo')
+def find_monorepo(tmp):
+    from thiscli.monorepo import Monorepo
+    path = trees.monorepo_tree(tmp, PROJECT_TYPES, copies=10)
+    return in_directory(path, Monorepo.find)
+
+
+for module, name, markers in PROJECT_TYPES:
+    def constructor(tmp, module=module, name=name, markers=markers):
+        path = trees.project_tree(os.path.join(tmp, module), markers)
+        cls = project_class(module, name)
+        return lambda: cls(path)
+
+    # Every project type is also found from the top of a tree of each
+    # type, to cover each marker's place in the detection order
+    def find(tmp, markers=markers):
+        path = trees.deep_tree(tmp, depth=5, markers=markers)
+        return in_directory(path, lambda: Project.find_one_of(*PROJECT_TYPES))
+
+    benchmark('construct/' + module)(constructor)
+    benchmark('find/' + module)(find)
+
+
+@benchmark('format_command')
+def format_commands(tmp):
+    commands = [('make', None, None, None),
+                (['git', 'commit', '-m', 'a message with spaces'], 'src',
+                 None, None),
+                ('npm run build', None, {'NODE_ENV': 'production'}, None),
+                ('pytest', None, {'A': '1'}, 'pipenv run')]
+    return lambda: [format_command(*command) for command in commands]
+
+
+@benchmark('tmux/plan')
+def tmux_plan(tmp):
+    from thiscli.tmux import Tmux, tmux_line
+    path = trees.project_tree(os.path.join(tmp, 'laravel'), ['artisan'])
+    project = project_class('laravel', 'LaravelProject')(path)
+
+    def plan():
+        tmux = Tmux(path)
+        with tmux.pane():
+            project.cmd('php artisan serve')
+        with tmux.pane():
+            project.npm.cmd('npm run watch', cwd='.',
+                            env={'NODE_ENV': 'development'})
+        return [tmux_line(pane) for pane in tmux.panes]
+    return plan
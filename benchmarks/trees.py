@@ -0,0 +1,81 @@
+"""Synthetic project trees for the benchmarks"""
+
+import os
+
+# Minimal contents of each marker file that the project constructors
+# are able to parse
+MARKER_CONTENTS = {
+    'configure.ac': 'AC_INIT([bench], [1.0])\n',
+    'meson.build': "project('bench', 'c')\n",
+    'CMakeLists.txt': 'project(bench)\n',
+    'Makefile': 'all:\n\ttrue\n\ntest:\n\ttrue\n\ndeploy:\n\ttrue\n',
+    'artisan': '#!/usr/bin/env php\n',
+    'package.json': '{"scripts": {"build": "true", "test": "true", '
+                    '"lint": "true", "start": "true"}}\n',
+    'setup.py': 'from setuptools import setup\nsetup(name="bench")\n',
+    'requirements.txt': 'flask\npytest\n',
+    'requirements.in': 'flask\n',
+    'Pipfile': '[packages]\nflask = "*"\n',
+    'Cargo.toml': '[package]\nname = "bench"\n',
+    'build.gradle': "apply plugin: 'java'\n",
+    'bench.csproj': '<Project Sdk="Microsoft.NET.Sdk" />\n',
+    'ansible': None,
+}
+
+
+def write(path, contents=''):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if contents is None:
+        os.makedirs(path, exist_ok=True)
+    else:
+        with open(path, 'w') as f:
+            f.write(contents)
+
+
+def marker_file(markers):
+    """Return a concrete file name for a project type's marker globs"""
+    return next(name for name in MARKER_CONTENTS
+                if any(name == marker or
+                       (marker.startswith('*') and name.endswith(marker[1:]))
+                       for marker in markers))
+
+
+def project_tree(root, markers):
+    """A project with one of markers, as used by its project type"""
+    name = marker_file(markers)
+    write(os.path.join(root, name), MARKER_CONTENTS[name])
+    if name == 'artisan':
+        write(os.path.join(root, 'package.json'),
+              MARKER_CONTENTS['package.json'])
+    elif name == 'setup.py':
+        write(os.path.join(root, 'bench', '__init__.py'))
+    return root
+
+
+def deep_tree(root, depth, markers=('Cargo.toml',)):
+    """A project with the working directory nested depth levels deep"""
+    project_tree(root, markers)
+    path = os.path.join(root, *['level{}'.format(index)
+                                for index in range(depth)])
+    os.makedirs(path)
+    return path
+
+
+def wide_tree(root, files, marker='bench.csproj'):
+    """A project directory containing thousands of other files"""
+    for index in range(files):
+        write(os.path.join(root, 'file{}.cs'.format(index)))
+    write(os.path.join(root, marker), MARKER_CONTENTS[marker])
+    return root
+
+
+def monorepo_tree(root, project_types, copies):
+    """A repository with copies of a project of each of project_types"""
+    write(os.path.join(root, '.gitignore'), 'dist/\n')
+    for copy in range(copies):
+        for module, name, markers in project_types:
+            path = os.path.join(root, 'packages', '{}{}'.format(module, copy))
+            project_tree(path, markers)
+            write(os.path.join(path, 'src', 'main.txt'))
+            write(os.path.join(path, 'dist', 'output.txt'))
+    return root
@@ -14,7 +14,7 @@ setup(
     author_email='sonrisesoftware@gmail.com',
     url='https://github.com/ibelieve/this',
     license='MIT',
-    packages=find_packages(exclude=['tests']),
+    packages=find_packages(exclude=['tests', 'benchmarks']),
     include_package_data=True,
     install_requires=[
         'Click',
@@ -26,6 +26,6 @@ setup(
     tests_require=['pytest', 'pytest-mock'],
     entry_points='''
         [console_scripts]
-        this=thiscli:cli
+        this=thiscli:main
     ''',
 )
@@ -21,21 +21,25 @@ def setup_dir(mocker, *files):
         return files_in_dir
 
     mocker.patch('os.getcwd', new=lambda: cwd)
+    mocker.patch('thiscli.project.available_cpus', return_value=(8, False))
     mocker.patch('os.path.exists', new=lambda path: path in files)
     mocker.patch('os.listdir', new=listdir)
 
 
 @contextmanager
-def runs_commands(*commands):
+def runs_commands(*commands, ordered=True):
     commands = list(commands)
     ran_commands = []
 
     def run_command(self, cmd, cwd=None, env=None, env_echo=None,
-                    echo=True, shell=None):
+                    echo=True, shell=None, capture=False):
         from thiscli.project import format_command, echo_command
         echo_command(cmd, cwd, env, env_echo)
         ran_commands.append(format_command(cmd, cwd, env, env_echo))
 
     with patch.object(Project, 'cmd', new=run_command):
         yield
-    assert ran_commands == commands
+    if ordered:
+        assert ran_commands == commands
+    else:
+        assert sorted(ran_commands) == sorted(commands)
@@ -0,0 +1,102 @@
+import subprocess
+
+import pytest
+
+from thiscli.affected import affected_tests, changed_files
+from thiscli.project.python import PythonPipenv, PythonProject
+
+
+def git(root, *args):
+    subprocess.run(['git', '-c', 'user.name=Test', '-c',
+                    'user.email=test@example.com'] + list(args),
+                   cwd=str(root), check=True, stdout=subprocess.DEVNULL)
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    root = tmp_path / 'project'
+    for package in ['pkg', 'tests']:
+        (root / package).mkdir(parents=True)
+        (root / package / '__init__.py').touch()
+    (root / 'setup.py').write_text('from setuptools import setup\n')
+    (root / 'README.md').write_text('# Project\n')
+    (root / 'pkg' / 'a.py').write_text('A = 1\n')
+    (root / 'pkg' / 'b.py').write_text('from . import a\n')
+    (root / 'tests' / 'test_a.py').write_text('from pkg.a import A\n')
+    (root / 'tests' / 'test_b.py').write_text('import pkg.b\n')
+    (root / 'tests' / 'test_c.py').write_text('import os\n')
+    git(root, 'init', '-q')
+    git(root, 'add', '.')
+    git(root, 'commit', '-q', '-m', 'Initial commit')
+    return root
+
+
+def affected(root):
+    return affected_tests(str(root), ['pkg', 'tests'],
+                          changed_files(str(root)))
+
+
+def test_tests_importing_changed_modules_are_affected(project):
+    (project / 'pkg' / 'a.py').write_text('A = 2\n')
+    assert affected(project) == (['tests/test_a.py', 'tests/test_b.py'],
+                                 None)
+
+    git(project, 'commit', '-q', '-am', 'Change a')
+    (project / 'pkg' / 'b.py').write_text('from . import a  # changed\n')
+    assert affected(project) == (['tests/test_b.py'], None)
+
+
+def test_changes_since_ref(project):
+    (project / 'tests' / 'test_c.py').write_text('import sys\n')
+    git(project, 'commit', '-q', '-am', 'Change test_c')
+    assert changed_files(str(project)) == []
+    assert changed_files(str(project), since='HEAD~1') == [
+        'tests/test_c.py']
+
+
+def test_documentation_affects_no_tests(project):
+    (project / 'README.md').write_text('# Changed\n')
+    assert affected(project) == ([], None)
+
+
+@pytest.mark.parametrize('path', ['setup.py', 'tests/conftest.py',
+                                  'requirements-dev.txt', 'pkg/data.json'])
+def test_setup_and_data_files_affect_every_test(project, path):
+    (project / path).write_text('\n')
+    assert affected(project) == (None, path + ' changed')
+
+
+def test_changes_unknown_outside_git(tmp_path):
+    assert changed_files(str(tmp_path)) is None
+
+
+def test_top_level_modules_are_followed(project):
+    (project / 'helpers.py').write_text('X = 1\n')
+    (project / 'app.py').write_text('import helpers\n')
+    (project / 'tests' / 'test_app.py').write_text('import app\n')
+    git(project, 'add', '.')
+    git(project, 'commit', '-q', '-m', 'Add app')
+
+    (project / 'helpers.py').write_text('X = 2\n')
+    assert affected(project) == (['tests/test_app.py'], None)
+
+
+def test_python_files_outside_the_graph_affect_every_test(project):
+    (project / 'scripts').mkdir()
+    (project / 'scripts' / 'tool.py').write_text('\n')
+    assert affected(project) == (
+        None, "scripts/tool.py isn't in the import graph")
+
+
+def test_affected_tests_run_in_pipenv(project, mocker):
+    (project / 'Pipfile').write_text('[dev-packages]\npytest = "*"\n')
+    git(project, 'add', '.')
+    git(project, 'commit', '-q', '-m', 'Use Pipenv')
+    cmd = mocker.patch.object(PythonProject, 'cmd', return_value=0)
+    mocker.patch.object(PythonPipenv, 'ensure_deps')
+
+    (project / 'pkg' / 'b.py').write_text('from . import a  # changed\n')
+    PythonProject(str(project)).test_affected(since=None)
+    cmd.assert_called_once_with(['pipenv', 'run', 'python', '-m', 'pytest',
+                                 'tests/test_b.py'])
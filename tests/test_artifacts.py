@@ -0,0 +1,191 @@
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import io
+import os
+import shutil
+import subprocess
+import tarfile
+import threading
+
+import pytest
+
+from thiscli import artifacts
+from thiscli.project import Project
+
+
+class BuildProject(Project):
+    description = 'Build'
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    root = tmp_path / 'project'
+    root.mkdir()
+    (root / 'main.c').write_text('int main() { return 0; }\n')
+    return BuildProject(str(root))
+
+
+def build(project, builds):
+    def run():
+        builds.append(project.cwd)
+        os.makedirs(project.path('build', 'bin'), exist_ok=True)
+        with open(project.path('build', 'bin', 'main'), 'w') as f:
+            f.write('built from ' + open(project.path('main.c')).read())
+        return 0
+    return artifacts.cached_build(project, run, ['build', 'dist'])
+
+
+def test_outputs_are_restored_for_the_same_inputs(project, capsys):
+    builds = []
+    build(project, builds)
+    built = open(project.path('build', 'bin', 'main')).read()
+
+    os.remove(project.path('build', 'bin', 'main'))
+    with open(project.path('build', 'stale'), 'w') as f:
+        f.write('from another build\n')
+    build(project, builds)
+
+    assert len(builds) == 1
+    assert open(project.path('build', 'bin', 'main')).read() == built
+    assert not os.path.exists(project.path('build', 'stale'))
+    assert 'Restored build from the artifact cache' in capsys.readouterr().out
+
+
+def test_changed_inputs_are_built(project):
+    builds = []
+    build(project, builds)
+    with open(project.path('main.c'), 'w') as f:
+        f.write('int main() { return 1; }\n')
+    build(project, builds)
+    assert len(builds) == 2
+
+
+def test_failed_builds_are_not_cached(project, tmp_path):
+    artifacts.cached_build(project, lambda: 2, ['build'])
+    assert not (tmp_path / 'cache' / 'this' / 'artifacts').exists()
+
+
+def test_tracked_output_dirs_are_inputs(project, capsys):
+    subprocess.run(['git', 'init', '-q', project.cwd], check=True)
+    os.mkdir(project.path('build'))
+    config = project.path('build', 'webpack.config.js')
+    with open(config, 'w') as f:
+        f.write('v1\n')
+    subprocess.run(['git', 'add', '.'], cwd=project.cwd, check=True)
+
+    def bundle():
+        os.makedirs(project.path('dist'), exist_ok=True)
+        with open(project.path('dist', 'app.js'), 'w') as f:
+            f.write('built with ' + open(config).read())
+        return 0
+
+    artifacts.cached_build(project, bundle, ['dist', 'build'])
+    with open(config, 'w') as f:
+        f.write('v2\n')
+    artifacts.cached_build(project, bundle, ['dist', 'build'])
+    assert open(config).read() == 'v2\n'
+    assert open(project.path('dist', 'app.js')).read() == 'built with v2\n'
+
+    with open(config, 'w') as f:
+        f.write('v1\n')
+    artifacts.cached_build(project, bundle, ['dist', 'build'])
+    assert open(project.path('dist', 'app.js')).read() == 'built with v1\n'
+    assert 'Restored dist from the artifact cache' in capsys.readouterr().out
+
+    # Archives of other outputs, e.g. from before build/ was tracked
+    archive = project.path('..', 'old.tar.gz')
+    artifacts.create_archive(project, ['build'], archive)
+    with pytest.raises(ValueError):
+        artifacts.restore_archive(project, archive, ['dist'])
+
+
+def test_large_outputs_are_not_archived(project, tmp_path, monkeypatch,
+                                        mocker):
+    create_archive = mocker.spy(artifacts, 'create_archive')
+    monkeypatch.setattr(artifacts, 'MAX_INCREMENTAL_SIZE', 10)
+    build(project, [])
+    assert create_archive.call_count == 1
+
+    # An incremental build over MAX_INCREMENTAL_SIZE
+    with open(project.path('main.c'), 'w') as f:
+        f.write('int main() { return 1; }\n')
+    build(project, [])
+    assert create_archive.call_count == 1
+
+    # A build from scratch larger than the cache
+    monkeypatch.setenv('THIS_ARTIFACT_CACHE_SIZE', '10')
+    with open(project.path('main.c'), 'w') as f:
+        f.write('int main() { return 2; }\n')
+    shutil.rmtree(project.path('build'))
+    build(project, [])
+    assert create_archive.call_count == 1
+
+
+def test_least_recently_used_archives_are_evicted(tmp_path):
+    store = artifacts.LocalStore(str(tmp_path / 'store'), max_size=250)
+    for key in ['a', 'b', 'c']:
+        archive = tmp_path / key
+        archive.write_bytes(b'x' * 100)
+        store.put(key, str(archive))
+        os.utime(store.path(key), (ord(key), ord(key)))
+        if key == 'b':
+            # a is used again, so b is now the least recently used
+            store.get('a')
+
+    assert store.get('a') is not None
+    assert store.get('b') is None
+    assert store.get('c') is not None
+
+
+def test_unsafe_archives_are_rejected(tmp_path):
+    with tarfile.open(str(tmp_path / 'bad.tar.gz'), 'w:gz') as archive:
+        info = tarfile.TarInfo('build/../../escaped')
+        info.size = 1
+        archive.addfile(info, io.BytesIO(b'x'))
+
+    with tarfile.open(str(tmp_path / 'bad.tar.gz'), 'r:gz') as archive:
+        with pytest.raises(ValueError):
+            artifacts.safe_members(archive)
+
+
+class ArtifactServer(BaseHTTPRequestHandler):
+    archives = {}
+
+    def do_GET(self):
+        data = self.archives.get(self.path)
+        self.send_response(200 if data is not None else 404)
+        self.end_headers()
+        if data is not None:
+            self.wfile.write(data)
+
+    def do_PUT(self):
+        length = int(self.headers['Content-Length'])
+        self.archives[self.path] = self.rfile.read(length)
+        self.send_response(201)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def test_http_backend_shares_outputs(project, tmp_path, monkeypatch):
+    server = HTTPServer(('127.0.0.1', 0), ArtifactServer)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv('THIS_ARTIFACT_CACHE_URL', 'http://127.0.0.1:{}/cache'
+                       .format(server.server_address[1]))
+
+    builds = []
+    try:
+        build(project, builds)
+        assert len(ArtifactServer.archives) == 1
+
+        # Another machine, with an empty local cache
+        monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'other-cache'))
+        os.rename(project.path('build'), str(tmp_path / 'first-build'))
+        build(project, builds)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert len(builds) == 1
+    assert os.path.exists(project.path('build', 'bin', 'main'))
@@ -0,0 +1,31 @@
+import pytest
+
+from thiscli.project import Project
+from thiscli.project.cargo import CargoProject
+from thiscli.project.meson import MesonProject
+
+
+@pytest.fixture
+def project_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    root = tmp_path / 'project'
+    root.mkdir()
+    (root / '.git').mkdir()
+    (root / 'Cargo.toml').touch()
+    monkeypatch.chdir(root)
+    return root
+
+
+def test_find_cached_reuses_detected_project(project_dir, mocker):
+    assert isinstance(Project.find_cached(), CargoProject)
+
+    find_one_of = mocker.patch.object(Project, 'find_one_of')
+    assert isinstance(Project.find_cached(), CargoProject)
+    find_one_of.assert_not_called()
+
+
+def test_find_cached_redetects_when_markers_change(project_dir):
+    assert isinstance(Project.find_cached(), CargoProject)
+
+    (project_dir / 'meson.build').touch()
+    assert isinstance(Project.find_cached(), MesonProject)
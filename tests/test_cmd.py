@@ -0,0 +1,57 @@
+import time
+
+import pytest
+
+from thiscli.project import Project, TIMEOUT_EXIT_CODE
+
+
+class ScriptProject(Project):
+    description = 'Script'
+
+
+@pytest.fixture
+def project(tmp_path):
+    return ScriptProject(str(tmp_path))
+
+
+def test_run_command_returns_result_without_exiting(project, capsys):
+    result = project.run_command('echo out; exit 3', shell=True,
+                                 capture=True)
+
+    assert result.returncode == 3
+    assert not result.ok
+    assert result.lines == ['out']
+    assert not result.timed_out
+    assert capsys.readouterr().out.splitlines() == ['$ echo out; exit 3',
+                                                    'out']
+
+
+def test_run_command_dry_run(project):
+    project.dry_run = True
+    assert project.run_command('false') is None
+
+
+def test_command_terminated_with_children_after_timeout(project, capsys):
+    start = time.monotonic()
+    with pytest.raises(SystemExit) as exit:
+        project.cmd('sh -c "sleep 10"; sleep 10', shell=True, timeout=0.2)
+
+    assert time.monotonic() - start < 5
+    assert exit.value.code == TIMEOUT_EXIT_CODE
+    assert 'Timed out after 0.2s' in capsys.readouterr().out
+
+
+def test_project_timeout_applies_to_every_command(project):
+    project.timeout = 0.2
+    result = project.run_command('sleep 10')
+    assert result.timed_out
+    assert result.returncode == TIMEOUT_EXIT_CODE
+
+
+def test_timeout_must_be_positive():
+    from click.testing import CliRunner
+    from thiscli.cli import cli
+
+    result = CliRunner().invoke(cli, ['--timeout', '0', 'info'])
+    assert result.exit_code == 2
+    assert 'must be greater than 0' in result.output
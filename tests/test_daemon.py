@@ -0,0 +1,87 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+from thiscli import client, daemon, inotify
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def this(cwd, env, *args):
+    return subprocess.run([sys.executable, '-m', 'thiscli'] + list(args),
+                          cwd=cwd, env=env, stdout=subprocess.PIPE,
+                          stderr=subprocess.STDOUT, encoding='utf-8')
+
+
+@pytest.fixture
+def env(tmp_path):
+    return dict(os.environ, PYTHONPATH=ROOT,
+                XDG_CACHE_HOME=str(tmp_path / 'cache'),
+                XDG_RUNTIME_DIR=str(tmp_path / 'run'))
+
+
+@pytest.fixture
+def running_daemon(tmp_path, env):
+    proc = subprocess.Popen([sys.executable, '-m', 'thiscli', 'daemon'],
+                            cwd=str(tmp_path), env=env,
+                            stdout=subprocess.DEVNULL)
+    path = tmp_path / 'run' / 'this-daemon.sock'
+    deadline = time.monotonic() + 10
+    while not path.exists() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    yield proc
+    proc.terminate()
+    proc.wait()
+
+
+def test_requests_pass_fds(tmp_path):
+    server, sock = socket.socketpair()
+    with server, sock, open(str(tmp_path / 'out'), 'w') as out:
+        client.send_request(sock, {'args': ['build']}, fds=[out.fileno()])
+        request, fds = daemon.receive_request(server)
+        os.write(fds[0], b'written by the daemon\n')
+        os.close(fds[0])
+
+    assert request == {'args': ['build']}
+    assert (tmp_path / 'out').read_text() == 'written by the daemon\n'
+
+
+def test_commands_run_in_daemon(tmp_path, env, running_daemon):
+    project = tmp_path / 'project'
+    project.mkdir()
+    (project / 'Makefile').write_text(
+        "all:\n\t@cut -d' ' -f5 /proc/$$$$/stat > built\n"
+        'test:\n\t@exit 3\n')
+
+    result = this(str(project), env, 'build')
+    assert result.returncode == 0
+    assert '$ make -j' in result.stdout
+    # Run in the process group of a process forked from the daemon,
+    # rather than in this one as the client would
+    assert int((project / 'built').read_text()) != os.getpgrp()
+
+    assert this(str(project), env, 'test').returncode == 2
+
+
+def test_falls_back_without_daemon(tmp_path, env):
+    (tmp_path / 'Makefile').write_text('all:\n\t@echo built\n')
+    result = this(str(tmp_path), env, 'build')
+    assert result.returncode == 0
+    assert 'built' in result.stdout.splitlines()
+
+
+def test_inotify_reports_new_files(tmp_path):
+    try:
+        watcher = inotify.Inotify()
+    except OSError:
+        pytest.skip('inotify is not available')
+
+    watcher.watch_path(str(tmp_path))
+    (tmp_path / 'Makefile').write_text('all:\n')
+    events = watcher.read()
+    watcher.close()
+    assert (str(tmp_path), inotify.IN_CREATE, 'Makefile') in events
@@ -0,0 +1,104 @@
+import pytest
+
+from thiscli.deps import DependencyStamp
+from thiscli.project.nodejs import NodejsProject, MANIFESTS
+
+
+@pytest.fixture
+def nodejs_project(tmp_path):
+    (tmp_path / 'package.json').write_text('{"scripts": {}}')
+    (tmp_path / 'package-lock.json').write_text('{}')
+    return NodejsProject(str(tmp_path))
+
+
+def test_stamp_outdated_until_installed(nodejs_project, tmp_path):
+    stamp = DependencyStamp(nodejs_project, MANIFESTS, 'node_modules')
+    assert stamp.outdated()
+
+    (tmp_path / 'node_modules').mkdir()
+    assert stamp.outdated()
+
+    stamp.save()
+    assert not stamp.outdated()
+
+
+def test_stamp_outdated_when_lockfile_changes(nodejs_project, tmp_path):
+    (tmp_path / 'node_modules').mkdir()
+    stamp = DependencyStamp(nodejs_project, MANIFESTS, 'node_modules')
+    stamp.save()
+
+    (tmp_path / 'package-lock.json').write_text('{"lockfileVersion": 2}')
+    assert stamp.outdated()
+
+
+def test_stamp_only_saved_after_successful_install(nodejs_project, tmp_path):
+    (tmp_path / 'node_modules').mkdir()
+    stamp = DependencyStamp(nodejs_project, MANIFESTS, 'node_modules')
+
+    stamp.install(lambda: 1)
+    assert stamp.outdated()
+
+    stamp.install(lambda: 0)
+    assert not stamp.outdated()
+
+
+@pytest.fixture
+def yarn_project(tmp_path, mocker):
+    mocker.patch('thiscli.project.nodejs.has_command', return_value=True)
+    (tmp_path / 'package.json').write_text('{"scripts": {}}')
+    (tmp_path / 'yarn.lock').write_text('')
+    return NodejsProject(str(tmp_path))
+
+
+def test_frozen_install_for_new_checkouts(nodejs_project, yarn_project,
+                                          tmp_path, monkeypatch):
+    monkeypatch.delenv('CI', raising=False)
+    assert nodejs_project.install_args() == ['ci', '--prefer-offline']
+    assert yarn_project.install_args() == [
+        'install', '--frozen-lockfile', '--prefer-offline']
+
+    (tmp_path / 'node_modules').mkdir()
+    assert nodejs_project.install_args() == ['install', '--prefer-offline']
+    assert yarn_project.install_args() == ['install', '--prefer-offline']
+
+    monkeypatch.setenv('CI', 'true')
+    assert nodejs_project.install_args() == ['ci', '--prefer-offline']
+
+    (tmp_path / '.yarnrc.yml').touch()
+    assert yarn_project.install_args() == ['install', '--immutable']
+
+
+def test_install_uses_the_shared_cache(nodejs_project, tmp_path, monkeypatch,
+                                       mocker, capsys):
+    monkeypatch.delenv('CI', raising=False)
+    monkeypatch.setenv('THIS_NODE_CACHE', str(tmp_path / 'cache'))
+    npm = mocker.patch.object(NodejsProject, 'npm', return_value=0)
+
+    nodejs_project.ensure_deps()
+    npm.assert_called_once_with(
+        ['ci', '--prefer-offline'],
+        env={'npm_config_cache': str(tmp_path / 'cache' / 'npm')})
+    assert 'Installed dependencies in ' in capsys.readouterr().out
+
+
+def test_installs_without_node_modules_are_stamped(
+        nodejs_project, yarn_project, tmp_path, monkeypatch, mocker):
+    monkeypatch.delenv('CI', raising=False)
+    monkeypatch.delenv('THIS_NODE_CACHE', raising=False)
+    npm = mocker.patch.object(NodejsProject, 'npm', return_value=0)
+
+    # npm without any dependencies
+    nodejs_project.ensure_deps()
+    nodejs_project.ensure_deps()
+    assert npm.call_count == 1
+
+    # Yarn Plug'n'Play
+    (tmp_path / '.yarnrc.yml').write_text('enableGlobalCache: true\n')
+    assert yarn_project.installed_dir() == '.yarn'
+    yarn_project.ensure_deps()
+    yarn_project.ensure_deps()
+    assert npm.call_args_list[1:] == [mocker.call(['install', '--immutable'],
+                                                  env=None)]
+
+    (tmp_path / '.yarnrc.yml').write_text('nodeLinker: node-modules\n')
+    assert yarn_project.installed_dir() == 'node_modules'
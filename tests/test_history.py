@@ -0,0 +1,112 @@
+import pytest
+
+from thiscli import history, timings
+from thiscli.project import Project
+
+
+class ScriptProject(Project):
+    description = 'Script'
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'history.sqlite3')
+
+
+@pytest.fixture
+def recorder():
+    yield timings.enable()
+    timings.recorder = None
+
+
+def add_run(db, cwd, duration, commands, exit_code=0):
+    invocation = db.execute(
+        'INSERT INTO invocations (time, project_type, cwd, action, '
+        'duration, exit_code) VALUES (?, ?, ?, ?, ?, ?)',
+        (len(db.execute('SELECT id FROM invocations').fetchall()),
+         'ScriptProject', cwd, 'build', duration, exit_code))
+    for command, command_duration in commands.items():
+        db.execute('INSERT INTO commands (invocation_id, job, command, '
+                   'duration, exit_code) VALUES (?, ?, ?, ?, 0)',
+                   (invocation.lastrowid, '', command, command_duration))
+
+
+def test_git_head_follows_branch_refs(tmp_path):
+    git_dir = tmp_path / '.git'
+    (git_dir / 'refs' / 'heads').mkdir(parents=True)
+    (git_dir / 'HEAD').write_text('ref: refs/heads/main\n')
+    (git_dir / 'packed-refs').write_text('# pack-refs\n'
+                                         'abc123 refs/heads/main\n')
+    (tmp_path / 'src').mkdir()
+
+    assert history.git_head(str(tmp_path / 'src')) == 'abc123'
+
+    (git_dir / 'refs' / 'heads' / 'main').write_text('def456\n')
+    assert history.git_head(str(tmp_path)) == 'def456'
+
+
+def test_records_action_and_its_commands(tmp_path, db_path, recorder,
+                                         mocker):
+    mocker.patch('thiscli.history.history_path', return_value=db_path)
+    project = ScriptProject(str(tmp_path))
+
+    with pytest.raises(SystemExit):
+        with history.recording(project, 'test'):
+            project.cmd('true')
+            project.cmd('exit 3', shell=True)
+
+    db = history.connect(db_path)
+    assert db.execute('SELECT project_type, cwd, action, exit_code '
+                      'FROM invocations').fetchall() == [
+        ('ScriptProject', str(tmp_path), 'test', 3)]
+    assert db.execute('SELECT command, exit_code FROM commands '
+                      'ORDER BY rowid').fetchall() == [
+        ('true', 0), ('exit 3', 3)]
+
+
+def test_repeated_runs_record_only_their_commands(tmp_path, db_path,
+                                                  recorder, mocker):
+    mocker.patch('thiscli.history.history_path', return_value=db_path)
+    project = ScriptProject(str(tmp_path))
+
+    # As with --watch, which runs the action again in the same process
+    for cmd in ['echo first', 'echo second']:
+        with history.recording(project, 'build'):
+            project.cmd(cmd)
+
+    db = history.connect(db_path)
+    assert db.execute('SELECT invocation_id, command FROM commands '
+                      'ORDER BY rowid').fetchall() == [
+        (1, 'echo first'), (2, 'echo second')]
+
+
+def test_dry_runs_are_not_recorded(tmp_path, db_path, mocker):
+    mocker.patch('thiscli.history.history_path', return_value=db_path)
+    project = ScriptProject(str(tmp_path))
+    project.dry_run = True
+
+    with history.recording(project, 'build'):
+        project.cmd('true')
+
+    db = history.connect(db_path)
+    assert db.execute('SELECT * FROM invocations').fetchall() == []
+
+
+def test_regressions_compare_recent_runs_to_earlier_ones(db_path):
+    db = history.connect(db_path)
+    for index in range(10):
+        add_run(db, '/project', 10, {'compile': 8, 'link': 2})
+    for index in range(history.RECENT_RUNS):
+        add_run(db, '/project', 15, {'compile': 13, 'link': 2.1})
+
+    assert history.regressions(db, '/project', 0.2) == [
+        ('build', '', 'compile', 8, 13)]
+    assert history.trend(history.action_stats(db, '/project')['build']) == \
+        pytest.approx(0.5)
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert history.percentile(values, 50) == 50
+    assert history.percentile(values, 90) == 90
+    assert history.percentile([3.0], 99) == 3.0
@@ -0,0 +1,97 @@
+import pytest
+
+from thiscli.lintcache import lint_files, split_by_file, flake8_exit_code
+from thiscli.project.python import PythonProject
+
+
+@pytest.fixture
+def python_project(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    root = tmp_path / 'project'
+    (root / 'pkg').mkdir(parents=True)
+    (root / 'setup.py').touch()
+    (root / 'pkg' / '__init__.py').touch()
+    (root / 'pkg' / 'a.py').write_text('X=1\n')
+    (root / 'pkg' / 'b.py').write_text('from . import a\n')
+    (root / 'pkg' / 'c.py').write_text('Y = 2\n')
+    return PythonProject(str(root))
+
+
+class FakeLinter:
+    def __init__(self, output):
+        self.output = output
+        self.commands = []
+
+    def __call__(self, cmd):
+        self.commands.append(cmd)
+        files = cmd.split()[1:]
+        lines = [line for line in self.output
+                 if any(line.startswith(filename + ':') or
+                        line.startswith(filename + '/')
+                        for filename in files)]
+        return (1 if lines else 0), lines
+
+
+def lint(project, linter, **kwargs):
+    files = ['pkg/__init__.py', 'pkg/a.py', 'pkg/b.py', 'pkg/c.py']
+    with pytest.raises(SystemExit) as exit:
+        lint_files(project, 'flake8', 'flake8', ['pkg'], files, linter,
+                   flake8_exit_code, **kwargs)
+        raise SystemExit(0)
+    return exit.value.code
+
+
+def test_lint_files_replays_unchanged_files(python_project, capsys):
+    linter = FakeLinter(['pkg/a.py:1:2: E225 missing whitespace'])
+
+    assert lint(python_project, linter) == 1
+    capsys.readouterr()
+
+    assert lint(python_project, linter) == 1
+    assert linter.commands == ['flake8 pkg']
+    assert capsys.readouterr().out.splitlines() == [
+        '$ flake8 pkg (cached)', 'pkg/a.py:1:2: E225 missing whitespace']
+
+
+def test_lint_files_relints_changed_files(python_project):
+    linter = FakeLinter([])
+    lint(python_project, linter, follow_imports=True)
+
+    with open(python_project.path('pkg', 'a.py'), 'w') as f:
+        f.write('X = 1\n')
+
+    assert lint(python_project, linter, follow_imports=True) == 0
+    assert linter.commands == ['flake8 pkg', 'flake8 pkg/a.py pkg/b.py']
+
+
+def test_split_by_file_groups_module_headers():
+    lines = ['************* Module pkg.a',
+             'pkg/a.py:1:0: C0114: Missing module docstring',
+             'pkg/b.py:3:0: E0602: Undefined variable']
+
+    assert split_by_file(lines, ['pkg/a.py', 'pkg/b.py']) == {
+        'pkg/a.py': lines[:2],
+        'pkg/b.py': lines[2:],
+    }
+    assert split_by_file(['Traceback (most recent call last):'],
+                         ['pkg/a.py']) is None
+
+
+def test_pylint_lints_every_file_when_one_changed(python_project, mocker):
+    commands = []
+
+    def env_cmd(cmd, capture=False):
+        commands.append(cmd)
+        return (0, []) if capture else 0
+    mocker.patch.object(python_project, 'env_cmd', side_effect=env_cmd)
+    python_project.jobs = 2
+
+    python_project.lint(fix=False)
+    python_project.lint(fix=False)
+    with open(python_project.path('pkg', 'c.py'), 'w') as f:
+        f.write('X = 1\n')
+    python_project.lint(fix=False)
+
+    # Duplicate code is only found by linting c.py along with a.py
+    assert [cmd for cmd in commands if cmd.startswith('pylint')] == [
+        'pylint --jobs=2 --score=n pkg', 'pylint --jobs=2 --score=n pkg']
@@ -0,0 +1,79 @@
+import pytest
+
+from thiscli.project import make
+from thiscli.project.make import MakeProject, makefile_targets
+from . import runs_commands
+
+MAKEFILE = '''\
+PREFIX ?= /usr/local
+CFLAGS := -O2
+include rules.mk
+-include missing.mk
+
+.PHONY: all test
+all: app docs
+
+app: main.o \\
+        util.o
+\t$(CC) -o $@ $^
+
+%.o: %.c
+\t$(CC) -c $<
+
+define HELP
+not-a-target: really
+endef
+
+$(BUILD_DIR)/gen.c: gen.py
+install:: app
+run: VAR = value
+'''
+
+
+@pytest.fixture
+def make_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    (tmp_path / 'Makefile').write_text(MAKEFILE)
+    (tmp_path / 'rules.mk').write_text('test check: all\n\t./run-tests\n')
+    return tmp_path
+
+
+def test_makefile_targets(make_dir):
+    targets, makefiles = makefile_targets(str(make_dir / 'Makefile'))
+
+    assert targets == {'all', 'test', 'check', 'app', 'install', 'run'}
+    assert makefiles == [str(make_dir / name) for name in
+                         ['Makefile', 'rules.mk', 'missing.mk']]
+
+
+def test_makefile_targets_cached_until_include_changes(make_dir, mocker):
+    makefile_targets(str(make_dir / 'Makefile'))
+
+    parse = mocker.spy(make, 'parse_makefile')
+    makefile_targets(str(make_dir / 'Makefile'))
+    parse.assert_not_called()
+
+    (make_dir / 'missing.mk').write_text('deploy:\n\trsync\n')
+    targets, _ = makefile_targets(str(make_dir / 'Makefile'))
+    assert 'deploy' in targets
+
+
+def test_make_project_targets(make_dir):
+    project = MakeProject(str(make_dir))
+
+    assert project.can_run
+    assert project.can_test
+    assert project.find_target(['test', 'check']) == 'test'
+
+
+def test_make_runs_a_job_per_available_cpu(make_dir, mocker):
+    mocker.patch('thiscli.project.available_cpus', return_value=(8, False))
+    project = MakeProject(str(make_dir))
+
+    with runs_commands('make -j8 -l8', 'make -j8 -l8 test'):
+        project.build(env=None)
+        project.test()
+
+    project.jobs = 2
+    with runs_commands('make -j2 -l2'):
+        project.build(env=None)
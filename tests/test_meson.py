@@ -19,3 +19,10 @@ def test_build_meson_project(meson_project):
     with runs_commands('meson setup build --prefix=$HOME/.local',
                        'ninja -C build'):
         meson_project.build(env=None)
+
+
+def test_build_meson_project_with_jobs(meson_project):
+    meson_project.jobs = 4
+    with runs_commands('meson setup build --prefix=$HOME/.local',
+                       'ninja -C build -j4'):
+        meson_project.build(env=None)
@@ -0,0 +1,119 @@
+import pytest
+
+from thiscli.monorepo import Monorepo, find_project_dirs
+from thiscli.project import Project
+
+
+def make_tree(tmp_path, *files):
+    for filename in files:
+        path = tmp_path / filename
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.touch()
+
+
+def project_dirs(tmp_path):
+    return [(relpath, name) for relpath, (module, name, markers)
+            in find_project_dirs(str(tmp_path))]
+
+
+def test_find_project_dirs(tmp_path):
+    make_tree(tmp_path, 'ansible/playbook.yml',
+              'services/api/Cargo.toml',
+              'services/web/package.json',
+              'services/web/src/Makefile',
+              'tools/lint/setup.py', 'tools/lint/Makefile',
+              'docs/index.md')
+
+    assert project_dirs(tmp_path) == [
+        ('.', 'AnsibleProject'),
+        ('services/api', 'CargoProject'),
+        ('services/web', 'NodejsProject'),
+        ('tools/lint', 'MakeProject'),
+    ]
+
+
+def test_find_project_dirs_skips_ignored_dirs(tmp_path):
+    make_tree(tmp_path, '.gitignore', 'app/Cargo.toml',
+              'node_modules/dep/package.json', 'target/debug/Makefile',
+              'generated/meson.build', 'vendor/lib/Cargo.toml',
+              'examples/demo/meson.build')
+    (tmp_path / '.gitignore').write_text('# Generated files\n'
+                                         'generated/\n/vendor\n')
+
+    assert project_dirs(tmp_path) == [
+        ('app', 'CargoProject'),
+        ('examples/demo', 'MesonProject'),
+    ]
+
+
+class ScriptProject(Project):
+    description = 'Script'
+
+    def __init__(self, cwd, command='true'):
+        super().__init__(cwd)
+        self.command = command
+
+    def build(self, env):
+        self.build_jobs = self.jobs
+
+    def test(self):
+        self.cmd(self.command, shell=True)
+
+
+class BuiltProject(Project):
+    description = 'Built'
+
+    def build(self, env):
+        self.build_jobs = self.jobs
+
+
+def test_run_all_reports_each_project(tmp_path, capsys):
+    monorepo = Monorepo(str(tmp_path), [
+        ('app', ScriptProject(str(tmp_path))),
+        ('lib', ScriptProject(str(tmp_path), 'exit 3')),
+        ('docs', BuiltProject(str(tmp_path)))])
+
+    with pytest.raises(SystemExit) as exit:
+        monorepo.test()
+    assert exit.value.code == 3
+
+    lines = capsys.readouterr().out.splitlines()
+    assert 'app (Script project): ok' in lines
+    assert 'lib (Script project): failed (exit code 3)' in lines
+    assert 'docs (Built project): skipped' in lines
+
+
+def test_run_all_fail_fast_cancels_other_projects(tmp_path, capsys):
+    monorepo = Monorepo(str(tmp_path), [
+        ('lib', ScriptProject(str(tmp_path), 'exit 3')),
+        ('app', ScriptProject(str(tmp_path), 'sleep 10'))])
+    # One project at a time, so app hasn't started when lib fails
+    monorepo.jobs = 1
+
+    with pytest.raises(SystemExit) as exit:
+        monorepo.check(fail_fast=True)
+    assert exit.value.code == 3
+
+    lines = capsys.readouterr().out.splitlines()
+    assert 'lib (Script project): failed (exit code 3)' in lines
+    assert 'app (Script project): cancelled' in lines
+
+
+def test_run_all_fails_without_any_project_to_run(tmp_path, capsys):
+    monorepo = Monorepo(str(tmp_path), [('docs', BuiltProject(str(tmp_path)))])
+    assert not monorepo.has_action('check')
+
+    with pytest.raises(SystemExit) as exit:
+        monorepo.check()
+    assert exit.value.code == 1
+    assert "don't know how to check" in capsys.readouterr().out
+
+
+def test_run_all_splits_jobs_between_projects(tmp_path):
+    projects = [(name, BuiltProject(str(tmp_path)))
+                for name in ['a', 'b', 'c']]
+    monorepo = Monorepo(str(tmp_path), projects)
+    monorepo.jobs = 7
+
+    monorepo.build(env=None)
+    assert [project.build_jobs for name, project in projects] == [2, 2, 2]
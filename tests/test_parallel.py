@@ -0,0 +1,46 @@
+import time
+
+import pytest
+
+from thiscli.project import Project
+
+
+class ScriptProject(Project):
+    description = 'Script'
+
+    def __init__(self, cwd, lint_cmd, test_cmd):
+        super().__init__(cwd)
+        self.lint_cmd = lint_cmd
+        self.test_cmd = test_cmd
+
+    def lint(self, fix):
+        self.cmd(self.lint_cmd, shell=True)
+
+    def test(self):
+        self.cmd(self.test_cmd, shell=True)
+
+
+def test_check_prefixes_output_and_keeps_first_exit_code(tmp_path, capsys):
+    project = ScriptProject(str(tmp_path), 'echo linted; exit 3',
+                            'echo tested')
+
+    with pytest.raises(SystemExit) as exit:
+        project.check()
+
+    assert exit.value.code == 3
+    lines = capsys.readouterr().out.splitlines()
+    assert 'lint | linted' in lines
+    assert 'test | tested' in lines
+
+
+def test_check_fail_fast_cancels_remaining_jobs(tmp_path, capsys):
+    project = ScriptProject(str(tmp_path), 'exit 2',
+                            'sleep 5 && echo tested')
+
+    start = time.monotonic()
+    with pytest.raises(SystemExit) as exit:
+        project.check(fail_fast=True)
+
+    assert exit.value.code == 2
+    assert time.monotonic() - start < 5
+    assert 'test | tested' not in capsys.readouterr().out.splitlines()
@@ -0,0 +1,101 @@
+import pytest
+
+from thiscli import plan
+from thiscli.deps import DependencyStamp
+from thiscli.project import Project
+from thiscli.project.nodejs import NodejsProject, MANIFESTS
+
+
+class ScriptProject(Project):
+    description = 'Script'
+
+    def build(self, env):
+        self.cmd('echo generate', shell=True)
+        self.parallel([('lib', lambda: (self.cmd('echo lib', shell=True),
+                                        self.cmd('echo lib2', shell=True))),
+                       ('docs', lambda: self.cmd('pwd', cwd='docs'))])
+        self.cmd('echo package', shell=True)
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    (tmp_path / 'docs').mkdir()
+    return ScriptProject(str(tmp_path))
+
+
+def build(project, env=None):
+    project.build(env)
+
+
+def test_plan_records_commands_and_dependencies(project):
+    action_plan = plan.record(project, 'build', build, env=None)
+
+    assert action_plan.cacheable
+    assert [(command.cmd, command.cwd, command.job, command.deps)
+            for command in action_plan.commands] == [
+        ('echo generate', None, '', []),
+        ('echo lib', None, 'lib', [0]),
+        ('echo lib2', None, 'lib', [1]),
+        ('pwd', 'docs', 'docs', [0]),
+        ('echo package', None, '', [2, 3])]
+    assert not project.dry_run
+
+
+def test_plan_runs_commands_in_dependency_order(project, tmp_path, capfd):
+    action_plan = plan.record(project, 'build', build, env=None)
+    plan.Plan.from_dict(action_plan.to_dict()).run(project)
+
+    lines = capfd.readouterr().out.splitlines()
+    output = [line for line in lines if not line.startswith(('$', 'lib  | $',
+                                                             'docs | $'))]
+    assert output[0] == 'generate'
+    assert sorted(output[1:4]) == sorted(['lib  | lib', 'lib  | lib2',
+                                          'docs | ' + str(tmp_path / 'docs')])
+    assert output[4] == 'package'
+
+
+def test_plan_stops_after_failed_command(project, capsys):
+    action_plan = plan.Plan('build', project.cwd, 'ScriptProject', [
+        plan.PlannedCommand('exit 2', shell=True),
+        plan.PlannedCommand('echo after', shell=True, deps=[0])])
+
+    with pytest.raises(SystemExit) as exit:
+        action_plan.run(project)
+
+    assert exit.value.code == 2
+    assert 'after' not in capsys.readouterr().out.splitlines()
+
+
+def test_installing_dependencies_is_not_cacheable(tmp_path):
+    (tmp_path / 'package.json').write_text('{"scripts": {}}')
+    project = NodejsProject(str(tmp_path))
+    stamp = DependencyStamp(project, MANIFESTS, 'node_modules')
+
+    def install(project):
+        stamp.install(lambda: project.cmd('npm install'))
+
+    assert not plan.record(project, 'build', install).cacheable
+
+    (tmp_path / 'node_modules').mkdir()
+    stamp.save()
+    action_plan = plan.record(project, 'build', install)
+    assert action_plan.cacheable
+    assert action_plan.commands == []
+    assert str(tmp_path / 'package.json') in action_plan.watched
+
+
+def test_cached_plan_is_invalidated_by_watched_files(project, tmp_path,
+                                                     monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'Makefile').write_text('all:\n')
+    action_plan = plan.record(project, 'build', build, env=None)
+    action_plan.watched.append(str(tmp_path / 'Makefile'))
+    plan.store(action_plan, {'env': None}, None, {})
+
+    cached = plan.load_cached('build', {'env': None}, None)
+    assert cached.to_dict() == action_plan.to_dict()
+    assert plan.load_cached('build', {'env': 'production'}, None) is None
+
+    (tmp_path / 'Makefile').write_text('all:\n\techo changed\n')
+    assert plan.load_cached('build', {'env': None}, None) is None
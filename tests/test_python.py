@@ -27,6 +27,16 @@ def test_test_python_project(python_project):
 
 def test_lint_python_project(python_project):
     with runs_commands('flake8 my_package',
-                       'pylint my_package',
-                       'python setup.py check'):
+                       'pylint --jobs=0 --score=n my_package',
+                       'python setup.py check',
+                       ordered=False):
         python_project.lint(fix=False)
+
+
+def test_lint_fix_python_project(python_project):
+    with runs_commands('autopep8 --recursive --in-place --jobs=0 my_package',
+                       'flake8 my_package',
+                       'pylint --jobs=0 --score=n my_package',
+                       'python setup.py check',
+                       ordered=False):
+        python_project.lint(fix=True)
@@ -0,0 +1,47 @@
+import gzip
+import os
+
+import pytest
+
+from thiscli import quiet
+from thiscli.project import Project
+
+
+class ScriptProject(Project):
+    description = 'Script'
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    project = ScriptProject(str(tmp_path))
+    project.quiet = True
+    return project
+
+
+def test_output_hidden_when_command_succeeds(project, capsys):
+    assert project.cmd('seq 1 100', shell=True) == 0
+    assert capsys.readouterr().out.splitlines() == ['$ seq 1 100']
+
+
+def test_tail_and_log_shown_when_command_fails(project, capsys):
+    with pytest.raises(SystemExit):
+        project.cmd('seq 1 1000; exit 2', shell=True)
+
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[1] == '... {} earlier lines'.format(1000 - quiet.TAIL_LINES)
+    assert lines[2:-1] == [str(number) for number in
+                           range(1001 - quiet.TAIL_LINES, 1001)]
+    assert lines[-1].startswith('Full log: ')
+
+    with gzip.open(lines[-1][len('Full log: '):], 'rt') as f:
+        log = f.read().splitlines()
+    assert log[0] == '$ seq 1 1000; exit 2'
+    assert log[1:] == [str(number) for number in range(1, 1001)]
+
+
+def test_old_logs_are_pruned(project, monkeypatch):
+    monkeypatch.setattr(quiet, 'MAX_LOGS', 3)
+    for _ in range(5):
+        project.cmd('true')
+    assert len(os.listdir(quiet.log_dir())) == 3
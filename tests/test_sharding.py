@@ -0,0 +1,107 @@
+import json
+import os
+
+import pytest
+
+from thiscli import sharding
+from thiscli.project.python import PythonProject
+
+
+def test_balance_by_duration():
+    durations = {'a': 10, 'b': 6, 'c': 5, 'd': 1}
+    shards, totals = sharding.balance(['a', 'b', 'c', 'd'], durations, 2)
+    assert shards == [['a', 'd'], ['b', 'c']]
+    assert totals == [11, 11]
+
+
+def test_balance_unknown_tests_as_average():
+    shards, totals = sharding.balance(['a', 'b', 'c'], {'a': 4}, 3)
+    assert shards == [['a'], ['b'], ['c']]
+    assert totals == [4, 4, 4]
+
+
+def test_node_ids_of_whole_files_are_compressed():
+    all_tests = ['a.py::x', 'a.py::y', 'b.py::x', 'b.py::y']
+    assert sharding.compress_node_ids(['a.py::x', 'a.py::y', 'b.py::y'],
+                                      all_tests) == ['a.py', 'b.py::y']
+
+
+def test_junit_case():
+    assert sharding.junit_case('tests/test_a.py::TestA::test_b[1]') == (
+        'tests.test_a.TestA', 'test_b[1]')
+
+
+@pytest.fixture
+def pytest_project(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    root = tmp_path / 'project'
+    (root / 'pkg').mkdir(parents=True)
+    (root / 'pkg' / '__init__.py').touch()
+    (root / 'conftest.py').touch()
+    (root / 'test_one.py').write_text(
+        'import time\n'
+        'def test_slow():\n    time.sleep(0.3)\n'
+        'def test_fast():\n    pass\n')
+    (root / 'test_two.py').write_text(
+        'class TestTwo:\n'
+        '    def test_a(self):\n        pass\n'
+        '    def test_b(self):\n        pass\n')
+    return PythonProject(str(root))
+
+
+def test_shards_run_every_test_once(pytest_project, capfd):
+    sharding.run(pytest_project, shards=2)
+
+    output = capfd.readouterr().out
+    assert 'Shard 1/2: 2 tests' in output
+    assert 'Shard 2/2: 2 tests' in output
+    assert output.count(' passed') == 2
+
+    durations = sharding.Durations(pytest_project).get('pytest')
+    assert sorted(durations) == ['test_one.py::test_fast',
+                                 'test_one.py::test_slow',
+                                 'test_two.py::TestTwo::test_a',
+                                 'test_two.py::TestTwo::test_b']
+    assert durations['test_one.py::test_slow'] >= 0.3
+
+
+def test_shard_uses_the_projects_durations(pytest_project, capfd):
+    # Recorded on this machine only, so not used for --shard
+    durations = sharding.Durations(pytest_project)
+    durations.update('pytest', {'test_one.py::test_fast': 10,
+                                'test_one.py::test_slow': 10})
+    durations.save()
+
+    path = pytest_project.path(sharding.DURATIONS_FILENAME)
+    with open(path, 'w') as f:
+        json.dump({'pytest': {'test_one.py::test_slow': 5,
+                              'test_one.py::test_fast': 1,
+                              'test_two.py::TestTwo::test_a': 1,
+                              'test_two.py::TestTwo::test_b': 1}}, f)
+    sharding.run(pytest_project, shard=(1, 2))
+
+    output = capfd.readouterr().out
+    assert 'Shard 1/2: 1 tests, about 5s' in output
+    assert '1 passed' in output
+    with open(path) as f:
+        assert json.load(f)['pytest']['test_one.py::test_slow'] < 5
+
+
+def test_shards_run_in_pipenv(pytest_project, tmp_path, monkeypatch, capfd):
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    pipenv = bin_dir / 'pipenv'
+    pipenv.write_text('#!/bin/sh\n'
+                      '[ "$1" = run ] || exit 0\n'
+                      'shift\nexec "$@"\n')
+    pipenv.chmod(0o755)
+    monkeypatch.setenv('PATH', '{}:{}'.format(bin_dir, os.environ['PATH']))
+    (tmp_path / 'project' / 'Pipfile').write_text('[dev-packages]\n'
+                                                  'pytest = "*"\n')
+    project = PythonProject(pytest_project.cwd)
+
+    sharding.run(project, shards=2)
+
+    output = capfd.readouterr().out
+    assert '$ pipenv run python -m pytest --collect-only -q' in output
+    assert output.count(' passed') == 2
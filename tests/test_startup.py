@@ -0,0 +1,49 @@
+import subprocess
+import sys
+
+# Microseconds thiscli may spend importing its own modules, excluding click
+STARTUP_BUDGET = 50000
+
+# Modules that must only be imported by the code paths that need them
+DEFERRED_MODULES = ['unittest', 'subprocess', 'shutil', 'json', 'sqlite3',
+                    'gzip', 'thiscli.tmux', 'thiscli.env', 'thiscli.history',
+                    'thiscli.quiet', 'thiscli.supervisor',
+                    'thiscli.plan', 'thiscli.daemon', 'thiscli.inotify',
+                    'ctypes']
+
+
+def import_times(module='thiscli.cli'):
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+                             'import ' + module],
+                            stderr=subprocess.PIPE, check=True,
+                            encoding='utf-8').stderr
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_startup_defers_heavy_imports():
+    modules = import_times()
+
+    assert not [name for name in modules if name in DEFERRED_MODULES]
+    assert not [name for name in modules
+                if name.startswith('thiscli.project.')]
+
+
+def test_startup_within_budget():
+    # Take the best of a few runs to keep the measurement stable
+    startup = min(times['thiscli'] + times['thiscli.cli'] - times['click']
+                  for times in (import_times() for _ in range(3)))
+    assert startup < STARTUP_BUDGET
+
+
+def test_client_skips_the_cli():
+    modules = import_times('thiscli.client')
+
+    assert 'click' not in modules
+    assert not [name for name in modules if name.startswith('thiscli.')
+                and name != 'thiscli.client']
@@ -0,0 +1,55 @@
+import pytest
+
+from thiscli.project import Project
+from thiscli.steps import Step, run_steps
+
+
+class StepsProject(Project):
+    description = 'Steps'
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    (tmp_path / 'configure.ac').write_text('AC_INIT')
+    return StepsProject(str(tmp_path))
+
+
+def configure_steps(project, ran):
+    def configure():
+        ran.append('configure')
+        with open(project.path('Makefile'), 'w') as f:
+            f.write('all:\n')
+        return 0
+
+    def make():
+        ran.append('make')
+        return 0
+
+    configure_step = Step('configure', configure, inputs=['configure.ac'],
+                          outputs=['Makefile'])
+    return Step('make', make, deps=[configure_step])
+
+
+def test_up_to_date_steps_are_skipped(project):
+    ran = []
+    run_steps(project, configure_steps(project, ran))
+    run_steps(project, configure_steps(project, ran))
+    assert ran == ['configure', 'make', 'make']
+
+
+def test_steps_rerun_when_inputs_change(project, tmp_path):
+    ran = []
+    run_steps(project, configure_steps(project, ran))
+    (tmp_path / 'configure.ac').write_text('AC_INIT([changed])')
+    run_steps(project, configure_steps(project, ran))
+    assert ran == ['configure', 'make', 'configure', 'make']
+
+
+def test_failed_step_stops_dependents(project):
+    ran = []
+    failing = Step('configure', lambda: ran.append('configure') or 1,
+                   outputs=['Makefile'])
+    run_steps(project, Step('make', lambda: ran.append('make'),
+                            deps=[failing]))
+    assert ran == ['configure']
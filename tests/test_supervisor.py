@@ -0,0 +1,70 @@
+import pytest
+
+from thiscli import supervisor
+from thiscli.project import Project
+from thiscli.tmux import Tmux
+
+
+class ServersProject(Project):
+    description = 'Servers'
+
+    def __init__(self, cwd, backend, frontend):
+        super().__init__(cwd)
+        self.backend = backend
+        self.frontend = frontend
+
+    def run(self, env):
+        runner = self.side_by_side()
+        with runner.pane('backend'):
+            self.cmd('echo setup', shell=True)
+            self.cmd(self.backend, shell=True)
+        with runner.pane('frontend'):
+            self.cmd(self.frontend, shell=True, cwd='web')
+        runner.run()
+
+
+def test_panes_run_side_by_side_with_prefixes(tmp_path, capsys):
+    (tmp_path / 'web').mkdir()
+    project = ServersProject(str(tmp_path), 'echo backend', 'pwd')
+    project.run(env=None)
+
+    lines = capsys.readouterr().out.splitlines()
+    assert 'backend  | setup' in lines
+    assert 'backend  | backend' in lines
+    assert 'frontend | ' + str(tmp_path / 'web') in lines
+
+
+def test_crashed_server_stops_other_panes(tmp_path):
+    (tmp_path / 'web').mkdir()
+    project = ServersProject(str(tmp_path), 'exit 3', 'sleep 10')
+
+    with pytest.raises(SystemExit) as exit:
+        project.run(env=None)
+    assert exit.value.code == 3
+
+
+def test_crashed_server_restarted_on_request(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(supervisor, 'RESTART_DELAY', 0)
+    (tmp_path / 'web').mkdir()
+    # Fails the first time it runs, then succeeds
+    project = ServersProject(str(tmp_path),
+                             'test -e ran || { touch ran; exit 1; }', 'true')
+    project.restart = True
+
+    # The crash doesn't count as a failure once restarted
+    project.run(env=None)
+
+    out = capsys.readouterr().out
+    assert 'Exited with code 1, restarting in 0s' in out
+    assert out.count('test -e ran') == 2
+
+
+def test_tmux_panes_record_relative_directories(tmp_path):
+    (tmp_path / 'web').mkdir()
+    project = ServersProject(str(tmp_path), 'serve', 'npm start')
+    tmux = Tmux(str(tmp_path))
+
+    with tmux.pane():
+        project.cmd('npm start', cwd='web')
+    assert tmux.panes == [[dict(cmd='npm start', cwd='web', env=None,
+                                env_echo=None)]]
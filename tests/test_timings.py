@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+from thiscli import timings
+from thiscli.project import Project
+
+
+class ScriptProject(Project):
+    description = 'Script'
+
+    def lint(self, fix):
+        self.cmd('echo linted', shell=True)
+
+    def test(self):
+        self.cmd('sleep 0.1', shell=True)
+
+
+@pytest.fixture
+def recorder(tmp_path):
+    yield timings.enable(str(tmp_path / 'trace.json'))
+    timings.recorder = None
+
+
+def test_records_parallel_commands_as_trace_events(recorder, tmp_path):
+    ScriptProject(str(tmp_path)).check()
+    recorder.finish()
+
+    with open(recorder.path) as f:
+        events = json.load(f)['traceEvents']
+    commands = {event['args']['job']: event for event in events
+                if event['ph'] == 'X'}
+    assert commands['lint']['name'] == 'echo linted'
+    assert commands['test']['name'] == 'sleep 0.1'
+    assert commands['test']['dur'] >= 100000
+    assert commands['lint']['tid'] != commands['test']['tid']
+    assert commands['test']['args']['exit_code'] == 0
+    assert commands['test']['args']['max_rss_kb'] > 0
+
+
+def test_summary_lists_each_command(recorder, tmp_path, capsys):
+    ScriptProject(str(tmp_path)).test()
+    recorder.finish()
+
+    lines = capsys.readouterr().err.splitlines()
+    assert lines[1].split() == ['Command', 'Wall', 'User', 'System',
+                                'Max', 'RSS', 'Exit']
+    assert lines[2].startswith('sleep 0.1 ')
+    assert lines[2].endswith(' 0')
+    assert lines[3].startswith('Total ')
+
+
+def test_nothing_written_without_commands(recorder):
+    recorder.finish()
+    with pytest.raises(FileNotFoundError):
+        open(recorder.path)
+
+
+@pytest.mark.parametrize('args', [['-j', '2', '--timings', 'build'],
+                                  ['--timeout', '5', '--timings', 'build'],
+                                  ['--timings', '-j', '2', 'build']])
+def test_timings_after_options_with_values(args):
+    from thiscli.cli import cli
+
+    ctx = cli.make_context('this', args)
+    assert ctx.params['timings_file'] == timings.DEFAULT_TRACE_FILE
@@ -0,0 +1,47 @@
+from thiscli.util import available_cpus, find_markers
+
+
+def make_tree(tmp_path, *files):
+    for filename in files:
+        path = tmp_path / filename
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.touch()
+
+
+def test_find_markers_prefers_nearest_directory(tmp_path):
+    make_tree(tmp_path, '.git', 'Makefile', 'sub/Makefile')
+    assert find_markers(tmp_path / 'sub', [['Makefile']]) == \
+        (0, str(tmp_path / 'sub'))
+
+
+def test_find_markers_prefers_earlier_marker_set(tmp_path):
+    make_tree(tmp_path, '.git', 'Makefile', 'sub/package.json')
+    marker_sets = [['Makefile'], ['package.json']]
+    assert find_markers(tmp_path / 'sub', marker_sets) == (0, str(tmp_path))
+
+
+def test_find_markers_matches_globs(tmp_path):
+    make_tree(tmp_path, '.git', 'app/App.csproj')
+    assert find_markers(tmp_path / 'app', [['Cargo.toml'], ['*.csproj']]) == \
+        (1, str(tmp_path / 'app'))
+
+
+def test_find_markers_stops_at_git_root(tmp_path):
+    make_tree(tmp_path, 'Makefile', 'repo/.git', 'repo/src/main.c')
+    assert find_markers(tmp_path / 'repo' / 'src', [['Makefile']]) is None
+
+
+def test_available_cpus_respects_affinity_and_cgroup_limit(mocker):
+    mocker.patch('os.cpu_count', return_value=32)
+    mocker.patch('os.sched_getaffinity', create=True,
+                 return_value=set(range(16)))
+    limit = mocker.patch('thiscli.util.cgroup_cpu_limit', return_value=None)
+    assert available_cpus() == (16, True)
+
+    limit.return_value = 4
+    assert available_cpus() == (4, True)
+
+    mocker.patch('os.sched_getaffinity', create=True,
+                 return_value=set(range(32)))
+    limit.return_value = None
+    assert available_cpus() == (32, False)
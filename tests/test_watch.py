@@ -0,0 +1,64 @@
+import threading
+import time
+
+import pytest
+
+from thiscli import watch
+from thiscli.project import Project
+
+
+class ScriptProject(Project):
+    description = 'Script'
+
+
+@pytest.fixture(params=['inotify', 'polling'])
+def watcher(request, tmp_path, monkeypatch):
+    monkeypatch.setattr(watch, 'POLL_INTERVAL', 0.05)
+    (tmp_path / 'build').mkdir()
+    (tmp_path / '.gitignore').write_text('*.log\n')
+    if request.param == 'polling':
+        return watch.PollingWatcher(str(tmp_path))
+    try:
+        return watch.InotifyWatcher(str(tmp_path))
+    except OSError:
+        pytest.skip('inotify is not available')
+
+
+def test_changes_are_noticed(watcher, tmp_path):
+    (tmp_path / 'src').mkdir()
+    watcher.changes(0.2)
+    (tmp_path / 'src' / 'main.c').write_text('int main;\n')
+    assert str(tmp_path / 'src' / 'main.c') in watcher.changes(1)
+
+
+def test_build_output_and_ignored_files_are_not(watcher, tmp_path):
+    (tmp_path / 'build' / 'main.o').write_text('')
+    (tmp_path / 'build.log').write_text('')
+    (tmp_path / 'main.c~').write_text('')
+    assert watcher.changes(0.3) == set()
+
+
+def test_changes_cancel_running_action(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(watch, 'DEBOUNCE', 0.05)
+    project = ScriptProject(str(tmp_path))
+    runs = []
+
+    def change_file():
+        time.sleep(0.5)
+        (tmp_path / 'main.c').write_text('int main;\n')
+
+    def run(project):
+        runs.append(project)
+        if len(runs) > 1:
+            raise KeyboardInterrupt
+        threading.Thread(target=change_file).start()
+        project.cmd('sleep 5')
+
+    start = time.monotonic()
+    watch.watch(project, run, find=lambda: project)
+
+    assert len(runs) == 2
+    assert time.monotonic() - start < 5
+    output = capsys.readouterr().out
+    assert 'Cancelled, as files changed' in output
+    assert 'Changed: main.c' in output
@@ -0,0 +1,132 @@
+import os
+import subprocess
+import sys
+import venv
+
+import pytest
+
+from thiscli import wheelhouse
+from thiscli.project import CommandResult, Project
+from thiscli.project.python import PythonProject
+from thiscli.supervisor import Supervisor
+
+
+@pytest.fixture
+def projects(tmp_path, monkeypatch, mocker):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    monkeypatch.delenv('VIRTUAL_ENV', raising=False)
+    mocker.patch('thiscli.wheelhouse.virtualenv_python',
+                 return_value=sys.executable)
+
+    commands = []
+
+    def run_command(self, cmd, **kwargs):
+        commands.append(cmd)
+        if cmd == 'virtualenv .venv':
+            os.makedirs(self.path('.venv', 'bin'))
+            with open(self.path('.venv', 'pyvenv.cfg'), 'w') as f:
+                f.write('home = /usr/bin\n')
+            with open(self.path('.venv', 'bin', 'activate'), 'w') as f:
+                f.write('VIRTUAL_ENV="{}"\n'.format(self.path('.venv')))
+        return CommandResult(cmd, 0)
+
+    def cmd(self, cmd, **kwargs):
+        return run_command(self, cmd).returncode
+
+    mocker.patch.object(Project, 'run_command', new=run_command)
+    mocker.patch.object(Project, 'cmd', new=cmd)
+
+    def project(name, requirements='six==1.16.0\n'):
+        root = tmp_path / name
+        (root / 'pkg').mkdir(parents=True)
+        (root / 'pkg' / '__init__.py').touch()
+        (root / 'requirements.txt').write_text(requirements)
+        return PythonProject(str(root))
+    return project, commands
+
+
+def test_new_virtualenvs_are_cloned_from_templates(projects, tmp_path):
+    project, commands = projects
+    project('first').ensure_deps()
+    house = wheelhouse.wheelhouse_path()
+    assert commands == [
+        'virtualenv .venv',
+        'pip wheel --wheel-dir {0} --find-links {0} -r requirements.txt'
+        .format(house),
+        'pip install --no-index --find-links {} -r requirements.txt'
+        .format(house)]
+
+    second = project('second')
+    second.ensure_deps()
+    assert len(commands) == 3
+    with open(second.path('.venv', 'bin', 'activate')) as f:
+        assert f.read() == 'VIRTUAL_ENV="{}"\n'.format(second.path('.venv'))
+
+
+def test_local_requirements_are_installed_as_usual(projects):
+    project, commands = projects
+    project('first', requirements='-e .\n').ensure_deps()
+    project('second', requirements='-e .\n').ensure_deps()
+    assert commands == ['virtualenv .venv', 'pip install -r requirements.txt',
+                        'virtualenv .venv', 'pip install -r requirements.txt']
+
+
+def test_recording_panes_runs_nothing(tmp_path, monkeypatch, mocker):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    monkeypatch.delenv('VIRTUAL_ENV', raising=False)
+    mocker.patch('thiscli.wheelhouse.virtualenv_python',
+                 return_value=sys.executable)
+    mocker.patch('thiscli.project.nodejs.has_command', return_value=False)
+    popen = mocker.patch('subprocess.Popen')
+    mocker.patch.object(Supervisor, 'run')
+
+    root = tmp_path / 'project'
+    (root / 'pkg').mkdir(parents=True)
+    (root / 'pkg' / '__init__.py').touch()
+    (root / 'pkg' / '__main__.py').touch()
+    (root / 'requirements.txt').write_text('six==1.16.0\n')
+    (root / 'package.json').write_text('{"scripts": {"start": "serve"}}')
+    (root / 'package-lock.json').write_text('{}')
+    project = PythonProject(str(root))
+    project.restart = False
+    runner = Supervisor(project)
+    mocker.patch.object(Project, 'side_by_side', return_value=runner)
+
+    project.run(env=None)
+
+    popen.assert_not_called()
+    assert not (root / '.venv').exists()
+    assert [[command['cmd'] for command in commands]
+            for name, commands in runner.panes] == [
+        ['virtualenv .venv', 'pip install -r requirements.txt',
+         'python -m pkg'],
+        [['npm', 'ci', '--prefer-offline'], ['npm', 'run', 'start']]]
+
+
+def test_clone_rewrites_paths_and_links_packages(tmp_path):
+    src = str(tmp_path / 'src')
+    dst = str(tmp_path / 'dst')
+    venv.create(src)
+    with open(os.path.join(src, 'bin', 'tool'), 'w') as f:
+        f.write('#!{}/bin/python\n'.format(src))
+    lib = os.path.join(src, 'lib', 'module.py')
+    with open(lib, 'w') as f:
+        f.write('X = 1\n')
+
+    wheelhouse.clone_venv(src, dst)
+
+    with open(os.path.join(dst, 'bin', 'tool')) as f:
+        assert f.read() == '#!{}/bin/python\n'.format(dst)
+    assert os.path.samefile(lib, os.path.join(dst, 'lib', 'module.py'))
+    prefix = subprocess.run(
+        [os.path.join(dst, 'bin', 'python'), '-c',
+         'import sys; print(sys.prefix)'],
+        stdout=subprocess.PIPE, check=True).stdout.decode().strip()
+    assert os.path.samefile(prefix, dst)
+
+
+def test_saving_a_missing_virtualenv_does_nothing(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    templates = wheelhouse.VenvTemplates()
+    templates.save('key', str(tmp_path / '.venv'))
+    assert not os.path.exists(templates.path('key'))
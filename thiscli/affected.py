@@ -0,0 +1,129 @@
+"""
+Finding the tests affected by changes (`this test --affected`): the test
+modules that import a changed module, directly or indirectly, going by a
+static import graph of the project. Every test is affected when a file
+the graph can't account for changes, such as conftest.py, setup files,
+dependency manifests or data files in the packages. Imports done
+dynamically (e.g. with importlib) aren't seen.
+"""
+
+import fnmatch
+import os
+import subprocess
+
+from . import cache
+from .pyimports import imported_files, python_files
+
+# Files that affect every test when they change
+RUN_ALL_PATTERNS = ['conftest.py', 'setup.py', 'setup.cfg', 'tox.ini',
+                    'pyproject.toml', 'pytest.ini', 'MANIFEST.in', 'Pipfile',
+                    'Pipfile.lock', 'requirements*.txt', 'requirements*.in',
+                    'constraints*.txt']
+
+
+def git_lines(root, *args):
+    output = subprocess.run(['git'] + list(args), cwd=root,
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                            check=True).stdout
+    return [line for line in output.decode('utf-8', 'replace').splitlines()
+            if line]
+
+
+def changed_files(root, since=None):
+    """
+    Return the files under root (relative to it) changed since the git
+    ref since, or else since the last commit, including untracked files.
+    Returns None if they can't be found, e.g. outside a git repository.
+    """
+    try:
+        changed = git_lines(root, 'diff', '--name-only', '--relative',
+                            since or 'HEAD', '--')
+        changed += git_lines(root, 'ls-files', '--others',
+                             '--exclude-standard')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return sorted(set(changed))
+
+
+def is_test_file(path):
+    name = os.path.basename(path)
+    return name.endswith('.py') and (name.startswith('test_') or
+                                     name.endswith('_test.py'))
+
+
+class ImportGraph:
+    """
+    The imports between a project's Python files, with the imports of
+    each file remembered by stat stamp so unchanged files aren't parsed
+    again
+    """
+
+    def __init__(self, root, files):
+        self.root = root
+        self.key = cache.cache_key(root)
+        known = cache.load('imports', self.key) or {}
+
+        self.imports = {}
+        self.importers = {}
+        for path in files:
+            stamp = cache.stat_stamp(os.path.join(root, path))
+            entry = known.get(path)
+            if entry is None or entry[0] != stamp:
+                entry = (stamp, imported_files(root, path))
+            self.imports[path] = entry
+            for imported in entry[1]:
+                self.importers.setdefault(imported, set()).add(path)
+        cache.store('imports', self.key, self.imports)
+
+    def dependents(self, paths):
+        """Return paths and every file importing them, even indirectly"""
+        seen = set()
+        pending = list(paths)
+        while pending:
+            path = pending.pop()
+            if path not in seen:
+                seen.add(path)
+                pending += self.importers.get(path, ())
+        return seen
+
+
+def affected_tests(root, packages, changed):
+    """
+    Return (the test files affected by the changed files, or None if
+    every test is, and the reason why). Files outside the packages that
+    aren't Python or setup files, like documentation, affect no tests,
+    while Python files the import graph doesn't have affect every test.
+    """
+    files = python_files(root, packages)
+    # Test modules may also be outside of any package
+    tests_dir = os.path.join(root, 'tests')
+    if os.path.isdir(tests_dir) and 'tests' not in packages:
+        files += python_files(root, ['tests'])
+    # Top-level modules, including tests and modules imported by them
+    files += [name for name in sorted(os.listdir(root))
+              if name.endswith('.py') and
+              os.path.isfile(os.path.join(root, name))]
+    known = set(files)
+
+    for path in changed:
+        name = os.path.basename(path)
+        if any(fnmatch.fnmatch(name, pattern)
+               for pattern in RUN_ALL_PATTERNS):
+            return None, path + ' changed'
+        in_package = path.split('/')[0] in packages
+        if in_package and not path.endswith('.py'):
+            # Data files may be read by any code
+            return None, path + ' changed'
+        if in_package and not os.path.exists(os.path.join(root, path)):
+            # Whatever imported it isn't in the graph anymore
+            return None, path + ' was removed'
+        if path.endswith('.py') and path not in known:
+            # Could be imported in ways the graph doesn't follow
+            return None, path + " isn't in the import graph"
+
+    graph = ImportGraph(root, files)
+    affected = graph.dependents(path for path in changed
+                                if path.endswith('.py'))
+    return sorted(path for path in affected
+                  if is_test_file(path) and
+                  os.path.exists(os.path.join(root, path))), None
@@ -0,0 +1,442 @@
+"""
+Cache of build outputs keyed by a hash of everything the build depends
+on: the project's source files, selected environment variables and the
+versions of the tools used. A build whose inputs match an earlier build
+restores that build's outputs instead of running again, e.g. after
+switching back to a branch or in a fresh clone.
+
+Archives are kept under $XDG_CACHE_HOME/this/artifacts, evicting the
+least recently used ones beyond THIS_ARTIFACT_CACHE_SIZE. With
+THIS_ARTIFACT_CACHE_URL set, archives are also fetched from and uploaded
+to an HTTP server supporting GET and PUT, so a team can share builds.
+Set THIS_NO_ARTIFACT_CACHE=1 to always build.
+"""
+
+import hashlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import tarfile
+import time
+
+import click
+
+from . import cache, plan
+from .project import echo_line, local
+from .util import warn
+
+DEFAULT_MAX_SIZE = '5G'
+
+# Environment variables that change what compilers and bundlers produce
+BUILD_ENV_VARS = ['CC', 'CXX', 'CFLAGS', 'CXXFLAGS', 'CPPFLAGS', 'LDFLAGS',
+                  'PKG_CONFIG_PATH', 'RUSTFLAGS', 'CARGO_BUILD_TARGET',
+                  'NODE_ENV', 'PYTHONHASHSEED']
+
+# Directories of installed dependencies, which aren't inputs themselves
+# but are installed from manifests that are
+DEPENDENCY_DIRS = {'.git', '.hg', '.svn', '.venv', 'venv', 'node_modules',
+                   '__pycache__'}
+
+# Name of the archive member listing the outputs it contains
+MANIFEST = '.this-artifact.json'
+
+# Incremental builds (of outputs that were already there) with outputs
+# larger than this aren't archived, as every edit and build would pay for
+# compressing them
+MAX_INCREMENTAL_SIZE = 100 << 20
+
+# Seconds to wait for the HTTP server
+HTTP_TIMEOUT = 10
+
+SIZE_UNITS = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30, 'T': 1 << 40}
+
+
+def parse_size(size):
+    """Parse a size in bytes, with an optional K, M, G or T suffix"""
+    size = size.strip().upper().rstrip('B')
+    if size and size[-1] in SIZE_UNITS:
+        return int(float(size[:-1]) * SIZE_UNITS[size[-1]])
+    return int(size)
+
+
+class LocalStore:
+    """Archives in a directory, evicting the least recently used"""
+
+    def __init__(self, root, max_size):
+        self.root = root
+        self.max_size = max_size
+
+    def path(self, key):
+        return os.path.join(self.root, key + '.tar.gz')
+
+    def get(self, key):
+        """Return the path of the archive for key, or None"""
+        path = self.path(key)
+        try:
+            # The modification time records when it was last used
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def put(self, key, archive):
+        """Move an archive into the store, evicting others to fit it"""
+        if os.path.getsize(archive) > self.max_size:
+            os.remove(archive)
+            return
+        os.makedirs(self.root, exist_ok=True)
+        os.replace(archive, self.path(key))
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for entry in os.scandir(self.root):
+            if not entry.name.endswith('.tar.gz'):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for mtime, size, path in entries)
+        for mtime, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+
+class HttpStore:
+    """Archives on an HTTP server, as GET and PUT of {url}/{key}.tar.gz"""
+
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+
+    def fetch(self, key, path):
+        """Download the archive for key to path, returning whether found"""
+        import urllib.error
+        import urllib.request
+
+        try:
+            with urllib.request.urlopen(self.url + '/' + key + '.tar.gz',
+                                        timeout=HTTP_TIMEOUT) as response, \
+                    open(path, 'wb') as f:
+                shutil.copyfileobj(response, f)
+            return True
+        except urllib.error.HTTPError as error:
+            if error.code != 404:
+                warn('Artifact cache server: {}'.format(error))
+        except (OSError, ValueError) as error:
+            warn('Artifact cache server: {}'.format(error))
+        if os.path.exists(path):
+            os.remove(path)
+        return False
+
+    def upload(self, key, path):
+        import urllib.request
+
+        with open(path, 'rb') as f:
+            request = urllib.request.Request(
+                self.url + '/' + key + '.tar.gz', data=f, method='PUT',
+                headers={'Content-Length': str(os.path.getsize(path)),
+                         'Content-Type': 'application/gzip'})
+            try:
+                urllib.request.urlopen(request, timeout=HTTP_TIMEOUT).close()
+            except (OSError, ValueError) as error:
+                warn('Artifact cache server: {}'.format(error))
+
+
+class ArtifactCache:
+    def __init__(self):
+        self.local = LocalStore(cache.cache_path('artifacts'), parse_size(
+            os.environ.get('THIS_ARTIFACT_CACHE_SIZE') or DEFAULT_MAX_SIZE))
+        url = os.environ.get('THIS_ARTIFACT_CACHE_URL')
+        self.remote = HttpStore(url) if url else None
+
+    def get(self, key):
+        """Return the path of the archive for key, fetching it if remote"""
+        path = self.local.get(key)
+        if path is not None or self.remote is None:
+            return path
+
+        os.makedirs(self.local.root, exist_ok=True)
+        tmp_path = '{}.{}.tmp'.format(self.local.path(key), os.getpid())
+        if not self.remote.fetch(key, tmp_path):
+            return None
+        self.local.put(key, tmp_path)
+        return self.local.get(key)
+
+    def put(self, key, archive):
+        if self.remote is not None:
+            self.remote.upload(key, archive)
+        self.local.put(key, archive)
+
+
+class InputHashes:
+    """
+    Content hashes of a project's files, remembered by stat stamp so
+    unchanged files aren't read again
+    """
+
+    def __init__(self, project):
+        self.project = project
+        self.key = cache.cache_key(project.cwd)
+        self.hashes = cache.load('artifact-hashes', self.key) or {}
+
+    def hash(self, path):
+        full_path = self.project.path(path)
+        stamp = cache.stat_stamp(full_path)
+        known = self.hashes.get(path)
+        if known is not None and known[0] == stamp:
+            return known[1]
+
+        digest = hashlib.sha256()
+        try:
+            with open(full_path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(block)
+        except OSError:
+            # A directory (like a submodule) or a deleted file
+            return None
+        self.hashes[path] = (stamp, digest.hexdigest())
+        return digest.hexdigest()
+
+    def save(self, files):
+        cache.store('artifact-hashes', self.key,
+                    {path: self.hashes[path] for path in files
+                     if path in self.hashes})
+
+
+def untracked_outputs(project, outputs):
+    """
+    Leave out the outputs containing files tracked by git, like the build/
+    directory of webpack configs in some projects, which are sources
+    rather than outputs
+    """
+    try:
+        output = subprocess.run(['git', 'ls-files', '-z', '--'] + outputs,
+                                cwd=project.cwd, stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return outputs
+    tracked = [filename for filename in
+               output.decode('utf-8', 'replace').split('\0') if filename]
+    return [output for output in outputs
+            if not any(filename == output or filename.startswith(output + '/')
+                       for filename in tracked)]
+
+
+def input_files(project, outputs):
+    """The project's source files, leaving out outputs and dependencies"""
+    from .lintcache import source_files
+
+    return [filename for filename in source_files(project.cwd)
+            if not any(filename == output or
+                       filename.startswith(output + '/')
+                       for output in outputs) and
+            not DEPENDENCY_DIRS & set(filename.split('/')[:-1])]
+
+
+def tool_version(cmd, env=None):
+    """
+    Output of a command like `rustc --version`, remembered for as long as
+    the executable it runs is unchanged
+    """
+    path = (env or os.environ).get('PATH')
+    executable = shutil.which(cmd.split()[0], path=path)
+    if executable is None:
+        return None
+    key = cache.cache_key(cmd, executable,
+                          cache.stat_stamp(os.path.realpath(executable)))
+    version = cache.load('toolchains', key)
+    if version is None:
+        try:
+            version = subprocess.run(
+                cmd, shell=True, env=dict(os.environ, **(env or {})),
+                stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                stdin=subprocess.DEVNULL, timeout=30).stdout.decode(
+                    'utf-8', 'replace').strip()
+        except (OSError, subprocess.TimeoutExpired):
+            return None
+        cache.store('toolchains', key, version)
+    return version
+
+
+def build_key(project, outputs, files, hashes, toolchain=(),
+              toolchain_env=None, key=(), path_dependent=False):
+    return cache.cache_key(
+        'artifacts', project.type_name, sorted(outputs), list(key),
+        [(name, os.environ.get(name)) for name in BUILD_ENV_VARS],
+        [(cmd, tool_version(cmd, toolchain_env)) for cmd in toolchain],
+        project.cwd if path_dependent else None,
+        [(filename, hashes.hash(filename)) for filename in files])
+
+
+def create_archive(project, outputs, path):
+    with tarfile.open(path, 'w:gz', compresslevel=1) as archive:
+        manifest = json.dumps(dict(outputs=outputs)).encode('utf-8')
+        info = tarfile.TarInfo(MANIFEST)
+        info.size = len(manifest)
+        info.mtime = time.time()
+        archive.addfile(info, io.BytesIO(manifest))
+        for output in outputs:
+            archive.add(project.path(output), output)
+
+
+def safe_members(archive):
+    """
+    Return the members of an archive, raising ValueError if any would be
+    extracted outside of the directory it is extracted in
+    """
+    members = archive.getmembers()
+    links = set()
+    for member in members:
+        name = os.path.normpath(member.name)
+        if (os.path.isabs(name) or name.split(os.sep)[0] == '..' or
+                any(name.startswith(link + os.sep) for link in links) or
+                not (member.isfile() or member.isdir() or member.issym() or
+                     member.islnk())):
+            raise ValueError('unsafe member ' + member.name)
+        if member.issym() or member.islnk():
+            target = os.path.normpath(os.path.join(
+                os.path.dirname(name) if member.issym() else '',
+                member.linkname))
+            if os.path.isabs(target) or target.split(os.sep)[0] == '..':
+                raise ValueError('unsafe link ' + member.name)
+            links.add(name)
+    return members
+
+
+def outputs_size(project, outputs, limit):
+    """Total size of the outputs, stopping once it is over limit"""
+    total = 0
+    for output in outputs:
+        for dirpath, dirnames, filenames in os.walk(project.path(output)):
+            for name in filenames:
+                try:
+                    total += os.lstat(os.path.join(dirpath, name)).st_size
+                except OSError:
+                    continue
+                if total > limit:
+                    return total
+        if os.path.isfile(project.path(output)):
+            total += os.path.getsize(project.path(output))
+    return total
+
+
+def restore_archive(project, path, allowed):
+    """
+    Replace the outputs with those in an archive, returning them. Raises
+    ValueError if it has outputs that aren't allowed, so files that
+    aren't outputs (like tracked ones) are never overwritten.
+    """
+    tmp_dir = project.path('.this-artifact.{}.tmp'.format(os.getpid()))
+    try:
+        with tarfile.open(path, 'r:gz') as archive:
+            archive.extractall(tmp_dir, members=safe_members(archive))
+        with open(os.path.join(tmp_dir, MANIFEST)) as f:
+            outputs = json.load(f)['outputs']
+        if not set(outputs) <= set(allowed):
+            raise ValueError('unexpected outputs ' + ', '.join(outputs))
+
+        now = time.time()
+        for output in outputs:
+            # Restored files have to be newer than the sources, or tools
+            # like make and cargo would consider them out of date
+            for dirpath, dirnames, filenames in os.walk(
+                    os.path.join(tmp_dir, output)):
+                for name in filenames:
+                    filename = os.path.join(dirpath, name)
+                    if not os.path.islink(filename):
+                        os.utime(filename, (now, now))
+
+            target = project.path(output)
+            if os.path.isdir(target) and not os.path.islink(target):
+                shutil.rmtree(target)
+            elif os.path.lexists(target):
+                os.remove(target)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(os.path.join(tmp_dir, output), target)
+        return outputs
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def cached_build(project, build, outputs, toolchain=(), toolchain_env=None,
+                 key=(), path_dependent=False):
+    """
+    Run build(), which builds the given outputs (paths relative to the
+    project), unless the artifact cache has outputs built from the same
+    inputs, which are restored instead. Outputs that don't exist after
+    the build are left out, so outputs may list candidates such as the
+    usual output directories of bundlers. Candidates containing files
+    tracked by git are inputs instead.
+
+    The inputs are the project's files (see lintcache.source_files()),
+    BUILD_ENV_VARS, the output of the toolchain commands (such as
+    `rustc --version`, run with toolchain_env) and the values in key.
+    With path_dependent, as for build directories containing absolute
+    paths, outputs are only restored in the same directory. Outputs
+    larger than the cache, or than MAX_INCREMENTAL_SIZE when they were
+    already there before the build, aren't archived.
+    """
+    # Whether outputs are restored can only be decided when running
+    plan.uncacheable()
+    if project.dry_run or os.environ.get('THIS_NO_ARTIFACT_CACHE'):
+        return build()
+    outputs = untracked_outputs(project, outputs)
+    files = input_files(project, outputs)
+    if not files:
+        return build()
+
+    artifacts = ArtifactCache()
+    hashes = InputHashes(project)
+    build_hash = build_key(project, outputs, files, hashes, toolchain,
+                           toolchain_env, key, path_dependent)
+    hashes.save(files)
+
+    archive = artifacts.get(build_hash)
+    if archive is not None:
+        try:
+            restored = restore_archive(project, archive, outputs)
+        except (OSError, ValueError, KeyError, tarfile.TarError) as error:
+            warn('Ignoring a broken artifact cache entry: {}'.format(error))
+            os.remove(archive)
+        else:
+            echo_line(click.style(
+                'Restored {} from the artifact cache'.format(
+                    ', '.join(restored)), fg='green', bold=True))
+            return 0
+
+    incremental = any(os.path.lexists(project.path(output))
+                      for output in outputs)
+    exit_code = getattr(local, 'exit_code', 0)
+    result = build()
+    if result or getattr(local, 'exit_code', 0) != exit_code:
+        return result
+
+    built = [output for output in outputs if os.path.lexists(
+        project.path(output))]
+    # Outputs that wouldn't fit in the cache aren't archived at all
+    limit = artifacts.local.max_size
+    if incremental:
+        limit = min(limit, MAX_INCREMENTAL_SIZE)
+    if built and outputs_size(project, built, limit) <= limit:
+        tmp_path = '{}.{}.tmp'.format(artifacts.local.path(build_hash),
+                                      os.getpid())
+        try:
+            os.makedirs(artifacts.local.root, exist_ok=True)
+            create_archive(project, built, tmp_path)
+            artifacts.put(build_hash, tmp_path)
+        except OSError as error:
+            # Caching is best-effort, e.g. when the disk is full
+            warn('Could not cache the build: {}'.format(error))
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    return result
@@ -0,0 +1,58 @@
+"""Small on-disk cache stored under $XDG_CACHE_HOME/this"""
+
+import hashlib
+import os
+import pickle
+
+# Bump when the format of cached values changes
+CACHE_VERSION = 3
+
+
+def cache_path(*path):
+    root = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(root, 'this', *path)
+
+
+def cache_key(*values):
+    data = '\0'.join(str(value) for value in (CACHE_VERSION,) + values)
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+def stat_stamp(path):
+    """Cheap fingerprint of a file or directory, or None if it is missing"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def stat_stamps(paths):
+    return {path: stat_stamp(path) for path in paths}
+
+
+def stamps_valid(stamps):
+    return all(stat_stamp(path) == stamp for path, stamp in stamps.items())
+
+
+def load(category, key):
+    try:
+        with open(cache_path(category, key), 'rb') as f:
+            return pickle.load(f)
+    except Exception:
+        # A missing, corrupt or outdated entry is simply a cache miss
+        return None
+
+
+def store(category, key, value):
+    path = cache_path(category, key)
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(value, f)
+        os.replace(tmp_path, path)
+    except Exception:
+        # Caching is best-effort, e.g. on a read-only home directory
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
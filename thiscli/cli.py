@@ -0,0 +1,296 @@
+"""The command line interface of `this`"""
+
+import functools
+
+import click
+from . import timings
+from .project import Project
+from .click_colors import HelpColorsGroup
+
+# Actions run from plans, which are cached (see @planned)
+PLANNED_ACTIONS = ['build', 'test']
+
+pass_project = click.make_pass_decorator(Project)
+
+
+def recorded(f):
+    """Record how long the action took in the history for `this stats`"""
+    @functools.wraps(f)
+    def wrapper(project, **kwargs):
+        from . import history
+        with history.recording(project, f.__name__, kwargs.get('env')):
+            return f(project, **kwargs)
+    return wrapper
+
+
+def planned(f):
+    """
+    Run the action from the plan cached by an earlier invocation while it
+    is still valid, without finding the project, or else from a new plan,
+    which is cached if it can be. Actions that can't be planned ahead run
+    as usual.
+    """
+    @functools.wraps(f)
+    def wrapper(**kwargs):
+        from . import history, plan
+
+        ctx = click.get_current_context()
+        if ctx.obj is not None:
+            # Found up front for --all or --dry-run
+            return recorded(f)(ctx.obj, **kwargs)
+
+        options = ctx.meta['this.options']
+        action_plan = plan.load_cached(f.__name__, kwargs, options['jobs'])
+        if action_plan is not None:
+            project = plan.PlannedProject(action_plan)
+        else:
+            project, stamps = Project.detect_cached()
+        configure(project, options)
+
+        with history.recording(project, f.__name__, kwargs.get('env')):
+            if action_plan is None:
+                action_plan = plan.record(project, f.__name__, f, **kwargs)
+                if not action_plan.cacheable:
+                    return f(project, **kwargs)
+                plan.store(action_plan, kwargs, options['jobs'], stamps)
+            action_plan.run(project)
+    return wrapper
+
+
+def watchable(f):
+    """
+    Add --watch, running the action again whenever the project's files
+    change, with the project kept loaded in between
+    """
+    @click.option('--watch', is_flag=True,
+                  help='Run again whenever files in the project change, '
+                  'cancelling a run still in progress.')
+    @functools.wraps(f)
+    def wrapper(watch, **kwargs):
+        if not watch:
+            return f(**kwargs)
+
+        from . import watch as watching
+        ctx = click.get_current_context()
+        if ctx.obj is None:
+            ctx.obj = find_project(ctx)
+
+        def run(project):
+            ctx.obj = project
+            f(**kwargs)
+        watching.watch(ctx.obj, run, lambda: find_project(ctx))
+    return wrapper
+
+
+def configure(project, options):
+    for name, value in options.items():
+        setattr(project, name, value)
+
+
+def find_project(ctx):
+    """Find the project, or every project for --all, and apply the options"""
+    if ctx.meta['this.all_projects']:
+        from .monorepo import Monorepo
+        project = Monorepo.find()
+    else:
+        project = Project.find_cached()
+    configure(project, ctx.meta['this.options'])
+    return project
+
+
+def projects_help_section():
+    # Built on demand, as it imports every project module
+    descriptions = [project.description
+                    for project in Project.all_projects()]
+    return ('Supported Projects', '\b\n' + '\n'.join(descriptions))
+
+
+def positive_float(ctx, param, value):
+    # click.FloatRange can't exclude its minimum before click 8
+    if value is not None and value <= 0:
+        raise click.BadParameter('must be greater than 0')
+    return value
+
+
+class CliGroup(HelpColorsGroup):
+    def parse_args(self, ctx, args):
+        # --timings takes an optional value, so it has to be given as
+        # --timings=FILE to keep the command name from being used as FILE
+        takes_value = {opt for param in self.params
+                       if isinstance(param, click.Option) and
+                       not param.is_flag and param.name != 'timings_file'
+                       for opt in param.opts}
+        options = []
+        while args and args[0].startswith('-'):
+            arg = args.pop(0)
+            if arg == '--timings':
+                arg += '=' + timings.DEFAULT_TRACE_FILE
+            options.append(arg)
+            if arg in takes_value and args:
+                # Like -j 2, whose value comes next
+                options.append(args.pop(0))
+        return super().parse_args(ctx, options + args)
+
+
+@click.group(cls=CliGroup, invoke_without_command=True,
+             post_sections=[projects_help_section])
+@click.option('--dry-run', is_flag=True,
+              help='Show what commands would be run without '
+              'actually running them.')
+@click.option('--all', 'all_projects', is_flag=True,
+              help='Run the command for every project found under the '
+              'current directory.')
+@click.option('-q', '--quiet', is_flag=True,
+              help="Only show the output of commands that fail, keeping "
+              "the full output in log files.")
+@click.option('-j', '--jobs', type=click.IntRange(min=1), metavar='N',
+              help='Number of parallel jobs for build tools to run '
+              '(default: the number of available CPUs).')
+@click.option('--timeout', type=float, callback=positive_float,
+              metavar='SECONDS',
+              help='Stop any command that runs for longer than this.')
+@click.option('--timings', 'timings_file', metavar='[=FILE]',
+              help='Record the time and resources used by each command '
+              'as a Chrome trace in FILE (default: {}) and print a '
+              'summary.'.format(timings.DEFAULT_TRACE_FILE))
+@click.pass_context
+def cli(ctx, dry_run, all_projects, quiet, jobs, timeout, timings_file):
+    """Standardized project tool for running common tasks"""
+    # Commands are always timed for the history shown by `this stats`
+    recorder = timings.enable(timings_file)
+    if timings_file is not None:
+        ctx.call_on_close(recorder.finish)
+
+    if ctx.invoked_subcommand == 'daemon':
+        # Serves every project
+        return
+
+    ctx.meta['this.options'] = dict(
+        dry_run=dry_run, jobs=jobs, quiet=quiet, timeout=timeout)
+    ctx.meta['this.all_projects'] = all_projects
+    if ctx.invoked_subcommand in PLANNED_ACTIONS and not (all_projects or
+                                                          dry_run):
+        # Found by @planned, unless a cached plan makes it unnecessary
+        return
+
+    ctx.obj = find_project(ctx)
+    if ctx.invoked_subcommand is None:
+        ctx.obj.info()
+
+
+@cli.command()
+@click.option('--production', '--prod', '--release', 'env',
+              flag_value='production')
+@click.option('--development', '--dev', '--debug', 'env',
+              flag_value='development')
+@watchable
+@planned
+def build(project, env):
+    project.build(env)
+
+
+@cli.command()
+@click.option('--env', metavar='ENV',
+              help='staging/production/development/etc')
+@click.option('--production', '--prod', '--release', 'env',
+              flag_value='production')
+@click.option('--development', '--dev', '--debug', 'env',
+              flag_value='development')
+@click.option('--restart', is_flag=True,
+              help='Restart servers that exit with an error.')
+@click.option('--tmux', is_flag=True,
+              help='Run servers side by side in tmux panes.')
+@pass_project
+@recorded
+def run(project, env, restart, tmux):
+    project.restart = restart
+    project.tmux = tmux
+    project.run(env)
+
+
+@cli.command()
+@click.option('--env', metavar='ENV',
+              help='staging/production/development/etc')
+@click.option('--production', '--prod', 'env', flag_value='production')
+@click.option('--development', '--dev', 'env', flag_value='development')
+@pass_project
+@recorded
+def deploy(project, env):
+    project.deploy(env)
+
+
+@cli.command()
+@click.option('--fix', is_flag=True,
+              help='Fix lint errors instead of reporting them')
+@watchable
+@pass_project
+@recorded
+def lint(project, fix):
+    project.lint(fix=fix)
+
+
+def parse_shard(ctx, param, value):
+    from .sharding import parse_shard
+    return parse_shard(ctx, param, value)
+
+
+@cli.command()
+@click.option('--shards', type=click.IntRange(min=1), metavar='N',
+              help='Split the tests into N shards balanced by how long '
+              'they took before, and run them in parallel.')
+@click.option('--shard', metavar='I/N', callback=parse_shard,
+              help='Only run shard I of N, e.g. on one of N CI nodes.')
+@click.option('--affected', is_flag=True,
+              help='Only run the tests affected by uncommitted changes, '
+              'or by the changes since --since.')
+@click.option('--since', metavar='REF',
+              help='Git commit or branch to find changes since, with '
+              '--affected.')
+@watchable
+@planned
+def test(project, shards, shard, affected, since):
+    if shards and shard:
+        raise click.UsageError('--shards and --shard are exclusive')
+    if affected and (shards or shard):
+        raise click.UsageError("--affected can't be combined with shards")
+    if since and not affected:
+        raise click.UsageError('--since is only used with --affected')
+    if affected:
+        project.test_affected(since)
+    elif shards or shard:
+        from . import sharding
+        sharding.run(project, shards, shard)
+    else:
+        project.test()
+
+
+@cli.command()
+@click.option('--fail-fast', is_flag=True,
+              help='Stop the remaining checks as soon as one fails')
+@pass_project
+@recorded
+def check(project, fail_fast):
+    project.check(fail_fast=fail_fast)
+
+
+@cli.command()
+@click.option('--threshold', default=20, metavar='PERCENT', show_default=True,
+              help='Report commands that got this much slower')
+@pass_project
+def stats(project, threshold):
+    from . import history
+    history.print_stats(project, threshold / 100)
+
+
+@cli.command('daemon')
+@click.option('--stop', is_flag=True, help='Stop the running daemon.')
+def daemon_command(stop):
+    """
+    Keep this and the projects it finds loaded in the background, so
+    later commands start faster. Runs until stopped with Ctrl-C or --stop.
+    """
+    from . import daemon
+    if stop:
+        daemon.stop()
+    else:
+        daemon.serve()
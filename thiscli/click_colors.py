@@ -47,7 +47,8 @@ class HelpColorsMixin(object):
                 formatter.write_text(click.style(self.help, fg='blue'))
 
     def format_post_sections(self, ctx, formatter):
-        for title, text in self.post_sections:
+        for section in self.post_sections:
+            title, text = section() if callable(section) else section
             with formatter.section(title):
                 formatter.write_text(text)
 
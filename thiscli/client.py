@@ -0,0 +1,106 @@
+"""
+Thin client running commands in the daemon (see thiscli.daemon). It only
+imports modules the interpreter has mostly loaded already, so a command
+run by the daemon doesn't pay for importing click or finding the project.
+"""
+
+import array
+import json
+import os
+import signal
+import socket
+import sys
+
+# Commands that may read from the terminal, which commands run by the
+# daemon can't do, so they always run in this process
+IN_PROCESS_COMMANDS = {'daemon', 'run', 'deploy'}
+
+# Signals passed on to the command running in the daemon
+FORWARDED_SIGNALS = [signal.SIGINT, signal.SIGTERM, signal.SIGHUP]
+
+
+def socket_path():
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return os.path.join(runtime_dir, 'this-daemon.sock')
+    root = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(root, 'this', 'daemon.sock')
+
+
+def connect():
+    """Return a socket connected to the daemon, or None if not running"""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path())
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+def send_request(sock, request, fds=()):
+    """Send a request as a line of JSON, passing fds along with it"""
+    data = json.dumps(request).encode('utf-8') + b'\n'
+    ancillary = [(socket.SOL_SOCKET, socket.SCM_RIGHTS,
+                  array.array('i', fds))] if fds else []
+    sent = sock.sendmsg([data], ancillary)
+    sock.sendall(data[sent:])
+
+
+def run(args):
+    """
+    Run the command given by args in the daemon, with its output going
+    straight to this process's stdout and stderr, and return its exit
+    code. Returns None if the command has to run in this process instead,
+    e.g. when the daemon isn't running.
+    """
+    if os.environ.get('THIS_NO_DAEMON') or IN_PROCESS_COMMANDS & set(args):
+        return None
+    try:
+        cwd = os.getcwd()
+    except OSError:
+        return None
+    sock = connect()
+    if sock is None:
+        return None
+
+    umask = os.umask(0)
+    os.umask(umask)
+    request = dict(args=args, cwd=cwd, env=dict(os.environ), umask=umask)
+    with sock:
+        try:
+            send_request(sock, request,
+                         fds=[sys.stdout.fileno(), sys.stderr.fileno()])
+        except OSError:
+            return None
+        return wait_for_exit(sock)
+
+
+def wait_for_exit(sock):
+    """
+    Wait for the exit code of the command sent to the daemon, passing on
+    signals such as Ctrl-C to it in the meantime
+    """
+    def forward(signum, frame):
+        try:
+            sock.sendall('signal {}\n'.format(signum).encode('ascii'))
+        except OSError:
+            pass
+
+    handlers = {signum: signal.signal(signum, forward)
+                for signum in FORWARDED_SIGNALS}
+    try:
+        for line in sock.makefile('rb'):
+            kind, _, value = line.decode('ascii').strip().partition(' ')
+            if kind == 'exit':
+                return int(value)
+            if kind == 'fallback':
+                return None
+    except OSError:
+        pass
+    finally:
+        for signum, handler in handlers.items():
+            signal.signal(signum, handler)
+
+    sys.stderr.write('this: lost the connection to the daemon\n')
+    return 1
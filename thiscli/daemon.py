@@ -0,0 +1,294 @@
+"""
+`this daemon`: a server that keeps thiscli and the projects it has found
+loaded, so commands sent by the thin client (see thiscli.client) skip
+interpreter startup, imports and finding the project. Each command runs
+in a process forked from the daemon, writing straight to the client's
+stdout and stderr, and its exit code is sent back to the client.
+
+Found projects are forgotten when inotify reports changes to the paths
+their detection depends on, or where inotify isn't available, when their
+stat stamps change.
+"""
+
+import array
+from contextlib import redirect_stdout
+import io
+import json
+import os
+import selectors
+import signal
+import socket
+import sys
+import threading
+import traceback
+
+import click
+
+from . import cache, client
+from .client import FORWARDED_SIGNALS
+from . import project as projects
+from .inotify import Inotify
+from .project import Project, system_exit_code
+from .util import fail
+
+# Seconds between checks for finished commands
+TICK = 1
+
+# Longest request accepted from a client, in bytes
+MAX_REQUEST = 1 << 20
+
+
+def source_stamps():
+    """Stat stamps of thiscli's own modules, to notice upgrades"""
+    root = os.path.dirname(os.path.abspath(__file__))
+    return cache.stat_stamps(
+        os.path.join(directory, name)
+        for directory, dirnames, names in os.walk(root)
+        for name in names if name.endswith('.py'))
+
+
+def receive_request(conn):
+    """Return a request sent by client.send_request() and its fds"""
+    fds = array.array('i')
+    data, ancillary, flags, address = conn.recvmsg(
+        MAX_REQUEST, socket.CMSG_LEN(2 * fds.itemsize))
+    for level, kind, fd_data in ancillary:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(fd_data[:len(fd_data) - len(fd_data) % fds.itemsize])
+
+    while not data.endswith(b'\n'):
+        more = conn.recv(MAX_REQUEST)
+        if not more or len(data) > MAX_REQUEST:
+            raise ValueError('incomplete request')
+        data += more
+    return json.loads(data.decode('utf-8')), list(fds)
+
+
+class Daemon:
+    def __init__(self, path):
+        self.path = path
+        self.sources = source_stamps()
+        self.children = set()
+        self.running = True
+        try:
+            self.inotify = Inotify()
+        except OSError:
+            self.inotify = None
+        # Keys of the warm projects depending on each watched path, and
+        # of those that couldn't be watched
+        self.watched = {}
+        self.unwatched = set()
+        projects.warm_projects = {}
+
+    def listen(self):
+        if os.path.exists(self.path):
+            sock = client.connect()
+            if sock is not None:
+                sock.close()
+                fail('The daemon is already running')
+            os.remove(self.path)
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(self.path)
+        os.chmod(self.path, 0o600)
+        self.server.listen(16)
+
+    def serve(self):
+        self.listen()
+        click.secho('Listening on ' + self.path, fg='blue', bold=True)
+
+        # Everything commands might use is imported up front
+        Project.all_projects()
+        from . import cli, history, plan, quiet, supervisor  # noqa: F401
+        import subprocess  # noqa: F401
+
+        selector = selectors.DefaultSelector()
+        selector.register(self.server, selectors.EVENT_READ)
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        try:
+            while self.running:
+                if selector.select(TICK):
+                    self.accept()
+                self.reap()
+        finally:
+            self.server.close()
+            os.remove(self.path)
+
+    def accept(self):
+        conn, address = self.server.accept()
+        fds = []
+        with conn:
+            try:
+                request, fds = receive_request(conn)
+                self.handle(conn, request, fds)
+            except (OSError, ValueError) as error:
+                click.secho('Bad request: {}'.format(error), fg='red')
+            finally:
+                for fd in fds:
+                    os.close(fd)
+
+    def handle(self, conn, request, fds):
+        if request.get('stop'):
+            self.running = False
+            conn.sendall(b'exit 0\n')
+            return
+        if not cache.stamps_valid(self.sources):
+            # Upgraded since the daemon started, so let the client run
+            # the new version and stop
+            self.running = False
+            conn.sendall(b'fallback\n')
+            return
+        if len(fds) != 2:
+            raise ValueError('expected stdout and stderr')
+
+        try:
+            os.chdir(request['cwd'])
+        except OSError:
+            conn.sendall(b'fallback\n')
+            return
+        os.environ.clear()
+        os.environ.update(request['env'])
+        os.umask(request.get('umask', 0o022))
+        self.warm_up()
+
+        pid = os.fork()
+        if pid == 0:
+            try:
+                self.server.close()
+                run_child(conn, request['args'], fds)
+            finally:
+                # Never return to the daemon's loop
+                os._exit(1)
+        self.children.add(pid)
+
+    def warm_up(self):
+        """Find the project for the current directory, if not already warm"""
+        self.forget_changed()
+        known = set(projects.warm_projects)
+        try:
+            with redirect_stdout(io.StringIO()):
+                Project.detect_cached()
+        except (SystemExit, Exception):
+            # Reported by the command itself, in the child
+            return
+        for key in set(projects.warm_projects) - known:
+            self.watch(key)
+
+    def watch(self, key):
+        project, stamps = projects.warm_projects[key]
+        for path in stamps:
+            wd = None
+            if self.inotify is not None:
+                wd = self.inotify.watch_path(path)
+            if wd is None:
+                self.unwatched.add(key)
+            else:
+                self.watched.setdefault(self.inotify.paths[wd],
+                                        set()).add(key)
+
+    def forget_changed(self):
+        """Forget the warm projects whose detection may have changed"""
+        changed = set()
+        if self.inotify is not None:
+            while True:
+                events = self.inotify.read()
+                if not events:
+                    break
+                for path, mask, name in events:
+                    if path is None:
+                        # Events were lost
+                        changed.update(projects.warm_projects)
+                    changed.update(self.watched.pop(path, ()))
+
+        changed.update(key for key in self.unwatched
+                       if not cache.stamps_valid(
+                           projects.warm_projects[key][1]))
+        for key in changed:
+            projects.warm_projects.pop(key, None)
+            self.unwatched.discard(key)
+
+    def reap(self):
+        for pid in list(self.children):
+            try:
+                done, status = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                done = pid
+            if done:
+                self.children.discard(pid)
+
+
+def run_child(conn, args, fds):
+    """Run a command in a process forked from the daemon, then exit"""
+    exit_code = 1
+    try:
+        # In its own process group, so signals from the client reach
+        # the commands it runs too, as Ctrl-C in a terminal would
+        os.setpgrp()
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        for signum in [signal.SIGTERM, signal.SIGHUP]:
+            signal.signal(signum,
+                          lambda signum, frame: sys.exit(128 + signum))
+
+        # Commands can't read from the client's terminal, as they aren't
+        # in its foreground process group
+        stdin = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(stdin, 0)
+        os.dup2(fds[0], 1)
+        os.dup2(fds[1], 2)
+        sys.stdin = open(0, closefd=False)
+        sys.stdout = open(1, 'w', buffering=1, closefd=False)
+        sys.stderr = open(2, 'w', buffering=1, closefd=False)
+        sys.argv = ['this'] + args
+
+        threading.Thread(target=forward_signals, args=(conn,),
+                         daemon=True).start()
+        exit_code = run_cli(args)
+    finally:
+        # Signals may still come in when the client disconnects
+        for signum in FORWARDED_SIGNALS:
+            signal.signal(signum, signal.SIG_IGN)
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            conn.sendall('exit {}\n'.format(exit_code).encode('ascii'))
+        except (OSError, ValueError):
+            pass
+        os._exit(0)
+
+
+def run_cli(args):
+    from .cli import cli
+
+    try:
+        cli.main(args, prog_name='this')
+    except SystemExit as exit:
+        return system_exit_code(exit)
+    except BaseException:
+        traceback.print_exc()
+        return 1
+    return 0
+
+
+def forward_signals(conn):
+    """Deliver the signals the client sends to the command's processes"""
+    for line in conn.makefile('rb'):
+        kind, _, value = line.decode('ascii').strip().partition(' ')
+        if kind == 'signal':
+            os.killpg(0, int(value))
+    # The client is gone, like a closed terminal
+    os.killpg(0, signal.SIGHUP)
+
+
+def serve():
+    Daemon(client.socket_path()).serve()
+
+
+def stop():
+    sock = client.connect()
+    if sock is None:
+        fail("The daemon isn't running")
+    with sock:
+        client.send_request(sock, dict(stop=True))
+        sock.makefile('rb').readline()
+    click.echo('Stopped the daemon')
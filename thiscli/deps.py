@@ -0,0 +1,87 @@
+"""
+Stamps recording the dependency manifests an installed tree (such as
+node_modules or a virtualenv) was last installed from
+"""
+
+import glob
+import hashlib
+import os
+
+from . import plan
+
+STAMP_FILENAME = '.this-deps-stamp'
+
+
+def files_digest(project, patterns):
+    """Hash of the names and contents of the files matching patterns"""
+    digest = hashlib.sha256()
+    for pattern in patterns:
+        for path in sorted(glob.glob(project.path(pattern))):
+            if not os.path.isfile(path):
+                continue
+            digest.update(os.path.relpath(path, project.cwd)
+                          .encode('utf-8') + b'\0')
+            with open(path, 'rb') as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+
+def pattern_paths(project, patterns):
+    """
+    Return the files matching patterns and the directories they are
+    matched in, whose stat stamps change along with files_digest()
+    """
+    paths = set()
+    for pattern in patterns:
+        paths.add(os.path.dirname(project.path(pattern)))
+        paths.update(glob.glob(project.path(pattern)))
+    return sorted(paths)
+
+
+class DependencyStamp:
+    """
+    Content hash of a project's dependency manifests and lockfiles,
+    compared against the hash stored in the installed tree to decide
+    whether dependencies need to be installed again. Unlike comparing
+    mtimes, this is unaffected by checkouts that preserve or reset them.
+    """
+
+    def __init__(self, project, manifests, installed_dir, stamp_path=None):
+        self.project = project
+        self.manifests = manifests
+        self.installed_dir = project.path(installed_dir)
+        self.stamp_path = stamp_path or os.path.join(self.installed_dir,
+                                                     STAMP_FILENAME)
+
+    def digest(self):
+        return files_digest(self.project, self.manifests)
+
+    def outdated(self):
+        if not os.path.isdir(self.installed_dir):
+            return True
+        try:
+            with open(self.stamp_path) as f:
+                return f.read().strip() != self.digest()
+        except OSError:
+            return True
+
+    def save(self):
+        if not os.path.isdir(self.installed_dir):
+            return
+        os.makedirs(os.path.dirname(self.stamp_path), exist_ok=True)
+        with open(self.stamp_path, 'w') as f:
+            f.write(self.digest() + '\n')
+
+    def paths(self):
+        """Paths whose stat stamps change whenever outdated() might"""
+        return pattern_paths(self.project, self.manifests) + [
+            self.installed_dir, self.stamp_path]
+
+    def install(self, install):
+        """Run install() if outdated, saving the stamp if it succeeds"""
+        if not self.outdated():
+            plan.watch(self.paths())
+            return
+        plan.uncacheable()
+        if install() == 0:
+            self.save()
@@ -0,0 +1,282 @@
+"""
+History of how long each action took, kept in a SQLite database under
+the cache directory and reported by `this stats`
+"""
+
+from contextlib import contextmanager
+import os
+import sqlite3
+import time
+
+import click
+
+from . import cache, timings
+from .project import system_exit_code
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS invocations (
+    id INTEGER PRIMARY KEY,
+    time REAL NOT NULL,
+    project_type TEXT NOT NULL,
+    cwd TEXT NOT NULL,
+    action TEXT NOT NULL,
+    env TEXT,
+    duration REAL NOT NULL,
+    exit_code INTEGER NOT NULL,
+    git_head TEXT
+);
+CREATE INDEX IF NOT EXISTS invocations_by_project
+    ON invocations (cwd, action, time);
+CREATE TABLE IF NOT EXISTS commands (
+    invocation_id INTEGER NOT NULL REFERENCES invocations (id),
+    job TEXT NOT NULL,
+    command TEXT NOT NULL,
+    duration REAL NOT NULL,
+    user_cpu REAL,
+    system_cpu REAL,
+    max_rss_kb INTEGER,
+    exit_code INTEGER
+);
+CREATE INDEX IF NOT EXISTS commands_by_invocation
+    ON commands (invocation_id);
+'''
+
+# Runs compared against the earlier ones when looking for regressions
+RECENT_RUNS = 5
+BASELINE_RUNS = 50
+
+# Changes smaller than this many seconds are never regressions, as
+# short commands vary a lot relative to how long they take
+MIN_REGRESSION = 0.5
+
+
+def history_path():
+    return cache.cache_path('history.sqlite3')
+
+
+def connect(path=None):
+    path = path or history_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    db = sqlite3.connect(path, timeout=5)
+    db.executescript(SCHEMA)
+    return db
+
+
+def git_head(path):
+    """
+    Return the commit checked out in the git repository containing path,
+    read directly from .git so git doesn't have to be run, or None
+    """
+    path = os.path.abspath(path)
+    while True:
+        git_dir = os.path.join(path, '.git')
+        if os.path.exists(git_dir):
+            break
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+    try:
+        if os.path.isfile(git_dir):
+            # A worktree or submodule, pointing at its real git directory
+            with open(git_dir) as f:
+                git_dir = os.path.join(path, f.read().split(':', 1)[1]
+                                       .strip())
+        with open(os.path.join(git_dir, 'HEAD')) as f:
+            head = f.read().strip()
+        if not head.startswith('ref: '):
+            return head
+        ref = head[len('ref: '):]
+
+        # Worktrees keep their refs in the main repository
+        common_dir = git_dir
+        if os.path.exists(os.path.join(git_dir, 'commondir')):
+            with open(os.path.join(git_dir, 'commondir')) as f:
+                common_dir = os.path.join(git_dir, f.read().strip())
+        for directory in [git_dir, common_dir]:
+            try:
+                with open(os.path.join(directory, ref)) as f:
+                    return f.read().strip()
+            except OSError:
+                pass
+        with open(os.path.join(common_dir, 'packed-refs')) as f:
+            for line in f:
+                if line.rstrip('\n').endswith(' ' + ref):
+                    return line.split(' ', 1)[0]
+    except (OSError, IndexError):
+        pass
+    return None
+
+
+def record(project, action, env, start, exit_code, path=None,
+           first_command=0):
+    """
+    Record an action that ran from start until now, running the commands
+    timed from first_command on
+    """
+    recorder = timings.recorder
+    commands = (recorder.commands[first_command:] if recorder is not None
+                else [])
+    try:
+        db = connect(path)
+        with db:
+            invocation = db.execute(
+                'INSERT INTO invocations (time, project_type, cwd, action, '
+                'env, duration, exit_code, git_head) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (start, project.type_name, project.cwd, action, env,
+                 time.time() - start, exit_code, git_head(project.cwd)))
+            db.executemany(
+                'INSERT INTO commands VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                [(invocation.lastrowid, command['job'], command['cmd'],
+                  command['end'] - command['start'], command['user'],
+                  command['system'], command['max_rss_kb'],
+                  command['returncode'])
+                 for command in commands])
+        db.close()
+    except (sqlite3.Error, OSError):
+        # Keeping history is best-effort, e.g. on a read-only home
+        pass
+
+
+@contextmanager
+def recording(project, action, env=None):
+    """Record how long the action run inside the block takes"""
+    start = time.time()
+    # With --watch, earlier runs of the action were timed by the same
+    # recorder
+    recorder = timings.recorder
+    first_command = len(recorder.commands) if recorder is not None else 0
+    try:
+        yield
+    except SystemExit as exit:
+        if not project.dry_run:
+            record(project, action, env, start, system_exit_code(exit),
+                   first_command=first_command)
+        raise
+    if not project.dry_run:
+        record(project, action, env, start, 0, first_command=first_command)
+
+
+def percentile(values, percent):
+    """Return the nearest-rank percentile of values"""
+    values = sorted(values)
+    index = max(0, -(-len(values) * percent // 100) - 1)
+    return values[int(index)]
+
+
+def median(values):
+    return percentile(values, 50)
+
+
+def trend(durations):
+    """
+    Return the change in median duration of the most recent runs compared
+    to the runs before them, as a fraction, or None if there are too few
+    runs. durations are ordered from oldest to newest.
+    """
+    recent = durations[-RECENT_RUNS:]
+    baseline = durations[-RECENT_RUNS - BASELINE_RUNS:-RECENT_RUNS]
+    if not baseline or median(baseline) == 0:
+        return None
+    return median(recent) / median(baseline) - 1
+
+
+def action_stats(db, cwd):
+    """Return {action: [durations of successful runs, oldest first]}"""
+    stats = {}
+    for action, duration in db.execute(
+            'SELECT action, duration FROM invocations '
+            'WHERE cwd = ? AND exit_code = 0 ORDER BY time', (cwd,)):
+        stats.setdefault(action, []).append(duration)
+    return stats
+
+
+def regressions(db, cwd, threshold):
+    """
+    Return (action, job, command, baseline, recent) for each command
+    whose median duration over the most recent successful runs grew by
+    more than threshold (a fraction) compared to the runs before them
+    """
+    durations = {}
+    for action, job, command, duration in db.execute(
+            'SELECT action, job, command, commands.duration '
+            'FROM commands JOIN invocations '
+            'ON invocations.id = commands.invocation_id '
+            'WHERE cwd = ? AND commands.exit_code = 0 '
+            'ORDER BY invocations.time', (cwd,)):
+        durations.setdefault((action, job, command), []).append(duration)
+
+    found = []
+    for (action, job, command), values in sorted(durations.items()):
+        change = trend(values)
+        if change is None or change <= threshold:
+            continue
+        baseline = median(values[-RECENT_RUNS - BASELINE_RUNS:-RECENT_RUNS])
+        recent = median(values[-RECENT_RUNS:])
+        if recent - baseline >= MIN_REGRESSION:
+            found.append((action, job, command, baseline, recent))
+    return found
+
+
+def format_seconds(seconds):
+    if seconds >= 60:
+        return '{}m{:02.0f}s'.format(int(seconds // 60), seconds % 60)
+    return '{:.1f}s'.format(seconds)
+
+
+def format_trend(change):
+    if change is None:
+        return '-'
+    return '{:+.0f}%'.format(change * 100)
+
+
+def print_stats(project, threshold, path=None):
+    try:
+        db = connect(path)
+    except (sqlite3.Error, OSError) as error:
+        click.secho('Unable to open the history: {}'.format(error),
+                    fg='red', bold=True)
+        return
+
+    with db:
+        stats = action_stats(db, project.cwd)
+        found = regressions(db, project.cwd, threshold)
+    db.close()
+
+    if not stats:
+        click.echo('No history yet for this project')
+        return
+
+    rows = [('Action', 'Runs', 'p50', 'p90', 'p99', 'Trend')]
+    for action, durations in sorted(stats.items()):
+        rows.append((action, str(len(durations)),
+                     format_seconds(percentile(durations, 50)),
+                     format_seconds(percentile(durations, 90)),
+                     format_seconds(percentile(durations, 99)),
+                     format_trend(trend(durations))))
+    widths = [max(len(row[index]) for row in rows)
+              for index in range(len(rows[0]))]
+
+    click.secho('{} at {}'.format(project.description, project.cwd),
+                fg='blue', bold=True)
+    for index, row in enumerate(rows):
+        line = '  '.join([row[0].ljust(widths[0])] +
+                         [value.rjust(width)
+                          for value, width in zip(row[1:], widths[1:])])
+        click.secho('  ' + line, bold=index == 0)
+    click.echo()
+
+    if not found:
+        click.secho('No commands got more than {:.0f}% slower'
+                    .format(threshold * 100), fg='green')
+        return
+
+    click.secho('Commands that got more than {:.0f}% slower:'
+                .format(threshold * 100), fg='yellow', bold=True)
+    for action, job, command, baseline, recent in found:
+        name = '{} / {}'.format(job, command) if job else command
+        click.echo('  {}: {} ({} -> {}, {})'.format(
+            action, name, format_seconds(baseline), format_seconds(recent),
+            format_trend(recent / baseline - 1)))
@@ -0,0 +1,101 @@
+"""
+Minimal Linux inotify binding using ctypes, for noticing file changes
+without polling. Inotify() raises OSError where inotify isn't available.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import struct
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+
+# Changes to the entries of a directory, and to a file's contents, which
+# are also what change their stat stamps (see cache.stat_stamp())
+DIRECTORY_CHANGES = (IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO |
+                     IN_DELETE_SELF | IN_MOVE_SELF)
+FILE_CHANGES = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_DELETE_SELF |
+                IN_MOVE_SELF)
+
+EVENT = struct.Struct('iIII')
+
+
+class Inotify:
+    def __init__(self):
+        if not hasattr(os, 'O_CLOEXEC'):
+            raise OSError('inotify is not available')
+        name = ctypes.util.find_library('c')
+        self.libc = ctypes.CDLL(name, use_errno=True)
+        if not hasattr(self.libc, 'inotify_init1'):
+            raise OSError('inotify is not available')
+
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.paths = {}
+
+    def fileno(self):
+        return self.fd
+
+    def add_watch(self, path, mask):
+        """Watch path for the events in mask, returning the watch descriptor"""
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), path)
+        self.paths[wd] = path
+        return wd
+
+    def watch_path(self, path):
+        """
+        Watch a directory for changes to its entries, a file for changes
+        to its contents, or the parent of a missing path for its creation.
+        Returns the watch descriptor, or None if nothing could be watched.
+        """
+        try:
+            if os.path.isdir(path):
+                return self.add_watch(path, DIRECTORY_CHANGES | IN_ONLYDIR)
+            if os.path.exists(path):
+                return self.add_watch(path, FILE_CHANGES)
+            return self.add_watch(os.path.dirname(path),
+                                  DIRECTORY_CHANGES | IN_ONLYDIR)
+        except OSError:
+            return None
+
+    def read(self):
+        """
+        Return the pending events as (path watched, event mask, name)
+        tuples, where name is the entry of a watched directory that
+        changed. Returns [] if there are none.
+        """
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = EVENT.unpack_from(data, offset)
+            offset += EVENT.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            path = self.paths.get(wd)
+            if mask & IN_IGNORED:
+                self.paths.pop(wd, None)
+            events.append((path, mask, os.fsdecode(name)))
+        return events
+
+    def close(self):
+        os.close(self.fd)
@@ -0,0 +1,239 @@
+"""
+Cache of linter diagnostics keyed by the content of the linted files, so
+unchanged files don't have to be linted again
+"""
+
+import hashlib
+import os
+import subprocess
+
+import click
+
+from . import cache
+from .project import echo_line, exit_with
+from .pyimports import imported_files
+
+# Files that configure linters or pin their versions
+CONFIG_FILES = ['setup.cfg', 'tox.ini', 'pyproject.toml', '.flake8',
+                '.pylintrc', 'pylintrc', 'Pipfile.lock', 'requirements.txt',
+                'requirements.in', 'package.json', 'package-lock.json',
+                'yarn.lock', '.eslintrc', '.eslintrc.js', '.eslintrc.cjs',
+                '.eslintrc.json', '.eslintrc.yml', '.eslintrc.yaml',
+                '.eslintignore', '.prettierrc']
+
+
+def flake8_exit_code(lines):
+    return 1 if lines else 0
+
+
+class LintCache:
+    """
+    Results of a linter over a project, valid as long as the linter
+    command and configuration are unchanged. File content hashes are
+    remembered by stat stamp so unchanged files aren't read again.
+    """
+
+    def __init__(self, project, name, tool_key=''):
+        self.project = project
+        self.key = cache.cache_key(project.cwd, name)
+        entry = cache.load('lint', self.key) or {}
+        self.hashes = entry.get('hashes', {})
+        self.imports = entry.get('imports', {})
+        self.tool_key = cache.cache_key(
+            tool_key, *[self.hash(filename) for filename in CONFIG_FILES])
+        if entry.get('tool_key') == self.tool_key:
+            self.results = entry.get('results', {})
+        else:
+            self.results = {}
+
+    def hash(self, path):
+        """Content hash of a file relative to the project, or None"""
+        full_path = self.project.path(path)
+        stamp = cache.stat_stamp(full_path)
+        if stamp is None:
+            return None
+
+        known = self.hashes.get(path)
+        if known is not None and known[0] == stamp:
+            return known[1]
+
+        with open(full_path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        self.hashes[path] = (stamp, digest)
+        return digest
+
+    def imported_files(self, path):
+        digest = self.hash(path)
+        known = self.imports.get(path)
+        if known is None or known[0] != digest:
+            known = (digest, imported_files(self.project.cwd, path))
+            self.imports[path] = known
+        return known[1]
+
+    def dependency_hash(self, path):
+        """
+        Hash of a Python file and every project module it imports,
+        directly or indirectly, as linters like pylint infer types
+        across modules
+        """
+        seen = set()
+        pending = [path]
+        while pending:
+            filename = pending.pop()
+            if filename not in seen:
+                seen.add(filename)
+                pending += self.imported_files(filename)
+        return cache.cache_key(*[(filename, self.hash(filename))
+                                 for filename in sorted(seen)])
+
+    def save(self, files):
+        self.hashes = {path: self.hashes[path] for path in self.hashes
+                       if path in files or path in CONFIG_FILES}
+        self.results = {path: result for path, result in self.results.items()
+                        if path in files}
+        cache.store('lint', self.key, dict(tool_key=self.tool_key,
+                                           hashes=self.hashes,
+                                           imports=self.imports,
+                                           results=self.results))
+
+
+def split_by_file(lines, files):
+    """
+    Group linter output lines by the file each one is about. Lines that
+    don't start with a filename, like pylint's module headers, are grouped
+    with the next file. Returns None if some output isn't about any file.
+    """
+    by_file = {}
+    pending = []
+    for line in lines:
+        filename = next((filename for filename in files
+                         if line.startswith(filename + ':')), None)
+        if filename is None:
+            pending.append(line)
+        else:
+            by_file.setdefault(filename, []).extend(pending + [line])
+            pending = []
+    return None if pending else by_file
+
+
+def lint_files(project, name, cmd, targets, files, run, exit_code,
+               follow_imports=False):
+    """
+    Lint files (relative to the project) with cmd, only passing the linter
+    the files that changed since they were last linted and replaying the
+    stored diagnostics for the rest. When no results are cached, cmd is
+    run on targets (e.g. whole packages) instead. run(cmd) runs a command
+    and returns its (exit code, output lines), and exit_code(lines) gives
+    the exit code the linter returns for one file's diagnostics. With
+    follow_imports, a file is also linted again when a module it imports
+    changes.
+    """
+    if project.dry_run or not files:
+        run(cmd + ' ' + ' '.join(targets))
+        return
+
+    lint_cache = LintCache(project, name, tool_key=cmd)
+    keys = {filename: (lint_cache.dependency_hash(filename) if follow_imports
+                       else lint_cache.hash(filename))
+            for filename in files}
+    stale = [filename for filename in files
+             if lint_cache.results.get(filename, (None,))[0] != keys[filename]]
+
+    if not stale:
+        echo_line(click.style('$ {} {} (cached)'.format(cmd,
+                                                        ' '.join(targets)),
+                              fg='white', bold=True))
+    else:
+        if len(stale) == len(files):
+            result = run(cmd + ' ' + ' '.join(targets))
+        else:
+            result = run(cmd + ' ' + ' '.join(stale))
+        if result is None:
+            return
+
+        returncode, lines = result
+        by_file = split_by_file(lines, stale)
+        if by_file is None or returncode != combined_exit_code(
+                [by_file.get(filename, []) for filename in stale], exit_code):
+            # The linter failed in some other way, so don't trust or
+            # cache its output
+            exit_with(returncode)
+            return
+
+        for filename in stale:
+            lint_cache.results[filename] = (keys[filename],
+                                            by_file.get(filename, []))
+        lint_cache.save(files)
+
+    for filename in files:
+        if filename not in stale:
+            for line in lint_cache.results[filename][1]:
+                echo_line(line)
+    exit_with(combined_exit_code([lint_cache.results[filename][1]
+                                  for filename in files], exit_code))
+
+
+def lint_project(project, name, files, cmd, run):
+    """
+    Run a whole-project lint command with run(), which returns its (exit
+    code, output lines), or replay its output from the last run if none
+    of files (relative to the project) have changed since
+    """
+    if project.dry_run:
+        run()
+        return
+
+    lint_cache = LintCache(project, name, tool_key=cmd)
+    key = cache.cache_key(*[(filename, lint_cache.hash(filename))
+                            for filename in files])
+    cached = lint_cache.results.get('.')
+
+    if cached is not None and cached[0] == key:
+        echo_line(click.style('$ {} (cached)'.format(cmd),
+                              fg='white', bold=True))
+        returncode, lines = cached[1]
+        for line in lines:
+            echo_line(line)
+    else:
+        result = run()
+        if result is None:
+            return
+        returncode, lines = result
+        lint_cache.results['.'] = (key, (returncode, lines))
+        lint_cache.save(set(files) | {'.'})
+
+    exit_with(returncode)
+
+
+def combined_exit_code(results, exit_code):
+    code = 0
+    for lines in results:
+        code |= exit_code(lines)
+    return code
+
+
+def source_files(root):
+    """
+    Return the files in a project that aren't ignored by git, relative to
+    the project root, or every file outside dependency and hidden
+    directories when the project isn't in a git repository
+    """
+    try:
+        output = subprocess.run(['git', 'ls-files', '-z', '--cached',
+                                 '--others', '--exclude-standard'],
+                                cwd=root, stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, check=True).stdout
+        return sorted(filename for filename in
+                      output.decode('utf-8', 'replace').split('\0')
+                      if filename)
+    except (OSError, subprocess.CalledProcessError):
+        pass
+
+    files = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(dirname for dirname in dirnames
+                             if not dirname.startswith('.') and
+                             dirname != 'node_modules')
+        files += [os.path.relpath(os.path.join(dirpath, filename), root)
+                  for filename in sorted(filenames)]
+    return files
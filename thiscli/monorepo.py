@@ -0,0 +1,233 @@
+"""Running actions across every project in a directory tree"""
+
+import fnmatch
+import os
+
+import click
+
+from .project import (Project, PROJECT_TYPES, project_class, local,
+                      exit_with, system_exit_code)
+from .util import fail
+
+# Dependency, build output and VCS directories never contain projects
+SKIPPED_DIRS = {'.git', '.hg', '.svn', '.venv', 'venv', 'node_modules',
+                'build', 'target', '__pycache__'}
+
+
+class GitIgnore:
+    """
+    Minimal .gitignore matcher supporting the common cases: plain and
+    glob names, patterns anchored with a slash and directory-only
+    patterns. Negated patterns are not supported and are ignored.
+    """
+
+    def __init__(self, patterns=()):
+        self.patterns = list(patterns)
+
+    def extend(self, directory, relpath):
+        try:
+            with open(os.path.join(directory, '.gitignore')) as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return self
+
+        patterns = list(self.patterns)
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith(('#', '!')):
+                continue
+            dir_only = line.endswith('/')
+            line = line.rstrip('/')
+            anchored = '/' in line
+            patterns.append((relpath, line.lstrip('/'), anchored, dir_only))
+        return GitIgnore(patterns)
+
+    def ignores(self, relpath, is_dir):
+        name = os.path.basename(relpath)
+        for base, pattern, anchored, dir_only in self.patterns:
+            if dir_only and not is_dir:
+                continue
+            if anchored:
+                if fnmatch.fnmatch(os.path.relpath(relpath, base), pattern):
+                    return True
+            elif fnmatch.fnmatch(name, pattern):
+                return True
+        return False
+
+
+def detect_project_type(names):
+    """Return the project type for a directory containing names, if any"""
+    for project_type in PROJECT_TYPES:
+        module, name, markers = project_type
+        if any(fnmatch.filter(names, marker) for marker in markers):
+            return project_type
+    return None
+
+
+def find_project_dirs(top):
+    """
+    Scan down from top for project directories, using the same marker
+    files and precedence as detection from the current directory. Yields
+    (path relative to top, project type) pairs. Directories inside a
+    project are not scanned, except for top itself.
+    """
+    pending = [('.', GitIgnore())]
+    while pending:
+        relpath, ignore = pending.pop()
+        path = os.path.normpath(os.path.join(top, relpath))
+        try:
+            entries = list(os.scandir(path))
+        except OSError:
+            continue
+
+        names = [entry.name for entry in entries]
+        project_type = detect_project_type(names)
+        if project_type is not None:
+            yield relpath, project_type
+            if relpath != '.':
+                continue
+
+        ignore = ignore.extend(path, relpath)
+        subdirs = []
+        for entry in entries:
+            subpath = os.path.normpath(os.path.join(relpath, entry.name))
+            if (entry.name in SKIPPED_DIRS or
+                    not entry.is_dir(follow_symlinks=False) or
+                    ignore.ignores(subpath, is_dir=True)):
+                continue
+            subdirs.append((subpath, ignore))
+        pending += sorted(subdirs, reverse=True)
+
+
+class Monorepo(Project):
+    """Every project found under a directory, run with `this --all`"""
+    description = 'Monorepo'
+
+    def __init__(self, cwd, projects):
+        super().__init__(cwd)
+        self.projects = projects
+        self.can_build = any(project.has_action('build')
+                             for name, project in projects)
+        self.can_test = any(project.has_action('test')
+                            for name, project in projects)
+        self.can_lint = any(project.has_action('lint')
+                            for name, project in projects)
+        self.can_run = False
+        self.can_deploy = False
+
+    @property
+    def can_check(self):
+        return any(project.has_action('check') for name, project in
+                   self.projects)
+
+    @classmethod
+    def find(cls):
+        top = os.getcwd()
+        found = list(find_project_dirs(top))
+
+        # The top directory is only treated as one of the projects if
+        # there are none below it, as it is usually a wrapper around them
+        if len(found) > 1 and found[0][0] == '.':
+            found = found[1:]
+        if not found:
+            fail("Sorry! I couldn't find any projects")
+
+        projects = [(relpath, project_class(module, name)(
+                        os.path.normpath(os.path.join(top, relpath))))
+                    for relpath, (module, name, markers) in found]
+        return cls(top, projects)
+
+    def cache_paths(self):
+        return super().cache_paths() + [
+            path for name, project in self.projects
+            for path in project.cache_paths()]
+
+    def info(self):
+        click.secho('{} projects found:'.format(len(self.projects)),
+                    fg='blue', bold=True)
+        for name, project in self.projects:
+            click.echo('  {} ({})'.format(name, project.description))
+        click.echo()
+
+        click.secho('Available commands:', fg='white', bold=True)
+        for action in self.actions:
+            print('  ' + action)
+
+    def run_all(self, action_name, action, fail_fast=False):
+        """
+        Run action(project) for every project that has the named action,
+        in parallel, then print the status of each project
+        """
+        results = {}
+        jobs = []
+        selected = []
+
+        for name, project in self.projects:
+            project.dry_run = self.dry_run
+            project.quiet = self.quiet
+            project.timeout = self.timeout
+            if not project.has_action(action_name):
+                results[name] = 'skipped'
+                continue
+            selected.append(project)
+
+            def job(name=name, project=project):
+                try:
+                    action(project)
+                except SystemExit as exit:
+                    exit_with(system_exit_code(exit))
+                results[name] = local.exit_code
+
+            jobs.append((name, job))
+
+        if not jobs:
+            fail("Sorry! I don't know how to {} any of your projects"
+                 .format(action_name))
+
+        # The parallel jobs of build tools are shared out between the
+        # projects running at the same time, rather than each of them
+        # running a job per CPU
+        budget = self.job_count(required=True)
+        max_workers = min(budget, len(jobs))
+        for project in selected:
+            project.jobs = max(1, budget // max_workers)
+
+        try:
+            self.parallel(jobs, fail_fast, max_workers=max_workers)
+        finally:
+            if not self.dry_run:
+                self.print_results(results)
+
+    def print_results(self, results):
+        click.echo()
+        for name, project in self.projects:
+            result = results.get(name, 'cancelled')
+            if result == 0:
+                status = click.style('ok', fg='green', bold=True)
+            elif isinstance(result, int):
+                status = click.style('failed (exit code {})'.format(result),
+                                     fg='red', bold=True)
+            else:
+                status = click.style(result, fg='yellow')
+            click.echo('{} ({}): {}'.format(name, project.description,
+                                            status))
+
+    def build(self, env):
+        self.run_all('build', lambda project: project.build(env))
+
+    def test(self):
+        self.run_all('test', lambda project: project.test())
+
+    def lint(self, fix):
+        self.run_all('lint', lambda project: project.lint(fix))
+
+    def check(self, fail_fast=False):
+        self.run_all('check',
+                     lambda project: project.check(fail_fast=fail_fast),
+                     fail_fast)
+
+    def run(self, env):
+        fail("Sorry! Running isn't supported for multiple projects")
+
+    def deploy(self, env):
+        fail("Sorry! Deploying isn't supported for multiple projects")
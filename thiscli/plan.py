@@ -0,0 +1,250 @@
+"""
+Plans of the commands an action runs, recorded without running them, so
+they can be inspected, serialized and cached. A cached plan lets later
+invocations run the action's commands straight away, without detecting
+and constructing the project.
+"""
+
+from contextlib import contextmanager
+import functools
+import os
+
+from . import cache, timings
+from .project import Project, local
+from .util import available_cpus
+
+# The recording in progress, if any
+current = None
+
+
+class PlannedCommand:
+    """
+    One command of a plan: Project.cmd() arguments, with cwd relative to
+    the plan's root (None for the root itself), the name of the parallel
+    job it ran in ('' outside of any) and the indexes of the commands it
+    has to run after
+    """
+
+    FIELDS = ['cmd', 'cwd', 'env', 'env_echo', 'shell', 'job', 'deps']
+
+    def __init__(self, cmd, cwd=None, env=None, env_echo=None, shell=None,
+                 job='', deps=()):
+        self.cmd = cmd
+        self.cwd = cwd
+        self.env = env
+        self.env_echo = env_echo
+        self.shell = shell
+        self.job = job
+        self.deps = list(deps)
+
+    def args(self):
+        """Return the Project.cmd() arguments to run the command"""
+        return dict(cmd=self.cmd, cwd=self.cwd, env=self.env,
+                    env_echo=self.env_echo, shell=self.shell)
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+
+class Plan:
+    """
+    The commands an action runs in a project. A plan is only cacheable
+    when its commands don't depend on anything but the project's files
+    and the watched paths, e.g. not when dependencies have to be
+    installed first or a command's output is used.
+    """
+
+    def __init__(self, action, root, project_type, commands=(),
+                 cacheable=True, watched=()):
+        self.action = action
+        self.root = root
+        self.project_type = project_type
+        self.commands = list(commands)
+        self.cacheable = cacheable
+        self.watched = list(watched)
+
+    def to_dict(self):
+        return dict(action=self.action, root=self.root,
+                    project_type=self.project_type,
+                    commands=[command.to_dict() for command in self.commands],
+                    cacheable=self.cacheable, watched=self.watched)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['action'], data['root'], data['project_type'],
+                   [PlannedCommand(**command) for command in data['commands']],
+                   data['cacheable'], data['watched'])
+
+    def run(self, project):
+        """
+        Run the commands with the options of project, each once the
+        commands it depends on are done. Consecutive commands of a job
+        run one after another, and separate jobs run in parallel.
+        """
+        done = set()
+        pending = list(range(len(self.commands)))
+        while pending:
+            chains = {}
+            for index in pending:
+                command = self.commands[index]
+                chain = chains.get(command.job, [])
+                if all(dep in done or dep in chain for dep in command.deps):
+                    chains[command.job] = chain + [index]
+
+            jobs = [(job or self.action,
+                     functools.partial(self.run_chain, project, chain))
+                    for job, chain in sorted(chains.items())]
+            project.parallel(jobs)
+
+            for chain in chains.values():
+                done.update(chain)
+            pending = [index for index in pending if index not in done]
+
+    def run_chain(self, project, chain):
+        for index in chain:
+            if project.cmd(**self.commands[index].args()):
+                return
+
+
+class Recording:
+    """
+    The commands recorded by recorded(), along with how they depend on
+    each other: commands run one after another unless they ran in
+    separate jobs of Project.parallel()
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.commands = []
+        self.cacheable = True
+        self.watched = set()
+        # Commands the next command outside of any job runs after, and
+        # the last command of each job since
+        self.previous = []
+        self.jobs = {}
+
+    def add(self, project, cmd, cwd, env, env_echo, shell):
+        index = len(self.commands)
+        job = timings.job_name(getattr(local, 'prefix', ''))
+        if not job:
+            deps = list(self.jobs.values()) or self.previous
+            self.previous = [index]
+            self.jobs = {}
+        else:
+            deps = [self.jobs[job]] if job in self.jobs else self.previous
+            self.jobs[job] = index
+
+        cwd = os.path.relpath(project.path(cwd) if cwd else project.cwd,
+                              self.root)
+        self.commands.append(PlannedCommand(
+            cmd, None if cwd == '.' else cwd, env, env_echo, shell, job, deps))
+
+
+@contextmanager
+def recorded(root):
+    """
+    Record the commands that any project runs inside the block instead of
+    running them, yielding the Recording. Paths checked with
+    Project.exists() are watched, as the commands may depend on them.
+    """
+    from unittest.mock import patch
+    global current
+
+    recording = Recording(root)
+
+    def run_command(self, cmd, cwd=None, env=None, env_echo=None,
+                    echo=True, shell=None, capture=False, timeout=None):
+        if capture:
+            # The output is used to decide what to do next
+            recording.cacheable = False
+        recording.add(self, cmd, cwd, env, env_echo, shell)
+
+    def exists(self, *path):
+        recording.watched.add(self.path(*path))
+        return os.path.exists(self.path(*path))
+
+    previous, current = current, recording
+    try:
+        with patch.object(Project, 'cmd', new=run_command), \
+                patch.object(Project, 'exists', new=exists):
+            yield recording
+    finally:
+        current = previous
+
+
+def watch(paths):
+    """Keep the plan being recorded valid only while paths are unchanged"""
+    if current is not None:
+        current.watched.update(paths)
+
+
+def recording():
+    """Whether a plan is being recorded, rather than run"""
+    return current is not None
+
+
+def uncacheable():
+    """
+    Mark the plan being recorded as not cacheable, as running it changes
+    what it would be, e.g. by installing dependencies
+    """
+    if current is not None:
+        current.cacheable = False
+
+
+def record(project, action, function, **kwargs):
+    """Return the Plan of function(project, **kwargs), running nothing"""
+    dry_run = project.dry_run
+    # Parallel jobs run one at a time in a dry run, so commands of the
+    # same job are recorded in order
+    project.dry_run = True
+    try:
+        with recorded(project.cwd) as recording:
+            function(project, **kwargs)
+    finally:
+        project.dry_run = dry_run
+    return Plan(action, project.cwd, project.type_name, recording.commands,
+                recording.cacheable, sorted(recording.watched))
+
+
+def plan_key(action, kwargs, jobs):
+    # Detection depends on the directory and what is installed, and the
+    # commands on the options and the CPUs available for jobs
+    return cache.cache_key(os.getcwd(), os.environ.get('PATH'),
+                           os.environ.get('VIRTUAL_ENV'), action,
+                           sorted(kwargs.items()), jobs, available_cpus())
+
+
+def load_cached(action, kwargs, jobs):
+    """Return the cached plan for the action if it is still valid"""
+    entry = cache.load('plans', plan_key(action, kwargs, jobs))
+    if entry is None or not cache.stamps_valid(entry['stamps']):
+        return None
+    return Plan.from_dict(entry['plan'])
+
+
+def store(plan, kwargs, jobs, detection_stamps):
+    """
+    Cache a plan, valid as long as the project is detected the same way
+    (see Project.find_cached()) and the watched paths are unchanged
+    """
+    stamps = dict(detection_stamps, **cache.stat_stamps(plan.watched))
+    cache.store('plans', plan_key(plan.action, kwargs, jobs),
+                dict(stamps=stamps, plan=plan.to_dict()))
+
+
+class PlannedProject(Project):
+    """
+    Stands in for the project a cached plan was recorded in, to run the
+    plan with the cli's options
+    """
+
+    description = 'Planned'
+
+    def __init__(self, plan):
+        super().__init__(plan.root)
+        self.plan = plan
+
+    @property
+    def type_name(self):
+        return self.plan.project_type
@@ -1,15 +1,69 @@
 from abc import ABC, abstractmethod
 from contextlib import contextmanager
-import subprocess
 import os
+import signal
 import sys
 import threading
-import fnmatch
+import time
+import importlib
 import click
 
-from ..util import walk_up, fail, oxford_join
+from .. import cache, timings
+from ..util import (available_cpus, find_markers, fail, has_command,
+                    oxford_join)
 
 local = threading.local()
+output_lock = threading.Lock()
+
+JOB_COLORS = ['cyan', 'magenta', 'yellow', 'green', 'blue']
+
+# Longest line of output read from a command at once, in bytes
+MAX_LINE = 65536
+
+# Exit code of a command that timed out, as used by timeout(1)
+TIMEOUT_EXIT_CODE = 124
+
+# Seconds terminated commands get to exit before they are killed
+TERMINATE_GRACE = 5
+
+# Projects kept in memory by the daemon (see thiscli.daemon), as
+# {cache key: (project, stamps)}, or None when not running in the daemon
+warm_projects = None
+
+# Project types in detection order, as (module, class name, marker files).
+#
+# Make should be below project types that generate a Makefile, but
+# above other projects to support projects that use a Makefile wrapper
+#
+# Laravel needs to go above Node.js as it may also contain an
+# npm-managed frontend.
+#
+# Ansible should be last as it could be used in combination with
+# other project types and is supported as a fallback deploy target in
+# the base Project implementation
+PROJECT_TYPES = [
+    ('autotools', 'AutotoolsProject', ['configure.ac']),
+    ('meson', 'MesonProject', ['meson.build']),
+    ('cmake', 'CMakeProject', ['CMakeLists.txt']),
+    ('make', 'MakeProject', ['Makefile']),
+    ('laravel', 'LaravelProject', ['artisan']),
+    ('nodejs', 'NodejsProject', ['package.json']),
+    ('python', 'PythonProject', ['setup.py', 'requirements.txt',
+                                 'requirements.in', 'Pipfile']),
+    ('cargo', 'CargoProject', ['Cargo.toml']),
+    ('gradle', 'GradleProject', ['build.gradle']),
+    ('dotnet', 'DotnetCoreProject', ['*.csproj']),
+    ('ansible', 'AnsibleProject', ['ansible']),
+]
+
+
+def project_class(module, name):
+    return getattr(importlib.import_module('.' + module, __name__), name)
+
+
+def project_markers(cls):
+    return next(markers for module, name, markers in PROJECT_TYPES
+                if name == cls.__name__)
 
 
 @contextmanager
@@ -17,17 +71,191 @@ def delayed_exit():
     already_delayed = hasattr(local, 'exit_code')
     if not already_delayed:
         local.exit_code = 0
-    yield
-    if not already_delayed:
-        if local.exit_code != 0:
-            sys.exit(local.exit_code)
-        delattr(local, 'exit_code')
+    try:
+        yield
+    finally:
+        if not already_delayed:
+            exit_code = local.exit_code
+            delattr(local, 'exit_code')
+    if not already_delayed and exit_code != 0:
+        sys.exit(exit_code)
+
+
+def exit_with(code):
+    """Exit with a non-zero code, or record it if inside delayed_exit()"""
+    if code == 0:
+        return
+    if hasattr(local, 'exit_code'):
+        if local.exit_code == 0:
+            local.exit_code = code
+    else:
+        sys.exit(code)
+
+
+def system_exit_code(exit):
+    if exit.code is None or isinstance(exit.code, int):
+        return exit.code or 0
+    return 1
+
+
+class JobGroup:
+    """
+    Jobs run by Project.parallel(). Child processes started by the jobs
+    (and by any nested groups) are tracked so the whole group can be
+    cancelled when one of its jobs fails in fail-fast mode.
+    """
+
+    def __init__(self, fail_fast, parent=None):
+        self.fail_fast = fail_fast
+        self.parent = parent
+        self.procs = set()
+        self.exit_code = 0
+        self.lock = threading.Lock()
+        self._cancelled = False
+
+    @property
+    def cancelled(self):
+        return self._cancelled or (self.parent is not None and
+                                   self.parent.cancelled)
+
+    def started(self, proc):
+        with self.lock:
+            self.procs.add(proc)
+        if self.parent is not None:
+            self.parent.started(proc)
+        if self.cancelled:
+            terminate(proc)
+
+    def finished(self, proc):
+        with self.lock:
+            self.procs.discard(proc)
+        if self.parent is not None:
+            self.parent.finished(proc)
+
+    def failed(self, code):
+        with self.lock:
+            if self.exit_code == 0:
+                self.exit_code = code
+        if self.fail_fast:
+            self.cancel()
+        if self.parent is not None:
+            self.parent.failed(code)
+
+    def cancel(self):
+        with self.lock:
+            self._cancelled = True
+            procs = list(self.procs)
+        for proc in procs:
+            terminate(proc)
+
+
+class StatusLine:
+    """
+    A line at the bottom of the terminal showing the commands running in
+    quiet mode and how much output they have printed, cleared whenever
+    other output is written. Only shown when stderr is a terminal.
+    """
+
+    # Seconds between redraws, to keep chatty commands cheap
+    INTERVAL = 0.1
+
+    def __init__(self):
+        self.commands = {}
+        self.shown = False
+        self.drawn_at = 0
+
+    def update(self, key, cmd, lines):
+        with output_lock:
+            if key not in self.commands:
+                self.commands[key] = (getattr(local, 'prefix', ''), cmd,
+                                      time.time())
+            now = time.time()
+            if now - self.drawn_at >= self.INTERVAL:
+                self.draw(lines, now)
+
+    def remove(self, key):
+        with output_lock:
+            self.commands.pop(key, None)
+            self.clear()
+
+    def draw(self, lines, now):
+        import shutil
+
+        if not sys.stderr.isatty() or not self.commands:
+            return
+        self.drawn_at = now
+        prefix, cmd, start = list(self.commands.values())[-1]
+        status = '{}{} ({} lines, {:.0f}s)'.format(
+            prefix, cmd, lines, now - start)
+        if len(self.commands) > 1:
+            status += ' +{} more'.format(len(self.commands) - 1)
+        width = shutil.get_terminal_size().columns - 1
+        if len(click.unstyle(status)) > width:
+            status = click.unstyle(status)[:width]
+        sys.stderr.write('\r\x1b[K' + status)
+        sys.stderr.flush()
+        self.shown = True
+
+    def clear(self):
+        """Clear the line; output_lock must be held"""
+        if self.shown:
+            sys.stderr.write('\r\x1b[K')
+            sys.stderr.flush()
+            self.shown = False
+
+
+status_line = StatusLine()
+
+
+class CommandResult:
+    """
+    The outcome of a command run by Project.run_command(): its exit code,
+    its output lines if captured, how long it took, and whether it timed
+    out or was cancelled along with the rest of its job group
+    """
+
+    def __init__(self, cmd, returncode, lines=None, duration=0,
+                 timed_out=False, cancelled=False):
+        self.cmd = cmd
+        self.returncode = returncode
+        self.lines = lines
+        self.duration = duration
+        self.timed_out = timed_out
+        self.cancelled = cancelled
+
+    @property
+    def ok(self):
+        return self.returncode == 0
+
+
+def terminate(proc):
+    """
+    Terminate a process started in its own session and its children,
+    killing any that are still running after TERMINATE_GRACE seconds
+    """
+    signal_group(proc, signal.SIGTERM)
+    timer = threading.Timer(TERMINATE_GRACE, signal_group,
+                            [proc, signal.SIGKILL])
+    timer.daemon = True
+    timer.start()
+
+
+def signal_group(proc, sig):
+    try:
+        os.killpg(proc.pid, sig)
+    except ProcessLookupError:
+        pass
 
 
 class Project(ABC):
     def __init__(self, cwd):
         self.cwd = cwd
         self.dry_run = False
+        self.jobs = None
+        self.quiet = False
+        self.timeout = None
+        self.tmux = False
+        self.restart = False
         self.description += ' project'
         self.using = []
 
@@ -38,44 +266,15 @@ class Project(ABC):
 
     @classmethod
     def all_projects(cls):
-        from .autotools import AutotoolsProject
-        from .meson import MesonProject
-        from .cmake import CMakeProject
-        from .make import MakeProject
-        from .laravel import LaravelProject
-        from .nodejs import NodejsProject
-        from .python import PythonProject
-        from .cargo import CargoProject
-        from .gradle import GradleProject
-        from .dotnet import DotnetCoreProject
-        from .ansible import AnsibleProject
-
-        # Make should be below project types that generate a Makefile,
-        # but above other projects to support projects that use a
-        # Makefile wrapper
-        #
-        # Laravel needs to go above Node.js as it may also contain an
-        # npm-managed frontend.
-        #
-        # Ansible should be last as it could be used in combination
-        # with other project types and is supported as a fallback
-        # deploy target in the base Project implementation
-        return [AutotoolsProject,
-                MesonProject,
-                CMakeProject,
-                MakeProject,
-                LaravelProject,
-                NodejsProject,
-                PythonProject,
-                CargoProject,
-                GradleProject,
-                DotnetCoreProject,
-                AnsibleProject]
+        return [project_class(module, name)
+                for module, name, markers in PROJECT_TYPES]
 
     @classmethod
-    @abstractmethod
     def find(cls):
-        project = Project.find_one_of(*cls.all_projects())
+        if cls is not Project:
+            return cls.find_containing(*project_markers(cls))
+
+        project = Project.find_one_of(*PROJECT_TYPES)
 
         if project is None:
             print("Sorry! I don't recognize your project type")
@@ -83,32 +282,116 @@ class Project(ABC):
 
         return project
 
+    @classmethod
+    def find_cached(cls):
+        """
+        Like find(), but reuse the project detected by an earlier
+        invocation from the same directory as long as the directories
+        probed during detection and the project's own files (see
+        cache_paths()) haven't changed since.
+        """
+        return cls.detect_cached()[0]
+
+    @classmethod
+    def detect_cached(cls):
+        """
+        Return (project, stamps) as found by find_cached(), where stamps
+        are the stat stamps its detection is valid for
+        """
+        key = cache.cache_key(os.getcwd(), os.environ.get('PATH'))
+        if warm_projects is not None and key in warm_projects:
+            return warm_projects[key]
+
+        entry = cache.load('projects', key)
+        if entry is not None and cache.stamps_valid(entry['stamps']):
+            found = entry['project'], entry['stamps']
+        else:
+            visited = []
+            project = Project.find_one_of(*PROJECT_TYPES, visited=visited)
+
+            if project is None:
+                print("Sorry! I don't recognize your project type")
+                sys.exit(1)
+
+            stamps = cache.stat_stamps(visited + project.cache_paths())
+            cache.store('projects', key, dict(stamps=stamps, project=project))
+            found = project, stamps
+
+        if warm_projects is not None:
+            warm_projects[key] = found
+        return found
+
     @classmethod
     def find_containing(cls, *filenames):
-        for root, files in walk_up(os.getcwd()):
-            if any(fnmatch.filter(files, filename) for filename in filenames):
-                return cls(root)
-            if '.git' in files:
-                break
-        return None
+        match = find_markers(os.getcwd(), [filenames])
+        return cls(match[1]) if match else None
 
     @staticmethod
-    def find_one_of(*classes):
-        for cls in classes:
-            project = cls.find()
-            if project is not None:
-                return project
-        return None
+    def find_one_of(*project_types, visited=None):
+        """
+        Find the first of the given (module, class name, markers) project
+        types using a single walk up from the current directory. Only the
+        module of the matching project type is imported.
+        """
+        match = find_markers(os.getcwd(), [markers for module, name, markers
+                                           in project_types],
+                             visited=visited)
+        if match is None:
+            return None
+
+        index, root = match
+        module, name, markers = project_types[index]
+        return project_class(module, name)(root)
 
     # Useful utility methods
 
-    def cmd(self, cmd, cwd=None, env=None, env_echo=None, echo=True, shell=None):
+    def cmd(self, cmd, cwd=None, env=None, env_echo=None, echo=True,
+            shell=None, capture=False, timeout=None):
+        """
+        Run a command like run_command(), but exit if it fails (see
+        delayed_exit()) and return its exit code, or None for a dry run.
+        With capture, (exit code, output lines) is returned instead of
+        exiting.
+        """
+        result = self.run_command(cmd, cwd=cwd, env=env, env_echo=env_echo,
+                                  echo=echo, shell=shell, capture=capture,
+                                  timeout=timeout)
+        if result is None:
+            return None
+
+        group = getattr(local, 'group', None)
+        if group is not None and not result.ok and not capture:
+            group.failed(result.returncode)
+        if result.cancelled or (group is not None and group.cancelled):
+            sys.exit(result.returncode or 1)
+
+        if capture:
+            return result.returncode, result.lines
+        exit_with(result.returncode)
+        return result.returncode
+
+    def run_command(self, cmd, cwd=None, env=None, env_echo=None,
+                    echo=True, shell=None, capture=False, timeout=None):
+        """
+        Run a command in the project directory and return a CommandResult,
+        or None for a dry run. The output is echoed, and also kept in the
+        result with capture. In quiet mode, the output is only shown if
+        the command fails (see quiet.CommandLog). A command still running
+        after timeout seconds (or the project's timeout) is terminated
+        along with the processes it started.
+        """
+        import subprocess
+
         if isinstance(cmd, str):
             cmd = cmd.strip()
+        group = getattr(local, 'group', None)
+        if group is not None and group.cancelled:
+            return CommandResult(cmd, 1, cancelled=True)
+
         if echo:
             echo_command(cmd, cwd, env, env_echo)
         if self.dry_run:
-            return
+            return None
 
         if cwd is not None:
             cwd = self.path(cwd)
@@ -118,13 +401,176 @@ class Project(ABC):
             env = dict(os.environ, **env)
         if shell is None:
             shell = ' ' in cmd
-        proc = subprocess.run(cmd, cwd=cwd, shell=shell, env=env)
-        if proc.returncode != 0:
-            if hasattr(local, 'exit_code'):
-                if local.exit_code == 0:
-                    local.exit_code = proc.returncode
+        if timeout is None:
+            timeout = self.timeout
+
+        recorder = timings.recorder
+        start = time.time()
+
+        log = None
+        if self.quiet:
+            from ..quiet import CommandLog
+            log = CommandLog(format_command(cmd, None, env, env_echo))
+
+        # When running in parallel with other jobs, the output is prefixed
+        # and only ever written a whole line at a time. Lines are read in
+        # bounded chunks so a child printing without newlines can't use up
+        # memory.
+        piped = group is not None or capture or log is not None
+
+        # A command in its own session can be terminated along with
+        # everything it started, but is cut off from the terminal
+        own_session = group is not None or timeout is not None
+
+        proc = subprocess.Popen(
+            cmd, cwd=cwd, shell=shell, env=env,
+            stdin=subprocess.DEVNULL if piped or own_session else None,
+            stdout=subprocess.PIPE if piped else None,
+            stderr=subprocess.STDOUT if piped else None,
+            start_new_session=own_session)
+        if group is not None:
+            group.started(proc)
+
+        timed_out = threading.Event()
+        timer = None
+        if timeout is not None:
+            def expire():
+                timed_out.set()
+                terminate(proc)
+            timer = threading.Timer(timeout, expire)
+            timer.daemon = True
+            timer.start()
+
+        lines = []
+        usage = None
+        try:
+            if piped:
+                for line in iter(lambda: proc.stdout.readline(MAX_LINE), b''):
+                    line = line.decode('utf-8', 'replace').rstrip('\r\n')
+                    if log is not None:
+                        log.write(line)
+                    else:
+                        echo_line(line)
+                    if capture:
+                        lines.append(line)
+            if recorder is not None:
+                usage = timings.wait(proc)
             else:
-                sys.exit(proc.returncode)
+                proc.wait()
+        except BaseException:
+            # Most likely Ctrl-C, which a command in its own session
+            # doesn't get from the terminal
+            if own_session:
+                terminate(proc)
+            elif proc.poll() is None:
+                proc.terminate()
+            raise
+        finally:
+            if timer is not None:
+                timer.cancel()
+            if proc.stdout is not None:
+                proc.stdout.close()
+            if group is not None:
+                group.finished(proc)
+
+        end = time.time()
+        returncode = proc.returncode
+        if timed_out.is_set():
+            returncode = TIMEOUT_EXIT_CODE
+        if recorder is not None:
+            recorder.record(format_command(cmd, None, env, env_echo),
+                            timings.job_name(getattr(local, 'prefix', '')),
+                            start, end, usage, returncode)
+        if log is not None:
+            log.close(returncode)
+        if timed_out.is_set():
+            echo_line(click.style('Timed out after {}s'.format(timeout),
+                                  fg='red', bold=True))
+
+        return CommandResult(cmd, returncode, lines if capture else None,
+                             end - start, timed_out=timed_out.is_set(),
+                             cancelled=group is not None and group.cancelled)
+
+    def parallel(self, jobs, fail_fast=False, max_workers=None):
+        """
+        Run jobs, a list of (name, function) pairs, in parallel (at most
+        max_workers at a time), prefixing each line of their output with
+        the job's name. As with delayed_exit(), every job runs to
+        completion and the exit code of the first failed job is used.
+        With fail_fast, the remaining jobs are cancelled as soon as one of
+        them fails.
+        """
+        if len(jobs) < 2:
+            with delayed_exit():
+                for name, job in jobs:
+                    job()
+            return
+
+        parent_prefix = getattr(local, 'prefix', '')
+        width = max(len(name) for name, job in jobs)
+
+        def job_prefix(index, name):
+            color = JOB_COLORS[index % len(JOB_COLORS)]
+            return parent_prefix + click.style(name.ljust(width) + ' | ',
+                                               fg=color)
+
+        if self.dry_run:
+            # Nothing actually runs, so show each job's commands in turn
+            with delayed_exit():
+                for index, (name, job) in enumerate(jobs):
+                    local.prefix = job_prefix(index, name)
+                    try:
+                        job()
+                    finally:
+                        local.prefix = parent_prefix
+            return
+
+        group = JobGroup(fail_fast, getattr(local, 'group', None))
+        slots = threading.BoundedSemaphore(max_workers or len(jobs))
+        exit_codes = [0] * len(jobs)
+        errors = []
+
+        def run_job(index, name, job):
+            local.prefix = job_prefix(index, name)
+            local.group = group
+            local.exit_code = 0
+            with slots:
+                if group.cancelled:
+                    return
+                try:
+                    job()
+                    exit_codes[index] = local.exit_code
+                except SystemExit as exit:
+                    exit_codes[index] = system_exit_code(exit)
+                except BaseException as error:
+                    exit_codes[index] = 1
+                    errors.append(error)
+            if exit_codes[index] != 0:
+                group.failed(exit_codes[index])
+
+        threads = [threading.Thread(target=run_job, args=(index, name, job),
+                                    daemon=True)
+                   for index, (name, job) in enumerate(jobs)]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                thread.join()
+        except KeyboardInterrupt:
+            # Give the jobs' commands the time they have to exit before
+            # they are killed, unless interrupted again
+            group.cancel()
+            deadline = time.monotonic() + TERMINATE_GRACE + 1
+            for thread in threads:
+                thread.join(max(0, deadline - time.monotonic()))
+            raise
+
+        if errors:
+            raise errors[0]
+        if fail_fast:
+            exit_with(group.exit_code)
+        else:
+            exit_with(next((code for code in exit_codes if code != 0), 0))
 
     def path(self, *path):
         return os.path.join(self.cwd, *path)
@@ -135,6 +581,57 @@ class Project(ABC):
     def find_file(self, *paths):
         return next((path for path in paths if self.exists(path)), None)
 
+    def side_by_side(self):
+        """
+        Return a runner for commands that run side by side, such as
+        backend and frontend dev servers. Each runner.pane(name) block
+        records the commands for one pane, and runner.run() runs them.
+        """
+        if self.tmux:
+            from ..tmux import Tmux
+            if not has_command('tmux'):
+                fail("Sorry! tmux isn't installed")
+            return Tmux(self.cwd)
+
+        from ..supervisor import Supervisor
+        return Supervisor(self, restart=self.restart)
+
+    def job_count(self, required=False):
+        """
+        Return the number of parallel jobs build tools should run: --jobs
+        if given, or else the number of CPUs available to this process.
+        As most tools already default to the number of CPUs, None is
+        returned when that is the whole machine, unless required.
+        """
+        if self.jobs is not None:
+            return self.jobs
+        cpus, limited = available_cpus()
+        return cpus if limited or required else None
+
+    def make_cmd(self, args=''):
+        """Return a make command running in parallel, limited by load"""
+        jobs = self.job_count(required=True)
+        return ' '.join(filter(None, ['make', '-j{}'.format(jobs),
+                                      '-l{}'.format(jobs), args]))
+
+    def jobs_arg(self, template):
+        """Return template formatted with job_count(), or '' if None"""
+        jobs = self.job_count()
+        return '' if jobs is None else template.format(jobs)
+
+    def cache_paths(self):
+        """
+        Files and directories whose contents the facts derived in
+        __init__ depend on. A cached project is discarded when any of them
+        changes. The project directory itself is included so adding or
+        removing a file there is noticed.
+        """
+        return [self.cwd, self.path('ansible')]
+
+    @property
+    def type_name(self):
+        return type(self).__name__
+
     def has_action(self, action):
         if isinstance(action, str):
             action_name = action
@@ -184,6 +681,21 @@ class Project(ABC):
     def test(self):
         fail("Sorry! I don't know how to test your project")
 
+    def test_affected(self, since):
+        """
+        Run the tests affected by the changes since the git ref since, or
+        else by the uncommitted changes
+        """
+        fail("Sorry! I don't know which of your project's tests are "
+             "affected by changes")
+
+    def test_runner(self):
+        """
+        Return the sharding.TestRunner that lists and selects the
+        project's tests, or None if they can't be split into shards
+        """
+        return None
+
     def run(self, env):
         fail("Sorry! I don't know how to run your project")
 
@@ -198,15 +710,22 @@ class Project(ABC):
     def lint(self, fix):
         fail("Sorry! I don't know how to lint your project")
 
-    def check(self):
+    def check(self, fail_fast=False):
         if not (self.has_action('lint') or self.has_action('test')):
             fail("Sorry! I don't know how to check your project")
 
-        with delayed_exit():
-            if self.has_action('lint'):
-                self.lint(fix=False)
-            if self.has_action('test'):
-                self.test()
+        jobs = []
+        if self.has_action('lint'):
+            jobs.append(('lint', lambda: self.lint(fix=False)))
+        if self.has_action('test'):
+            jobs.append(('test', self.test))
+
+        # Install dependencies once up front, rather than letting
+        # several jobs race to install them at the same time
+        if (len(jobs) > 1 and not self.dry_run and
+                hasattr(self, 'ensure_deps')):
+            self.ensure_deps()
+        self.parallel(jobs, fail_fast)
 
     @property
     def can_check(self):
@@ -228,8 +747,15 @@ def format_command(cmd, cwd, env, env_echo):
 
 
 def echo_command(cmd, cwd, env, env_echo):
-    click.secho('$ ' + format_command(cmd, cwd, env, env_echo),
-                fg='white', bold=True)
+    echo_line(click.style('$ ' + format_command(cmd, cwd, env, env_echo),
+                          fg='white', bold=True))
+
+
+def echo_line(line):
+    """Echo a line of output, prefixed when running in a parallel job"""
+    with output_lock:
+        status_line.clear()
+        click.echo(getattr(local, 'prefix', '') + line)
 
 
 def maybe_quote_arg(arg):
@@ -9,10 +9,6 @@ GENERIC_INVENTORY_FILENAMES = ['ansible/hosts',
 class AnsibleProject(Project):
     description = 'Ansible'
 
-    @classmethod
-    def find(cls):
-        return cls.find_containing("ansible")
-
     def deploy(self, env):
         deploy(self, env)
 
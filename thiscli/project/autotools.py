@@ -1,32 +1,33 @@
 from . import Project
+from ..steps import Step, run_steps
 
 
 class AutotoolsProject(Project):
     description = 'Autotools'
 
-    @classmethod
-    def find(cls):
-        return cls.find_containing('configure.ac')
-
-    def ensure_makefile(self):
-        if self.exists('Makefile'):
-            return
-
-        if not self.exists('configure'):
-            if self.exists('bootstrap'):
-                self.cmd('./bootstrap')
-            elif self.exists('autogen.sh'):
-                self.cmd('./autogen.sh')
-            else:
-                self.cmd('autoreconf')
-
-        self.cmd('./configure')
+    def bootstrap(self):
+        if self.exists('bootstrap'):
+            return self.cmd('./bootstrap')
+        elif self.exists('autogen.sh'):
+            return self.cmd('./autogen.sh')
+        else:
+            return self.cmd('autoreconf')
+
+    def configure_step(self):
+        bootstrap = Step('bootstrap', self.bootstrap,
+                         inputs=['configure.ac', 'Makefile.am',
+                                 'bootstrap', 'autogen.sh'],
+                         outputs=['configure'])
+        return Step('configure', lambda: self.cmd('./configure'),
+                    inputs=['configure'], outputs=['Makefile'],
+                    deps=[bootstrap])
 
     def build(self, env):
         # TODO: Configure release/debug build from env
-        self.ensure_makefile()
-        self.cmd('make')
+        run_steps(self, Step('make', lambda: self.cmd(self.make_cmd()),
+                             deps=[self.configure_step()]))
 
     def test(self):
-        self.ensure_makefile()
-        self.cmd('make check')
+        run_steps(self, Step('make check',
+                             lambda: self.cmd(self.make_cmd('check')),
+                             deps=[self.configure_step()]))
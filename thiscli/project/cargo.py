@@ -1,3 +1,5 @@
+import os
+
 from . import Project
 from ..env import is_env_release
 
@@ -5,21 +7,31 @@ from ..env import is_env_release
 class CargoProject(Project):
     description = 'Rust/Cargo'
 
-    @classmethod
-    def find(cls):
-        return cls.find_containing('Cargo.toml')
+    def cargo(self, cmd, env=None):
+        cmd = 'cargo ' + cmd + self.jobs_arg(' --jobs {}')
+        if is_env_release(env):
+            cmd += ' --release'
+        return self.cmd(cmd)
 
     def build(self, env):
-        if is_env_release(env):
-            self.cmd("cargo build --release")
-        else:
-            self.cmd("cargo build")
+        from ..artifacts import cached_build
+
+        if 'CARGO_TARGET_DIR' in os.environ:
+            # Outside the project, and maybe shared with other projects
+            self.cargo('build', env)
+            return
+
+        profile = 'release' if is_env_release(env) else 'debug'
+        cached_build(self, lambda: self.cargo('build', env),
+                     ['target/' + profile],
+                     toolchain=['rustc --version', 'cargo --version'])
 
     def test(self):
-        self.cmd("cargo test")
+        self.cargo('test')
+
+    def test_runner(self):
+        from ..sharding import CargoRunner
+        return CargoRunner(self)
 
     def run(self, env):
-        if is_env_release(env):
-            self.cmd("cargo run --release")
-        else:
-            self.cmd("cargo run")
+        self.cargo('run', env)
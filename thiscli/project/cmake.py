@@ -1,6 +1,7 @@
 import os
 
 from . import Project
+from ..steps import Step, run_steps
 from ..util import has_command, fail
 
 
@@ -15,34 +16,49 @@ class CMakeProject(Project):
         elif self.exists('build/build.ninja'):
             self.using.append('ninja')
 
-    @classmethod
-    def find(cls):
-        return cls.find_containing('CMakeLists.txt')
+    def cache_paths(self):
+        return super().cache_paths() + [self.path('build')]
 
-    def ensure_builddir(self):
-        if (self.exists('build/Makefile') or
-                self.exists('build/build.ninja')):
-            return
+    def configure(self):
+        if self.exists('build/CMakeCache.txt'):
+            # Reconfigure using the generator the build dir was set up with
+            return self.cmd('cmake ..', cwd='build')
 
-        os.makedirs('build', exist_ok=True)
+        if not self.dry_run:
+            os.makedirs(self.path('build'), exist_ok=True)
 
         if has_command('ninja'):
-            self.cmd('cmake -G Ninja ..', cwd='build')
+            return self.cmd('cmake -G Ninja ..', cwd='build')
         else:
-            self.cmd('cmake ..', cwd='build')
+            return self.cmd('cmake ..', cwd='build')
+
+    def configure_step(self):
+        # Edits to other CMakeLists.txt files are picked up by the
+        # generated build itself
+        return Step('configure', self.configure, inputs=['CMakeLists.txt'],
+                    outputs=['build/CMakeCache.txt'])
 
     def target(self, target=''):
-        self.ensure_builddir()
-        if self.exists('build/Makefile'):
-            self.cmd('make ' + target, cwd='build')
-        elif self.exists('build/build.ninja'):
-            self.cmd('ninja -C build ' + target)
-        else:
-            fail("Sorry! I don't know what build tool CMake is using")
+        def build():
+            if self.exists('build/Makefile'):
+                return self.cmd(self.make_cmd(target), cwd='build')
+            elif self.exists('build/build.ninja'):
+                return self.cmd(' '.join(filter(None, [
+                    'ninja -C build' + self.jobs_arg(' -j{}'), target])))
+            else:
+                fail("Sorry! I don't know what build tool CMake is using")
+
+        run_steps(self, Step(target or 'build', build,
+                             deps=[self.configure_step()]))
 
     def build(self, env):
+        from ..artifacts import cached_build
+
         # TODO: Set -DCMAKE_BUILD_TYPE=Release/Debug based on env
-        self.target()
+        # The build directory has absolute paths in it
+        cached_build(self, self.target, ['build'],
+                     toolchain=['cmake --version', 'cc --version'],
+                     path_dependent=True)
 
     def test(self):
         self.target('test')
@@ -5,19 +5,20 @@ from ..env import is_env_release
 class DotnetCoreProject(Project):
     description = '.NET Core'
 
-    @classmethod
-    def find(cls):
-        return cls.find_containing('*.csproj')
-
     def build(self, env):
+        cmd = 'dotnet build' + self.jobs_arg(' -maxcpucount:{}')
         if is_env_release(env):
-            self.cmd("dotnet build -c release")
+            self.cmd(cmd + ' -c release')
         else:
-            self.cmd("dotnet build")
+            self.cmd(cmd)
 
     def test(self):
         self.cmd("dotnet test")
 
+    def test_runner(self):
+        from ..sharding import DotnetRunner
+        return DotnetRunner(self)
+
     def run(self, env):
         if is_env_release(env):
             self.cmd("dotnet run -c release")
@@ -1,6 +1,6 @@
 import os
 
-from . import Project, delayed_exit
+from . import Project
 from ..env import env_to_release_or_debug
 
 
@@ -18,16 +18,13 @@ class GradleProject(Project):
             if self.exists('gradlew'):
                 self.gradle_cmd = './gradlew'
 
-    @classmethod
-    def find(cls):
-        return cls.find_containing('build.gradle')
-
     def gradle(self, task, env=None):
         if env:
             env = env_to_release_or_debug(env, other=True)
             task += env.capitalize()
 
-        self.cmd(self.gradle_cmd + " " + task)
+        self.cmd(self.gradle_cmd + self.jobs_arg(' --max-workers={}') +
+                 ' ' + task)
 
     def build(self, env):
         self.gradle('assemble', env=env)
@@ -35,8 +32,9 @@ class GradleProject(Project):
     def test(self):
         self.gradle('test')
 
-    def check(self):
-        with delayed_exit():
-            if self.has_action('lint'):
-                self.lint(fix=False)
-            self.gradle('check')
+    def check(self, fail_fast=False):
+        jobs = []
+        if self.has_action('lint'):
+            jobs.append(('lint', lambda: self.lint(fix=False)))
+        jobs.append(('check', lambda: self.gradle('check')))
+        self.parallel(jobs, fail_fast)
@@ -1,7 +1,6 @@
 from . import Project
 from .nodejs import NodejsProject
-from ..util import needs_update
-from ..tmux import Tmux
+from ..deps import DependencyStamp
 
 
 class LaravelProject(Project):
@@ -19,23 +18,25 @@ class LaravelProject(Project):
                          (self.npm and self.npm.can_test))
         self.can_lint = self.npm and self.npm.can_lint
 
-    @classmethod
-    def find(cls):
-        return cls.find_containing('artisan')
+    def cache_paths(self):
+        paths = super().cache_paths()
+        if self.npm:
+            paths += self.npm.cache_paths()
+        return paths
 
     def ensure_deps(self):
-        if needs_update(self.path('composer.json'), self.path('vender')):
-            self.cmd('composer install')
+        DependencyStamp(self, ['composer.json', 'composer.lock'],
+                        'vendor').install(lambda: self.cmd('composer install'))
 
     def run(self, env):
         if self.npm and self.npm.can_run:
-            tmux = Tmux(self.cwd)
-            with tmux.pane():
+            runner = self.side_by_side()
+            with runner.pane('php'):
                 self.ensure_deps()
                 self.cmd('php artisan serve')
-            with tmux.pane():
+            with runner.pane('npm'):
                 self.npm.run(env)
-            tmux.run()
+            runner.run()
         else:
             self.ensure_deps()
             self.cmd('php artisan serve')
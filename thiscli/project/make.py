@@ -1,23 +1,115 @@
-import subprocess
+import glob
+import os
 
 from . import Project
+from .. import cache
 from ..util import fatal
 
+INCLUDE_DIRECTIVES = ['include', '-include', 'sinclude']
+
+
+def logical_lines(f):
+    """Yield the lines of a Makefile with backslash continuations joined"""
+    pending = ''
+    for line in f:
+        line = line.rstrip('\n')
+        if line.endswith('\\'):
+            pending += line[:-1] + ' '
+            continue
+        yield pending + line
+        pending = ''
+    if pending:
+        yield pending
+
+
+def rule_targets(line):
+    """Return the explicit targets defined by a rule line, if any"""
+    line = line.split('#', 1)[0]
+    head, sep, rest = line.partition(':')
+    if not sep or '=' in head or rest.startswith(('=', ':=')):
+        # Not a rule, or a :=/::= variable assignment
+        return []
+    # Skip special targets like .PHONY as well as pattern rules and
+    # computed target names
+    return [target for target in head.split()
+            if target[0].isalnum() and '$' not in target and '%' not in target]
+
+
+def parse_makefile(path, targets, makefiles, base=None):
+    """
+    Collect the targets defined in the Makefile at path, following
+    include directives relative to base (the top-level Makefile's
+    directory, as make does). Every Makefile read or looked for is
+    appended to makefiles.
+    """
+    base = base or os.path.dirname(path)
+    makefiles.append(path)
+    try:
+        f = open(path, encoding='utf-8', errors='replace')
+    except OSError:
+        return
+
+    with f:
+        in_define = False
+        for line in logical_lines(f):
+            if line.startswith('\t'):
+                continue
+
+            words = line.split()
+            if not words:
+                continue
+            if in_define:
+                in_define = words[0] != 'endef'
+                continue
+            if words[0] == 'define' or words[:2] in (['export', 'define'],
+                                                     ['override', 'define']):
+                in_define = True
+            elif words[0] in INCLUDE_DIRECTIVES:
+                for name in words[1:]:
+                    if name.startswith('#'):
+                        break
+                    if '$' in name:
+                        continue
+                    name = os.path.join(base, name)
+                    for include in sorted(glob.glob(name)) or [name]:
+                        if include not in makefiles:
+                            parse_makefile(include, targets, makefiles, base)
+            else:
+                targets.update(rule_targets(line))
+
+
+def makefile_targets(path):
+    """
+    Return (targets, makefiles) for the Makefile at path, where makefiles
+    lists it and every file it includes. The result is cached on disk
+    until one of those files changes.
+    """
+    key = cache.cache_key(os.path.realpath(path))
+    entry = cache.load('make', key)
+    if entry is not None and cache.stamps_valid(entry['stamps']):
+        return entry['targets'], list(entry['stamps'])
+
+    targets = set()
+    makefiles = []
+    parse_makefile(path, targets, makefiles)
+
+    cache.store('make', key, dict(stamps=cache.stat_stamps(makefiles),
+                                  targets=targets))
+    return targets, makefiles
+
 
 class MakeProject(Project):
     description = 'Makefile'
 
     def __init__(self, cwd):
         super().__init__(cwd)
-        self.targets = subprocess.check_output(
-            "make -pRrq : 2>/dev/null | awk -v RS= -F: '/^# File/,/^# Finished Make data base/ {if ($1 !~ \"^[#.]\") {print $1}}' | egrep -v '^[^[:alnum:]]'", shell=True, encoding='utf-8').strip().split('\n')
+        self.targets, self.makefiles = makefile_targets(self.path('Makefile'))
         self.can_run = self.find_target('run') is not None
         self.can_test = self.find_target(['test', 'check']) is not None
         self.can_deploy = self.find_target('deploy') is not None or self.can_deploy
 
-    @classmethod
-    def find(cls):
-        return cls.find_containing('Makefile')
+    def cache_paths(self):
+        return super().cache_paths() + self.makefiles
 
     def find_target(self, targets):
         if isinstance(targets, str):
@@ -27,7 +119,7 @@ class MakeProject(Project):
 
     def target(self, targets=None):
         if targets is None:
-            self.cmd("make")
+            self.cmd(self.make_cmd())
             return
 
         target = self.find_target(targets)
@@ -35,7 +127,7 @@ class MakeProject(Project):
         if not target:
             fatal("Not sure which Makefile target to run. Looked for: " +
                   ' '.join(targets))
-        self.cmd("make " + target)
+        self.cmd(self.make_cmd(target))
 
     def build(self, env):
         # TODO: Configure release/debug build from env
@@ -1,28 +1,39 @@
-import os
-
 from . import Project
+from ..steps import Step, run_steps
 
 
 class MesonProject(Project):
     description = 'Meson'
 
-    @classmethod
-    def find(cls):
-        return cls.find_containing('meson.build')
-
-    def ensure_builddir(self):
+    def setup(self):
         if self.exists('build/build.ninja'):
-            return
-
-        os.makedirs('build', exist_ok=True)
-
-        self.cmd('meson setup build --prefix=$HOME/.local')
+            return self.cmd('meson setup --reconfigure build '
+                            '--prefix=$HOME/.local')
+        return self.cmd('meson setup build --prefix=$HOME/.local')
+
+    def setup_step(self):
+        # Edits to meson.build files are picked up by ninja itself, but
+        # changed options need an explicit reconfigure
+        return Step('setup', self.setup,
+                    inputs=['meson.build', 'meson_options.txt'],
+                    outputs=['build/build.ninja'])
+
+    def ninja(self, target=None):
+        cmd = 'ninja -C build' + self.jobs_arg(' -j{}')
+        if target:
+            cmd += ' ' + target
+        return self.cmd(cmd)
 
     def build(self, env):
+        from ..artifacts import cached_build
+
         # TODO: Configure release/debug build from env
-        self.ensure_builddir()
-        self.cmd('ninja -C build')
+        # The build directory has absolute paths in it
+        cached_build(self, lambda: run_steps(
+            self, Step('ninja', self.ninja, deps=[self.setup_step()])),
+            ['build'], toolchain=['meson --version', 'ninja --version',
+                                  'cc --version'], path_dependent=True)
 
     def test(self):
-        self.ensure_builddir()
-        self.cmd('ninja -C build test')
+        run_steps(self, Step('test', lambda: self.ninja('test'),
+                             deps=[self.setup_step()]))
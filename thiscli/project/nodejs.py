@@ -1,9 +1,21 @@
 import json
 import os
+import re
+import time
 
-from . import Project
+import click
+
+from . import Project, echo_line
 from ..env import short_env_name, all_env_names, DEV_PROD_NAMES
-from ..util import needs_update, has_command, warn, fatal
+from ..deps import DependencyStamp
+from ..util import has_command, warn, fatal
+
+MANIFESTS = ['package.json', 'package-lock.json', 'yarn.lock', '.yarnrc.yml']
+
+LOCKFILES = {'npm': 'package-lock.json', 'yarn': 'yarn.lock'}
+
+# Where build scripts commonly put their output
+BUILD_DIRS = ['dist', 'build', 'out', '.next', 'public/build']
 
 
 def get_npm_cmd(path):
@@ -52,19 +64,84 @@ class NodejsProject(Project):
         self.can_deploy = (self.find_script('deploy', None) is not None or
                            self.can_deploy)
 
-    @classmethod
-    def find(cls):
-        return cls.find_containing('package.json')
+    def cache_paths(self):
+        return super().cache_paths() + [self.path(filename)
+                                        for filename in MANIFESTS]
 
     def ensure_deps(self):
-        if needs_update(self.path('package.json'), self.path('node_modules')):
-            self.npm('install')
-
-    def npm(self, cmd):
+        DependencyStamp(self, MANIFESTS, self.installed_dir()).install(
+            self.install)
+
+    def uses_pnp(self):
+        """Whether Yarn 2 or later installs with Plug'n'Play, its default"""
+        if self.npm_cmd != 'yarn':
+            return False
+        try:
+            with open(self.path('.yarnrc.yml')) as f:
+                config = f.read()
+        except OSError:
+            return False
+        return not re.search(r'^nodeLinker:\s*["\']?(node-modules|pnpm)',
+                             config, re.MULTILINE)
+
+    def installed_dir(self):
+        """
+        The directory dependencies are installed in, which for
+        Plug'n'Play is .yarn, as there is no node_modules
+        """
+        return '.yarn' if self.uses_pnp() else 'node_modules'
+
+    def install(self):
+        start = time.time()
+        returncode = self.npm(self.install_args(), env=self.install_env())
+        if returncode == 0:
+            # npm doesn't create node_modules without any dependencies,
+            # but the stamp is kept there
+            os.makedirs(self.path(self.installed_dir()), exist_ok=True)
+            elapsed = time.time() - start
+            echo_line(click.style(
+                'Installed dependencies in {:.1f}s'.format(elapsed),
+                fg='green', bold=True))
+        return returncode
+
+    def install_args(self):
+        """
+        Return the install command's arguments: a frozen install from the
+        lockfile, which never changes it, for new checkouts and CI, or
+        else an install that may update the lockfile after package.json
+        changes. Packages already in the cache aren't fetched again.
+        """
+        frozen = (self.exists(LOCKFILES[self.npm_cmd]) and
+                  (not self.exists(self.installed_dir()) or
+                   bool(os.environ.get('CI'))))
+        if self.npm_cmd == 'npm':
+            return ['ci' if frozen else 'install', '--prefer-offline']
+        if self.exists('.yarnrc.yml'):
+            # Yarn 2 and later always prefer their cache
+            return ['install'] + (['--immutable'] if frozen else [])
+        return ['install'] + (['--frozen-lockfile'] if frozen else []) + [
+            '--prefer-offline']
+
+    def install_env(self):
+        """
+        Point the package cache to $THIS_NODE_CACHE, if set, so it can be
+        shared between checkouts or restored on CI
+        """
+        cache_dir = os.environ.get('THIS_NODE_CACHE')
+        if not cache_dir:
+            return None
+        if self.npm_cmd == 'npm':
+            return {'npm_config_cache': os.path.join(cache_dir, 'npm')}
+        if self.exists('.yarnrc.yml'):
+            # Yarn 2 and later keep their own cache, often committed
+            return None
+        return {'YARN_CACHE_FOLDER': os.path.join(cache_dir, 'yarn')}
+
+    def npm(self, cmd, **kwargs):
         if not isinstance(cmd, list):
             cmd = [cmd]
 
-        self.cmd([self.npm_cmd] + cmd)
+        return self.cmd([self.npm_cmd] + cmd, **kwargs)
 
     def has_script(self, script):
         return script in self.package.get('scripts', {})
@@ -81,7 +158,7 @@ class NodejsProject(Project):
                 return script
         return None
 
-    def npm_script(self, scripts, *args, env=None):
+    def npm_script(self, scripts, *args, env=None, capture=False):
         args = list(args)
         if args and self.npm_cmd == 'npm':
             args = ['--'] + args
@@ -93,15 +170,26 @@ class NodejsProject(Project):
         if script is None:
             fatal("NPM script not found. Looked for: " + ' '.join(scripts))
         self.ensure_deps()
-        self.npm(['run', script] + args)
+        return self.npm(['run', script] + args, capture=capture)
 
     def build(self, env):
-        if env in DEV_PROD_NAMES:
-            self.npm_script(['build'] + all_env_names(env), env=env)
-        elif env is None:
-            self.npm_script(['build', 'dev', 'development'])
-        else:
-            self.npm_script('build', env=env)
+        from ..artifacts import cached_build
+
+        def build():
+            if env in DEV_PROD_NAMES:
+                return self.npm_script(['build'] + all_env_names(env),
+                                       env=env)
+            elif env is None:
+                return self.npm_script(['build', 'dev', 'development'])
+            else:
+                return self.npm_script('build', env=env)
+
+        # Dependencies are installed first, as they aren't part of the
+        # cached output
+        if not self.dry_run:
+            self.ensure_deps()
+        cached_build(self, build, BUILD_DIRS, toolchain=['node --version'],
+                     key=[env])
 
     def run(self, env):
         self.npm_script(['server', 'watch', 'start', 'serve'], env=env)
@@ -109,11 +197,27 @@ class NodejsProject(Project):
     def test(self):
         self.npm_script('test')
 
+    def test_runner(self):
+        # Only Jest can list the tests and run some of them
+        script = self.package.get('scripts', {}).get('test', '')
+        if 'jest' in script.split():
+            from ..sharding import JestRunner
+            return JestRunner(self)
+        return None
+
     def lint(self, fix):
+        from ..lintcache import lint_project, source_files
+
         if fix:
             self.npm_script('lint', '--fix')
-        else:
-            self.npm_script('lint')
+            return
+
+        # The lint script is opaque, so its output can only be replayed
+        # when no file in the project has changed
+        lint_project(self, 'npm-lint', source_files(self.cwd),
+                     '{} run {}'.format(self.npm_cmd,
+                                        self.find_script('lint', None)),
+                     lambda: self.npm_script('lint', capture=True))
 
     def deploy(self, env):
         if self.find_script('deploy', env) is not None:
@@ -1,10 +1,19 @@
 from abc import ABC, abstractmethod
 import os
 
-from . import Project, delayed_exit
+import click
+
+from . import Project, echo_line
 from .nodejs import NodejsProject
+from .. import cache, plan
+from ..deps import DependencyStamp
+from ..pyimports import python_files
+from ..steps import Step, run_steps
 from ..util import fatal
-from ..tmux import Tmux
+
+
+def join_args(*args):
+    return ' '.join(arg for arg in args if arg)
 
 
 class PythonEnv(ABC):
@@ -20,9 +29,13 @@ class PythonEnv(ABC):
         pass
 
     @abstractmethod
-    def cmd(self, cmd):
+    def cmd(self, cmd, **kwargs):
         pass
 
+    def get_virtualenv(self):
+        """Environment variables activating the project's virtualenv"""
+        return None
+
 
 class PythonPipenv(PythonEnv):
     description = 'Pipenv'
@@ -33,13 +46,23 @@ class PythonPipenv(PythonEnv):
             self.pipfile = f.read()
 
     def ensure_deps(self):
-        pass
+        # Pipenv keeps its virtualenv outside the project, so the stamp
+        # is kept in the cache instead
+        stamp = DependencyStamp(self.project, ['Pipfile', 'Pipfile.lock'], '.',
+                                cache.cache_path('deps', cache.cache_key(
+                                    self.project.cwd)))
+        if self.project.exists('Pipfile.lock'):
+            stamp.install(lambda: self.project.cmd('pipenv sync --dev'))
+        else:
+            stamp.install(lambda: self.project.cmd('pipenv install --dev'))
 
     def has_package(self, name):
         return (name + ' = ') in self.pipfile
 
-    def cmd(self, cmd):
-        self.project.cmd('pipenv run ' + cmd)
+    def cmd(self, cmd, **kwargs):
+        if isinstance(cmd, list):
+            return self.project.cmd(['pipenv', 'run'] + cmd, **kwargs)
+        return self.project.cmd('pipenv run ' + cmd, **kwargs)
 
 
 class PythonVirtualenv(PythonEnv):
@@ -52,31 +75,134 @@ class PythonVirtualenv(PythonEnv):
                                            os.environ.get('PATH'))}
 
     def ensure_deps(self):
-        if 'VIRTUAL_ENV' not in os.environ and not self.project.exists('.venv'):
-            self.project.cmd('virtualenv .venv')
-            self.install_deps()
+        if 'VIRTUAL_ENV' in os.environ:
+            return
+
+        self.created = False
+        self.stamp = DependencyStamp(self.project, self.manifests, '.venv')
+        virtualenv = Step('virtualenv', self.create_virtualenv,
+                          outputs=['.venv'])
+        install = Step('install', self.install, deps=[virtualenv],
+                       inputs=self.manifests, outputs=['.venv'],
+                       stamp=self.stamp)
+        run_steps(self.project, install)
+
+    def shared_key(self):
+        """
+        Key of the wheelhouse and virtualenv templates (see
+        thiscli.wheelhouse) for the requirements, or None if not shared.
+        They aren't used while recording a plan, as try_cmd() runs its
+        commands rather than recording them.
+        """
+        from ..wheelhouse import requirements_key
+
+        if self.project.dry_run or plan.recording():
+            return None
+        return requirements_key(self.project, type(self).__name__,
+                                self.requirement_files)
+
+    def create_virtualenv(self):
+        from ..wheelhouse import VenvTemplates
+
+        key = self.shared_key()
+        if key is not None and VenvTemplates().materialize(
+                key, self.project.path('.venv')):
+            echo_line(click.style('Created .venv from a cached virtualenv',
+                                  fg='green', bold=True))
+            return 0
+        self.created = True
+        return self.project.cmd('virtualenv .venv')
+
+    def install(self):
+        """
+        Install the requirements from the wheelhouse without going to the
+        index, building any wheels it is missing first, or else install
+        them as usual. A virtualenv created from scratch is kept as a
+        template for the next one.
+        """
+        from ..wheelhouse import VenvTemplates, Wheelhouse
+
+        key = self.shared_key()
+        if key is None:
+            return self.install_deps()
+
+        wheelhouse = Wheelhouse(key)
+        if not wheelhouse.complete():
+            wheelhouse.set_complete(self.try_cmd('pip wheel {} {}'.format(
+                wheelhouse.build_args(), self.wheel_requirements)))
+        installed = False
+        if wheelhouse.complete():
+            installed = all(self.try_cmd(cmd) for cmd in
+                            self.install_commands(wheelhouse.install_args()))
+            # Wheels may have been removed from the wheelhouse since
+            wheelhouse.set_complete(installed)
+        if not installed:
+            returncode = self.install_deps()
+            if returncode:
+                return returncode
+
+        if self.created:
+            # Saved first so virtualenvs created from the template have it
+            self.stamp.save()
+            VenvTemplates().save(key, self.project.path('.venv'))
+        return 0
+
+    def install_deps(self):
+        for cmd in self.install_commands():
+            returncode = self.cmd(cmd)
+            if returncode:
+                return returncode
+        return 0
+
+    @property
+    @abstractmethod
+    def manifests(self):
+        pass
+
+    @property
+    @abstractmethod
+    def requirement_files(self):
+        pass
 
+    @property
     @abstractmethod
-    def install_deps():
+    def wheel_requirements(self):
+        """`pip wheel` arguments for every requirement to install"""
         pass
 
-    def cmd(self, cmd):
+    @abstractmethod
+    def install_commands(self, pip_args=''):
+        """The commands installing the requirements, with pip_args"""
+        pass
+
+    def cmd(self, cmd, **kwargs):
         env = self.get_virtualenv()
         env_echo = '(virtualenv)' if env else ''
-        self.project.cmd(cmd, env=env, env_echo=env_echo)
+        return self.project.cmd(cmd, env=env, env_echo=env_echo, **kwargs)
+
+    def try_cmd(self, cmd):
+        """Run a command like cmd(), returning whether it succeeded"""
+        env = self.get_virtualenv()
+        result = self.project.run_command(
+            cmd, env=env, env_echo='(virtualenv)' if env else '')
+        return result is None or result.ok
 
 
 class PythonPipTools(PythonVirtualenv):
     description = 'pip-tools'
+    manifests = ['requirements.in', 'requirements*.txt']
 
     def __init__(self, project):
         super().__init__(project)
         with open(project.path('requirements.in')) as f:
             self.requirements = f.read()
 
-    def install_deps(self):
-        self.cmd('pip install pip-tools')
-        self.cmd('pip-sync')
+    requirement_files = ['requirements.txt']
+    wheel_requirements = 'pip-tools -r requirements.txt'
+
+    def install_commands(self, pip_args=''):
+        return [join_args('pip install', pip_args, 'pip-tools'),
+                join_args('pip-sync', pip_args)]
 
     def has_package(self, name):
         return name in self.requirements
@@ -84,14 +210,18 @@ class PythonPipTools(PythonVirtualenv):
 
 class PythonRequirements(PythonVirtualenv):
     description = 'requirements.txt'
+    manifests = ['requirements*.txt']
 
     def __init__(self, project):
         super().__init__(project)
         with open(project.path('requirements.txt')) as f:
             self.requirements = f.read()
 
-    def install_deps(self):
-        self.cmd('pip install -r requirements.txt')
+    requirement_files = ['requirements.txt']
+    wheel_requirements = '-r requirements.txt'
+
+    def install_commands(self, pip_args=''):
+        return [join_args('pip install', pip_args, '-r requirements.txt')]
 
     def has_package(self, name):
         return name in self.requirements
@@ -147,22 +277,27 @@ class PythonProject(Project):
         if not self.has_manage and self.has_flask:
             self.using.append('Flask')
 
-    @classmethod
-    def find(cls):
-        return cls.find_containing('setup.py',
-                                   'requirements.txt',
-                                   'requirements.in',
-                                   'Pipfile')
+    def cache_paths(self):
+        # Packages, their __main__.py and nested npm projects are found by
+        # looking inside each top-level directory
+        paths = super().cache_paths() + [
+            self.path(dirname) for dirname in os.listdir(self.cwd)
+            if os.path.isdir(self.path(dirname))]
+        paths += [self.path(filename) for filename in
+                  ['Pipfile', 'requirements.in', 'requirements.txt']]
+        if self.npm:
+            paths += self.npm.cache_paths()
+        return paths
 
     def ensure_deps(self):
         if self.env:
             self.env.ensure_deps()
 
-    def env_cmd(self, cmd):
+    def env_cmd(self, cmd, **kwargs):
         if self.env:
-            self.env.cmd(cmd)
+            return self.env.cmd(cmd, **kwargs)
         else:
-            self.cmd(cmd)
+            return self.cmd(cmd, **kwargs)
 
     def has_package(self, name):
         if self.env:
@@ -171,9 +306,13 @@ class PythonProject(Project):
             return False
 
     def build(self, env):
+        from ..artifacts import cached_build
+
         self.ensure_deps()
         if self.has_setup:
-            self.env_cmd('python setup.py build')
+            cached_build(self, lambda: self.env_cmd('python setup.py build'),
+                         ['build'], toolchain=['python --version'],
+                         toolchain_env=self.env and self.env.get_virtualenv())
         else:
             super().build(env)
 
@@ -196,14 +335,14 @@ class PythonProject(Project):
                 self.env_cmd('flask run')
 
         if can_py_run and can_npm_run:
-            tmux = Tmux(self.cwd)
-            with tmux.pane():
+            runner = self.side_by_side()
+            with runner.pane('python'):
                 run_py()
-            with tmux.pane():
+            with runner.pane('npm'):
                 self.npm.run(env)
-            tmux.run()
+            runner.run()
         elif can_npm_run:
-            self.npm.run()
+            self.npm.run(env)
         else:
             run_py()
 
@@ -216,6 +355,56 @@ class PythonProject(Project):
         else:
             super().test()
 
+    def test_affected(self, since):
+        from ..affected import affected_tests, changed_files
+
+        if plan.recording():
+            # Which tests run depends on what changed, not only on the
+            # files a plan watches, so it is decided when running
+            plan.uncacheable()
+            return
+        if not self.uses_pytest():
+            super().test_affected(since)
+
+        changed = changed_files(self.cwd, since)
+        if changed is None:
+            tests, reason = None, "the changes aren't known"
+        else:
+            tests, reason = affected_tests(self.cwd, self.packages, changed)
+
+        if tests is None:
+            click.secho('Running every test, as ' + reason, fg='blue',
+                        bold=True)
+            self.test()
+        elif not tests:
+            click.secho('No tests are affected by the changes', fg='blue',
+                        bold=True)
+        else:
+            click.secho('Running the {} test files affected by the changes'
+                        .format(len(tests)), fg='blue', bold=True)
+            self.ensure_deps()
+            self.env_cmd(['python', '-m', 'pytest'] + tests)
+
+    def test_runner(self):
+        if self.uses_pytest():
+            from ..sharding import PytestRunner
+            return PytestRunner(self)
+        return None
+
+    def uses_pytest(self):
+        if (self.has_package('pytest') or
+                self.find_file('pytest.ini', 'conftest.py')):
+            return True
+        # Configured or required by setup.py, as with pytest-runner
+        for filename in ['setup.py', 'setup.cfg', 'tox.ini', 'pyproject.toml']:
+            try:
+                with open(self.path(filename)) as f:
+                    if 'pytest' in f.read():
+                        return True
+            except OSError:
+                pass
+        return False
+
     def deploy(self, env):
         if self.has_setup:
             self.ensure_deps()
@@ -224,12 +413,36 @@ class PythonProject(Project):
             super().deploy(env)
 
     def lint(self, fix):
+        from ..lintcache import lint_files, lint_project, flake8_exit_code
+
         self.ensure_deps()
+
+        # --jobs=0 uses every core, which flake8 does by default
+        jobs = self.job_count() or 0
         if fix:
-            self.env_cmd('autopep8 --recursive --in-place ' +
-                         ' '.join(self.packages))
-        with delayed_exit():
-            self.env_cmd('flake8 ' + ' '.join(self.packages))
-            self.env_cmd('pylint ' + ' '.join(self.packages))
-            if self.exists('setup.py'):
-                self.env_cmd('python setup.py check')
+            self.env_cmd('autopep8 --recursive --in-place --jobs={} {}'
+                         .format(jobs, ' '.join(self.packages)))
+
+        # Only files that changed since the last run are linted again
+        files = python_files(self.cwd, self.packages)
+
+        def run(cmd):
+            return self.env_cmd(cmd, capture=True)
+
+        def flake8():
+            lint_files(self, 'flake8', 'flake8' + self.jobs_arg(' --jobs={}'),
+                       self.packages, files, run, flake8_exit_code)
+
+        def pylint():
+            # Checks like duplicate-code and cyclic-import look at every
+            # module together, so pylint always lints the whole project
+            # and its output is only replayed when no file has changed
+            cmd = 'pylint --jobs={} --score=n {}'.format(
+                jobs, ' '.join(self.packages))
+            lint_project(self, 'pylint', files, cmd, lambda: run(cmd))
+
+        linters = [('flake8', flake8), ('pylint', pylint)]
+        if self.exists('setup.py'):
+            linters.append(('setup.py',
+                            lambda: self.env_cmd('python setup.py check')))
+        self.parallel(linters)
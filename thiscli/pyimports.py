@@ -0,0 +1,76 @@
+"""Static analysis of the imports between a project's Python modules"""
+
+import ast
+import os
+
+
+def module_file(root, module):
+    """Return the file under root defining module, if there is one"""
+    path = os.path.join(root, *module.split('.'))
+    for filename in [path + '.py', os.path.join(path, '__init__.py')]:
+        if os.path.isfile(filename):
+            return os.path.relpath(filename, root)
+    return None
+
+
+def imported_modules(path, source):
+    """Yield the absolute names of the modules imported by source"""
+    # Relative imports are relative to the containing package, which for
+    # a package's __init__.py is the package itself
+    package = os.path.dirname(path).replace(os.sep, '.')
+
+    try:
+        tree = ast.parse(source, path)
+    except (SyntaxError, ValueError):
+        return
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                yield alias.name
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                parts = package.split('.') if package else []
+                parts = parts[:len(parts) - (node.level - 1)]
+                base = '.'.join(parts + ([node.module] if node.module else []))
+            else:
+                base = node.module
+            if not base:
+                continue
+            yield base
+            # "from package import module" imports a submodule
+            for alias in node.names:
+                yield base + '.' + alias.name
+
+
+def imported_files(root, path):
+    """
+    Return the files under root (relative to it) imported by the Python
+    file at path, also relative to root. Importing a.b.c also imports
+    the a and a.b packages.
+    """
+    with open(os.path.join(root, path), 'rb') as f:
+        source = f.read()
+
+    files = set()
+    for module in imported_modules(path, source):
+        parts = module.split('.')
+        for index in range(1, len(parts) + 1):
+            filename = module_file(root, '.'.join(parts[:index]))
+            if filename is not None and filename != path:
+                files.add(filename)
+    return sorted(files)
+
+
+def python_files(root, packages):
+    """Return every Python file in packages, relative to root"""
+    files = []
+    for package in packages:
+        for dirpath, dirnames, filenames in os.walk(os.path.join(root,
+                                                                 package)):
+            dirnames[:] = sorted(dirname for dirname in dirnames
+                                 if not dirname.startswith(('.', '__')))
+            files += [os.path.relpath(os.path.join(dirpath, filename), root)
+                      for filename in sorted(filenames)
+                      if filename.endswith('.py')]
+    return files
@@ -0,0 +1,95 @@
+"""
+Quiet mode (`this --quiet`), where the output of commands is kept in
+compressed logs and only shown when they fail
+"""
+
+from collections import deque
+import gzip
+import itertools
+import os
+import time
+
+import click
+
+from . import cache
+from .project import echo_line, status_line
+
+# Lines of output shown when a command fails
+TAIL_LINES = 40
+
+# Longest line kept in memory for the tail; the log has all of it
+MAX_TAIL_LINE = 1000
+
+# Logs of older commands are removed to keep at most this many
+MAX_LOGS = 100
+
+counter = itertools.count()
+
+
+def log_dir():
+    return cache.cache_path('logs')
+
+
+def prune_logs(directory, keep):
+    try:
+        entries = sorted(os.scandir(directory),
+                         key=lambda entry: entry.stat().st_mtime)
+    except OSError:
+        return
+    for entry in entries[:-keep] if keep else entries:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+
+
+class CommandLog:
+    """
+    The output of one command in quiet mode: the last lines are kept in
+    memory, and all of it is written to a gzip-compressed log file, so
+    memory use is bounded no matter how much the command prints
+    """
+
+    def __init__(self, cmd, tail=TAIL_LINES):
+        self.cmd = cmd
+        self.tail = deque(maxlen=tail)
+        self.count = 0
+        self.key = next(counter)
+
+        directory = log_dir()
+        self.path = os.path.join(directory, '{}-{}-{}.log.gz'.format(
+            time.strftime('%Y%m%d-%H%M%S'), os.getpid(), self.key))
+        try:
+            os.makedirs(directory, exist_ok=True)
+            prune_logs(directory, MAX_LOGS - 1)
+            self.file = gzip.open(self.path, 'wt', encoding='utf-8')
+            self.file.write('$ {}\n'.format(cmd))
+        except OSError:
+            self.path = None
+            self.file = None
+
+    def write(self, line):
+        self.count += 1
+        if self.file is not None:
+            self.file.write(line + '\n')
+        if len(line) > MAX_TAIL_LINE:
+            line = line[:MAX_TAIL_LINE] + '...'
+        self.tail.append(line)
+        status_line.update(self.key, self.cmd, self.count)
+
+    def close(self, returncode):
+        """Finish the log, showing the end of it if the command failed"""
+        status_line.remove(self.key)
+        if self.file is not None:
+            self.file.close()
+        if returncode == 0:
+            return
+
+        skipped = self.count - len(self.tail)
+        if skipped > 0:
+            echo_line(click.style('... {} earlier lines'.format(skipped),
+                                  fg='white'))
+        for line in self.tail:
+            echo_line(line)
+        if self.path is not None:
+            echo_line(click.style('Full log: ' + self.path, fg='yellow'))
@@ -0,0 +1,354 @@
+"""
+Splitting a project's tests into shards (`this test --shards N` and
+`--shard I/N`), balanced by how long each test took in earlier runs.
+Tests are listed and selected with each test runner's own mechanism,
+such as pytest node IDs or cargo test filters.
+
+Durations are recorded in .this-test-durations.json in the project if
+it exists, so it can be committed for every CI node to split the tests
+the same way, or else in the cache. `--shard` only uses the project's
+file, as CI nodes with different caches would split the tests
+differently and run some tests twice and others never.
+"""
+
+from collections import OrderedDict
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import xml.etree.ElementTree as ElementTree
+
+import click
+
+from . import cache
+from .project import echo_line
+from .util import fail
+
+DURATIONS_FILENAME = '.this-test-durations.json'
+
+
+def parse_shard(ctx, param, value):
+    """Parse --shard I/N into (I, N), with I counted from 1"""
+    if value is None:
+        return None
+    match = re.match(r'^(\d+)/(\d+)$', value)
+    if match is None or not 1 <= int(match.group(1)) <= int(match.group(2)):
+        raise click.BadParameter('expected I/N, with I from 1 to N')
+    return int(match.group(1)), int(match.group(2))
+
+
+def balance(tests, durations, count):
+    """
+    Split tests into count shards with about the same total duration,
+    giving the longest tests out first, each to the shard with the least
+    to do. Tests without a recorded duration count as the average. The
+    split only depends on the arguments, and each shard keeps the order
+    of tests.
+    """
+    known = [durations[test] for test in tests if test in durations]
+    default = sum(known) / len(known) if known else 1
+    weights = {test: durations.get(test, default) for test in tests}
+
+    totals = [0] * count
+    assigned = {}
+    for test in sorted(tests, key=lambda test: (-weights[test], test)):
+        shard = min(range(count), key=lambda index: (totals[index], index))
+        totals[shard] += weights[test]
+        assigned[test] = shard
+    return [[test for test in tests if assigned[test] == index]
+            for index in range(count)], totals
+
+
+class Durations:
+    """Recorded test durations, in seconds, by runner and test"""
+
+    def __init__(self, project, shared_only=False):
+        self.path = project.path(DURATIONS_FILENAME)
+        self.cache_key = cache.cache_key(project.cwd)
+        self.shared = os.path.exists(self.path)
+        self.data = {}
+        if self.shared:
+            try:
+                with open(self.path) as f:
+                    self.data = json.load(f)
+            except (OSError, ValueError):
+                pass
+        elif not shared_only:
+            self.data = cache.load('test-durations', self.cache_key) or {}
+
+    def get(self, runner):
+        return self.data.get(runner, {})
+
+    def update(self, runner, durations):
+        self.data.setdefault(runner, {}).update(
+            {test: round(seconds, 3) for test, seconds in durations.items()})
+
+    def save(self):
+        if not self.shared:
+            cache.store('test-durations', self.cache_key, self.data)
+            return
+        tmp_path = '{}.{}.tmp'.format(self.path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            json.dump(self.data, f, indent=2, sort_keys=True)
+            f.write('\n')
+        os.replace(tmp_path, self.path)
+
+
+class TestRunner:
+    """
+    Lists and runs a project's tests. list() returns the test IDs, or
+    None in a dry run, and run(tests, report) runs some of them and
+    returns the exit code, writing durations() to the report file if the
+    runner can.
+    """
+
+    name = None
+
+    def __init__(self, project):
+        self.project = project
+
+    def durations(self, tests, report, elapsed):
+        """
+        Return {test: seconds} for a run of tests that took elapsed
+        seconds, sharing the time out evenly when the runner doesn't
+        report it per test
+        """
+        return {test: elapsed / len(tests) for test in tests}
+
+
+def listed(result, parse):
+    """Return the test IDs parsed from a (exit code, output) result"""
+    if result is None:
+        return None
+    returncode, lines = result
+    if returncode != 0:
+        fail('Failed to list the tests')
+    return parse(lines)
+
+
+class PytestRunner(TestRunner):
+    name = 'pytest'
+
+    def list(self):
+        def parse(lines):
+            # Node IDs come first, followed by a blank line and a summary
+            lines = lines[:lines.index('')] if '' in lines else lines
+            return [line for line in lines if '::' in line]
+
+        # Kept to pass whole files rather than each of their tests
+        self.all_tests = listed(self.project.env_cmd(
+            ['python', '-m', 'pytest', '--collect-only', '-q'],
+            capture=True), parse)
+        return self.all_tests
+
+    def run(self, tests, report):
+        return self.project.env_cmd(
+            ['python', '-m', 'pytest', '--junitxml=' + report] +
+            compress_node_ids(tests, self.all_tests))
+
+    def durations(self, tests, report, elapsed):
+        # The report has the class and name of each test case, as mangled
+        # from its node ID by pytest
+        by_case = {junit_case(test): test for test in tests}
+        durations = {}
+        for case in read_xml(report, 'testcase'):
+            test = by_case.get((case.get('classname'), case.get('name')))
+            if test is not None:
+                durations[test] = (durations.get(test, 0) +
+                                   float(case.get('time') or 0))
+        return durations
+
+
+def junit_case(node_id):
+    """Return the JUnit (classname, name) pytest reports a node ID as"""
+    parts = node_id.split('::')
+    module = parts[0].replace('/', '.')
+    if module.endswith('.py'):
+        module = module[:-3]
+    return '.'.join([module] + parts[1:-1]), parts[-1]
+
+
+def compress_node_ids(tests, all_tests):
+    """Replace the node IDs of every test in a file with the file"""
+    counts = {}
+    for test in all_tests:
+        filename = test.split('::')[0]
+        counts[filename] = counts.get(filename, 0) + 1
+    selected = {}
+    for test in tests:
+        filename = test.split('::')[0]
+        selected[filename] = selected.get(filename, 0) + 1
+
+    whole_files = {filename for filename, count in selected.items()
+                   if count == counts[filename]}
+
+    args = []
+    added = set()
+    for test in tests:
+        filename = test.split('::')[0]
+        if filename not in whole_files:
+            args.append(test)
+        elif filename not in added:
+            args.append(filename)
+            added.add(filename)
+    return args
+
+
+def read_xml(path, tag, namespace=''):
+    try:
+        return ElementTree.parse(path).getroot().iter(namespace + tag)
+    except (OSError, ElementTree.ParseError):
+        return []
+
+
+class CargoRunner(TestRunner):
+    name = 'cargo'
+
+    def cargo_test(self):
+        return ['cargo', 'test'] + self.project.jobs_arg(' --jobs {}').split()
+
+    def list(self):
+        def parse(lines):
+            # Tests with the same name in several test binaries run
+            # together, as cargo's filters can't tell them apart
+            return list(OrderedDict.fromkeys(
+                line[:-len(': test')] for line in lines
+                if line.endswith(': test')))
+        return listed(self.project.cmd(
+            self.cargo_test() + ['--', '--list'], capture=True), parse)
+
+    def run(self, tests, report):
+        return self.project.cmd(self.cargo_test() + ['--', '--exact'] + tests)
+
+
+class DotnetRunner(TestRunner):
+    name = 'dotnet'
+
+    TRX_NAMESPACE = '{http://microsoft.com/schemas/VisualStudio/TeamTest/2010}'
+
+    def list(self):
+        def parse(lines):
+            start = next((index + 1 for index, line in enumerate(lines)
+                          if 'Tests are available' in line), len(lines))
+            # The cases of a parameterized test run together
+            return list(OrderedDict.fromkeys(
+                line.strip().split('(')[0] for line in lines[start:]
+                if line.startswith('    ') and line.strip()))
+        return listed(self.project.cmd(['dotnet', 'test', '--list-tests'],
+                                       capture=True), parse)
+
+    def run(self, tests, report):
+        # Listed tests are usually fully qualified, but some adapters only
+        # list their method names
+        test_filter = '|'.join(
+            ('FullyQualifiedName=' if '.' in test else 'Name=') +
+            re.sub(r'([\\(),|&=!~])', r'\\\1', test) for test in tests)
+        return self.project.cmd(['dotnet', 'test', '--filter', test_filter,
+                                 '--logger', 'trx;LogFileName=' + report])
+
+    def durations(self, tests, report, elapsed):
+        tests = set(tests)
+        durations = {}
+        for result in read_xml(report, 'UnitTestResult', self.TRX_NAMESPACE):
+            test = result.get('testName', '').split('(')[0]
+            match = re.match(r'^(\d+):(\d+):([\d.]+)$',
+                             result.get('duration', ''))
+            if test in tests and match:
+                hours, minutes, seconds = match.groups()
+                durations[test] = (durations.get(test, 0) + int(hours) * 3600 +
+                                   int(minutes) * 60 + float(seconds))
+        return durations
+
+
+class JestRunner(TestRunner):
+    name = 'jest'
+
+    def list(self):
+        def parse(lines):
+            return [os.path.relpath(line, self.project.cwd) for line in lines
+                    if os.path.isabs(line) and os.path.isfile(line)]
+        return listed(self.project.npm_script('test', '--listTests',
+                                              capture=True), parse)
+
+    def run(self, tests, report):
+        return self.project.npm_script('test', '--json',
+                                       '--outputFile=' + report,
+                                       '--runTestsByPath', *tests)
+
+    def durations(self, tests, report, elapsed):
+        tests = set(tests)
+        try:
+            with open(report) as f:
+                results = json.load(f)['testResults']
+        except (OSError, ValueError, KeyError):
+            return {}
+        durations = {}
+        for result in results:
+            test = os.path.relpath(result.get('name', ''), self.project.cwd)
+            stats = result.get('perfStats') or {}
+            start = stats.get('start', result.get('startTime'))
+            end = stats.get('end', result.get('endTime'))
+            if test in tests and start is not None and end is not None:
+                durations[test] = (end - start) / 1000
+        return durations
+
+
+def run(project, shards=None, shard=None):
+    """
+    Run the project's tests split into shards: all of them in parallel
+    with shards, or only shard (index, count)
+    """
+    runner = project.test_runner()
+    if runner is None:
+        fail("Sorry! I don't know how to split your project's tests into "
+             "shards")
+    if hasattr(project, 'ensure_deps'):
+        project.ensure_deps()
+
+    tests = runner.list()
+    if tests is None:
+        # A dry run, so there are no tests to split
+        return
+
+    count = shards or shard[1]
+    durations = Durations(project, shared_only=shard is not None)
+    groups, totals = balance(tests, durations.get(runner.name), count)
+    indexes = range(count) if shard is None else [shard[0] - 1]
+
+    results = {}
+    lock = threading.Lock()
+    report_dir = tempfile.mkdtemp(prefix='this-shards-')
+
+    def job(index):
+        def run_shard():
+            tests = groups[index]
+            if not tests:
+                echo_line('No tests in this shard')
+                return
+            report = os.path.join(report_dir, 'shard-{}'.format(index))
+            start = time.time()
+            try:
+                runner.run(tests, report)
+            finally:
+                shard_durations = runner.durations(tests, report,
+                                                   time.time() - start)
+                with lock:
+                    results.update(shard_durations)
+        return ('shard {}/{}'.format(index + 1, count), run_shard)
+
+    for index in indexes:
+        estimate = (', about {:.0f}s'.format(totals[index])
+                    if durations.get(runner.name) else '')
+        click.secho('Shard {}/{}: {} tests{}'.format(
+            index + 1, count, len(groups[index]), estimate),
+            fg='blue', bold=True)
+    try:
+        project.parallel([job(index) for index in indexes])
+    finally:
+        shutil.rmtree(report_dir, ignore_errors=True)
+        if results:
+            durations.update(runner.name, results)
+            durations.save()
@@ -0,0 +1,160 @@
+"""
+Multi-step builds modeled as a graph of steps with declared inputs and
+outputs, so steps that are already up to date are skipped
+"""
+
+import glob
+import os
+
+from . import cache, plan
+from .deps import files_digest, pattern_paths
+
+
+class InputStamp:
+    """
+    Content hash of a step's inputs as of its last successful run,
+    stored in the cache. A step is up to date when its outputs exist and
+    its inputs hash the same.
+    """
+
+    def __init__(self, project, name, inputs, outputs):
+        self.project = project
+        self.inputs = inputs
+        self.outputs = outputs
+        self.path = cache.cache_path('steps', cache.cache_key(project.cwd,
+                                                              name))
+
+    def outdated(self):
+        if not all(self.project.exists(output) for output in self.outputs):
+            return True
+        try:
+            with open(self.path) as f:
+                return f.read().strip() != files_digest(self.project,
+                                                        self.inputs)
+        except OSError:
+            pass
+
+        # Outputs from before this step was tracked are adopted as long
+        # as they are newer than the inputs, like make would
+        if self.newest_input() > self.oldest_output():
+            return True
+        self.save()
+        return False
+
+    def paths(self):
+        """Paths whose stat stamps change whenever outdated() might"""
+        return pattern_paths(self.project, self.inputs) + [
+            self.project.path(output) for output in self.outputs] + [
+            self.path]
+
+    def newest_input(self):
+        return max([os.path.getmtime(path) for pattern in self.inputs
+                    for path in glob.glob(self.project.path(pattern))],
+                   default=0)
+
+    def oldest_output(self):
+        return min(os.path.getmtime(self.project.path(output))
+                   for output in self.outputs)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'w') as f:
+            f.write(files_digest(self.project, self.inputs) + '\n')
+
+
+class Step:
+    """
+    One step of a build. run() runs the step's commands and returns the
+    exit code of the last one (as Project.cmd does). The step is skipped
+    when its outputs are up to date with its inputs (file names or glob
+    patterns relative to the project), as tracked by stamp, which
+    defaults to an InputStamp. Steps without outputs always run, for
+    tools like make that do their own up-to-date checks.
+    """
+
+    def __init__(self, name, run, inputs=(), outputs=(), deps=(),
+                 stamp=None):
+        self.name = name
+        self.run = run
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.deps = list(deps)
+        self.stamp = stamp
+
+    def get_stamp(self, project):
+        if self.stamp is None:
+            self.stamp = InputStamp(project, self.name, self.inputs,
+                                    self.outputs)
+        return self.stamp
+
+    def outdated(self, project):
+        return not self.outputs or self.get_stamp(project).outdated()
+
+
+def all_steps(targets):
+    """Return targets and their dependencies in dependency order"""
+    steps = []
+
+    def visit(step):
+        if step not in steps:
+            for dep in step.deps:
+                visit(dep)
+            steps.append(step)
+
+    for step in targets:
+        visit(step)
+    return steps
+
+
+def run_steps(project, *targets):
+    """
+    Run the target steps and the steps they depend on, skipping those
+    that are up to date. Steps whose dependencies are done run in
+    parallel. A failed step stops the steps that depend on it.
+    """
+    pending = all_steps(targets)
+    done = set()
+    ran = set()
+
+    while pending:
+        ready = [step for step in pending
+                 if all(dep in done for dep in step.deps)]
+        if not ready:
+            # A dependency failed
+            return
+        pending = [step for step in pending if step not in ready]
+
+        # Outdated is checked once dependencies have run. A dry run
+        # doesn't change anything, so assume a dependency that would have
+        # run makes its dependents outdated too.
+        outdated = [step for step in ready
+                    if step.outdated(project) or
+                    (project.dry_run and any(dep in ran for dep in step.deps))]
+        done.update(step for step in ready if step not in outdated)
+
+        # A plan that runs a step changes whether it is up to date
+        for step in ready:
+            if not step.outputs:
+                continue
+            if step in outdated:
+                plan.uncacheable()
+            else:
+                plan.watch(step.get_stamp(project).paths())
+
+        results = {}
+
+        def job(step):
+            def run():
+                results[step] = step.run()
+            return (step.name, run)
+
+        project.parallel([job(step) for step in outdated])
+
+        for step in outdated:
+            ran.add(step)
+            # Failures have already been reported by Project.cmd
+            if results.get(step):
+                continue
+            done.add(step)
+            if results.get(step) == 0 and step.outputs:
+                step.get_stamp(project).save()
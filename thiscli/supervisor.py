@@ -0,0 +1,79 @@
+"""
+Running several long-running commands, like backend and frontend dev
+servers, side by side in one terminal
+"""
+
+from contextlib import contextmanager
+import functools
+import time
+
+import click
+
+from . import plan
+from .project import echo_line, exit_with
+
+# Seconds to wait before restarting a command that exited, doubling after
+# each restart up to the maximum
+RESTART_DELAY = 1
+MAX_RESTART_DELAY = 30
+
+# A command that ran at least this many seconds before exiting is
+# restarted after the initial delay again
+RESTART_RESET = 60
+
+
+class Supervisor:
+    """
+    Runs the commands recorded for each pane in parallel, with their
+    output prefixed by the pane's name. Ctrl-C stops every pane. With
+    restart, the last command of a pane (the server) is restarted when it
+    exits with an error; otherwise that stops the other panes too.
+    """
+
+    def __init__(self, project, restart=False):
+        self.project = project
+        self.restart = restart
+        self.panes = []
+
+    @contextmanager
+    def pane(self, name):
+        with plan.recorded(self.project.cwd) as recording:
+            yield
+        self.panes.append((name, [command.args()
+                                  for command in recording.commands]))
+
+    def run(self):
+        jobs = [(name, functools.partial(self.run_pane, commands))
+                for name, commands in self.panes if commands]
+        self.project.parallel(jobs, fail_fast=not self.restart)
+
+    def run_pane(self, commands):
+        *setup, server = commands
+        for command in setup:
+            if self.project.cmd(**command):
+                return
+
+        if not self.restart:
+            self.project.cmd(**server)
+            return
+
+        delay = RESTART_DELAY
+        while True:
+            start = time.monotonic()
+            # Run without Project.cmd(), so a crash the server is
+            # restarted after doesn't count as a failure
+            result = self.project.run_command(**server)
+            if result is None or result.ok:
+                return
+            returncode = result.returncode
+            if result.cancelled:
+                exit_with(returncode)
+                return
+
+            if time.monotonic() - start >= RESTART_RESET:
+                delay = RESTART_DELAY
+            echo_line(click.style('Exited with code {}, restarting in {}s'
+                                  .format(returncode, delay),
+                                  fg='yellow', bold=True))
+            time.sleep(delay)
+            delay = min(delay * 2, MAX_RESTART_DELAY)
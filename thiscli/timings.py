@@ -0,0 +1,147 @@
+"""
+Timings of the commands run by a project, recorded with `this --timings`
+as a Chrome trace-event file
+"""
+
+import os
+import sys
+import threading
+import time
+
+import click
+
+DEFAULT_TRACE_FILE = 'this-timings.json'
+
+# The Timings for this invocation, if enabled
+recorder = None
+
+
+def enable(path=None):
+    """Start timing commands, to write a trace to path (if given) later"""
+    global recorder
+    recorder = Timings(os.path.abspath(path) if path else None)
+    return recorder
+
+
+def wait(proc):
+    """
+    Wait for proc like proc.wait(), returning the resource usage of the
+    process and its reaped children, or None if it isn't available
+    """
+    try:
+        pid, status, usage = os.wait4(proc.pid, 0)
+    except ChildProcessError:
+        proc.wait()
+        return None
+    if os.WIFSIGNALED(status):
+        proc.returncode = -os.WTERMSIG(status)
+    else:
+        proc.returncode = os.WEXITSTATUS(status)
+    return usage
+
+
+def max_rss_kb(usage):
+    # ru_maxrss is in kilobytes on Linux but in bytes on macOS
+    if sys.platform == 'darwin':
+        return usage.ru_maxrss // 1024
+    return usage.ru_maxrss
+
+
+def job_name(prefix):
+    """Return the job name from a (possibly nested) parallel job prefix"""
+    parts = click.unstyle(prefix).split('|')
+    return ' / '.join(part.strip() for part in parts if part.strip())
+
+
+class Timings:
+    """
+    Wall time, CPU time and peak RSS of every command run by Project.cmd,
+    in the order they started
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.start = time.time()
+        self.commands = []
+        self.threads = {}
+        self.lock = threading.Lock()
+
+    def record(self, cmd, job, start, end, usage, returncode):
+        with self.lock:
+            thread = self.threads.setdefault(threading.get_ident(),
+                                             (len(self.threads) + 1, job))
+            self.commands.append(dict(
+                cmd=cmd, job=job, thread=thread[0], start=start, end=end,
+                user=usage.ru_utime if usage else None,
+                system=usage.ru_stime if usage else None,
+                max_rss_kb=max_rss_kb(usage) if usage else None,
+                returncode=returncode))
+
+    def trace(self):
+        """Return the timings as a Chrome trace-event object"""
+        pid = os.getpid()
+
+        def microseconds(seconds):
+            return int(round(seconds * 1000000))
+
+        events = [dict(name='thread_name', ph='M', pid=pid, tid=tid,
+                       args=dict(name=job or 'main'))
+                  for tid, job in sorted(self.threads.values())]
+        for command in self.commands:
+            events.append(dict(
+                name=command['cmd'], cat='command', ph='X', pid=pid,
+                tid=command['thread'],
+                ts=microseconds(command['start'] - self.start),
+                dur=microseconds(command['end'] - command['start']),
+                args=dict(job=command['job'],
+                          user_cpu_s=command['user'],
+                          system_cpu_s=command['system'],
+                          max_rss_kb=command['max_rss_kb'],
+                          exit_code=command['returncode'])))
+        return dict(traceEvents=events, displayTimeUnit='ms')
+
+    def write(self):
+        import json
+
+        with open(self.path, 'w') as f:
+            json.dump(self.trace(), f, indent=1)
+
+    def summary(self):
+        """Return the lines of a table summarizing each command"""
+        def seconds(value):
+            return '-' if value is None else '{:.2f}s'.format(value)
+
+        rows = [('Command', 'Wall', 'User', 'System', 'Max RSS', 'Exit')]
+        for command in self.commands:
+            cmd = command['cmd']
+            if command['job']:
+                cmd = command['job'] + ': ' + cmd
+            if len(cmd) > 50:
+                cmd = cmd[:47] + '...'
+            rss = command['max_rss_kb']
+            rows.append((cmd, seconds(command['end'] - command['start']),
+                         seconds(command['user']),
+                         seconds(command['system']),
+                         '-' if rss is None else '{:.1f}M'.format(rss / 1024),
+                         str(command['returncode'])))
+        rows.append(('Total', seconds(time.time() - self.start),
+                     '', '', '', ''))
+
+        widths = [max(len(row[index]) for row in rows)
+                  for index in range(len(rows[0]))]
+        return ['  '.join([row[0].ljust(widths[0])] +
+                          [value.rjust(width)
+                           for value, width in zip(row[1:], widths[1:])])
+                .rstrip() for row in rows]
+
+    def finish(self):
+        """Write the trace file and print the summary table"""
+        if not self.commands:
+            return
+        self.write()
+        click.echo(err=True)
+        lines = self.summary()
+        click.secho(lines[0], fg='white', bold=True, err=True)
+        for line in lines[1:]:
+            click.echo(line, err=True)
+        click.secho('Trace written to ' + self.path, fg='blue', err=True)
@@ -1,9 +1,9 @@
 import os
 import subprocess
 from contextlib import contextmanager
-from unittest.mock import patch
 
-from .project import Project, format_command
+from .project import format_command
+from . import plan
 
 
 def echo(cmd, cwd, env, env_echo):
@@ -28,23 +28,13 @@ class Tmux:
         self.panes = []
 
     @contextmanager
-    def pane(self):
-        commands = []
-        root_cwd = self.cwd
-
-        def run_command(self, cmd, cwd=None, env=None, env_echo=None,
-                        echo=True, shell=None):
-            if cwd:
-                cwd = self.path(cwd)
-            else:
-                cwd = self.cwd
-            cwd = os.path.relpath(cwd, root_cwd)
-            if cwd == '.':
-                cwd = None
-            commands.append(dict(cmd=cmd, cwd=cwd, env=env, env_echo=env_echo))
-
-        with patch.object(Project, 'cmd', new=run_command):
+    def pane(self, name=None):
+        with plan.recorded(self.cwd) as recording:
             yield
+
+        commands = [command.args() for command in recording.commands]
+        for command in commands:
+            del command['shell']
         self.panes.append(commands)
 
     def run(self):
@@ -1,35 +1,121 @@
+import fnmatch
+import math
 import os
-import shutil
 import sys
 import click
 
 
-def walk_up(bottom):
+def find_markers(bottom, marker_sets, stop_at='.git', visited=None):
     """
-    mimic os.walk, but walk 'up'
-    instead of down the directory tree
+    Walk up from bottom once, probing each directory for the sets of
+    marker filenames in marker_sets, and return (index, directory) for
+    the first set (in order) found in any directory, preferring the
+    nearest directory. Returns None if no set matched before reaching
+    a directory containing stop_at or the filesystem root.
+
+    Literal markers are probed with a single stat each; a directory is
+    only listed when a glob marker still needs to be matched. Every
+    directory probed is appended to visited, if given.
     """
 
-    while True:
-        bottom = os.path.realpath(bottom)
-
-        yield bottom, os.listdir(bottom)
-
-        new_path = os.path.realpath(os.path.join(bottom, '..'))
-
-        if new_path == bottom:
-            return
-        bottom = new_path
+    match = None
+    candidates = len(marker_sets)
+    path = os.path.realpath(bottom)
+
+    while candidates:
+        listing = None
+        if visited is not None:
+            visited.append(path)
+
+        for index, markers in enumerate(marker_sets[:candidates]):
+            for marker in markers:
+                if any(char in marker for char in '*?['):
+                    if listing is None:
+                        listing = os.listdir(path)
+                    found = bool(fnmatch.filter(listing, marker))
+                else:
+                    found = os.path.exists(os.path.join(path, marker))
+                if found:
+                    break
+            else:
+                continue
+
+            # Later sets have lower priority, so only keep probing for
+            # the ones before this match in directories further up
+            match = (index, path)
+            candidates = index
+            break
+
+        if os.path.exists(os.path.join(path, stop_at)):
+            break
+
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+
+    return match
 
 
 def has_command(cmd):
+    import shutil
     return shutil.which(cmd) is not None
 
 
-def needs_update(src, dest):
-    if not os.path.exists(dest):
-        return True
-    return os.path.getmtime(src) > os.path.getmtime(dest)
+def cgroup_cpu_limit():
+    """
+    Return the number of CPUs the cgroup quotas of this process (as set
+    for containers) allow it to use, or None if it isn't limited
+    """
+    limits = []
+
+    # cgroup v2 applies the quota of every cgroup up the hierarchy
+    try:
+        with open('/proc/self/cgroup') as f:
+            paths = [line.rstrip('\n').split(':', 2)[2] for line in f
+                     if line.startswith('0::')]
+    except (OSError, IndexError):
+        paths = []
+    for path in paths:
+        path = os.path.join('/sys/fs/cgroup', path.lstrip('/'))
+        while path.startswith('/sys/fs/cgroup'):
+            try:
+                with open(os.path.join(path, 'cpu.max')) as f:
+                    quota, period = f.read().split()
+                if quota != 'max':
+                    limits.append(int(quota) / int(period))
+            except (OSError, ValueError):
+                pass
+            path = os.path.dirname(path)
+
+    # cgroup v1
+    try:
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+            quota = int(f.read())
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+            period = int(f.read())
+        if quota > 0 and period > 0:
+            limits.append(quota / period)
+    except (OSError, ValueError):
+        pass
+
+    return max(1, math.ceil(min(limits))) if limits else None
+
+
+def available_cpus():
+    """
+    Return (the number of CPUs this process can use, whether that is
+    fewer than the machine has), respecting CPU affinity and cgroup quotas
+    """
+    total = os.cpu_count() or 1
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = total
+    limit = cgroup_cpu_limit()
+    if limit is not None:
+        cpus = min(cpus, limit)
+    return cpus, cpus < total
 
 
 def fail(message):
@@ -0,0 +1,243 @@
+"""
+Watch mode (`--watch`), running an action again whenever files in the
+project change. Changes are noticed with inotify where available, or
+else by polling.
+"""
+
+import os
+import select
+import threading
+import time
+
+import click
+
+from . import cache, inotify
+from .monorepo import SKIPPED_DIRS, GitIgnore
+from .project import JobGroup, local, system_exit_code
+
+# Seconds without further changes that end a burst of changes, and the
+# longest a burst may put off the next run
+DEBOUNCE = 0.2
+MAX_DEBOUNCE = 2
+
+# Seconds between scans when polling
+POLL_INTERVAL = 0.5
+
+# Changes to the files in a watched directory
+CHANGES = (inotify.IN_CLOSE_WRITE | inotify.IN_CREATE | inotify.IN_DELETE |
+           inotify.IN_MOVED_FROM | inotify.IN_MOVED_TO | inotify.IN_ONLYDIR)
+
+# Directories with dependencies, build output or tool caches, in
+# addition to those never scanned for projects
+IGNORED_DIRS = SKIPPED_DIRS | {'dist', '.tox', '.pytest_cache',
+                               '.mypy_cache'}
+
+
+def ignored_name(name):
+    # Editor swap and backup files, and Python package metadata
+    return (name.endswith(('~', '.swp', '.swx', '.egg-info')) or
+            name.startswith('.#'))
+
+
+def watched_dirs(root, relpath='.', ignore=None):
+    """
+    Yield (path, ignore) for the directory at relpath in root and each
+    directory below it that isn't ignored, where ignore has the
+    .gitignore rules that apply in it
+    """
+    pending = [(relpath, ignore or GitIgnore())]
+    while pending:
+        relpath, ignore = pending.pop()
+        path = os.path.normpath(os.path.join(root, relpath))
+        ignore = ignore.extend(path, relpath)
+        yield path, ignore
+        try:
+            entries = list(os.scandir(path))
+        except OSError:
+            continue
+        for entry in entries:
+            subpath = os.path.normpath(os.path.join(relpath, entry.name))
+            if (entry.name in IGNORED_DIRS or ignored_name(entry.name) or
+                    not entry.is_dir(follow_symlinks=False) or
+                    ignore.ignores(subpath, is_dir=True)):
+                continue
+            pending.append((subpath, ignore))
+
+
+class PollingWatcher:
+    """Notices changes by comparing the stat stamps of every file"""
+
+    def __init__(self, root):
+        self.root = root
+        self.stamps = self.scan()
+
+    def scan(self):
+        paths = []
+        for path, ignore in watched_dirs(self.root):
+            try:
+                entries = list(os.scandir(path))
+            except OSError:
+                continue
+            paths += [entry.path for entry in entries
+                      if entry.is_file() and not ignored_name(entry.name) and
+                      not ignore.ignores(os.path.relpath(entry.path,
+                                                         self.root),
+                                         is_dir=False)]
+        return cache.stat_stamps(paths)
+
+    def changes(self, timeout=None):
+        """Wait up to timeout seconds for changes, returning their paths"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            stamps = self.scan()
+            changed = {path for path in set(stamps) | set(self.stamps)
+                       if stamps.get(path) != self.stamps.get(path)}
+            self.stamps = stamps
+            if changed:
+                return changed
+            if deadline is not None and time.monotonic() >= deadline:
+                return set()
+            time.sleep(POLL_INTERVAL if deadline is None else
+                       min(POLL_INTERVAL, max(0, deadline - time.monotonic())))
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """Notices changes with an inotify watch on every directory"""
+
+    def __init__(self, root):
+        self.root = root
+        self.inotify = inotify.Inotify()
+        # The .gitignore rules that apply in each watched directory
+        self.ignores = {}
+        self.add('.')
+
+    def add(self, relpath, ignore=None):
+        """Watch the directory at relpath and every directory below it"""
+        for path, dir_ignore in watched_dirs(self.root, relpath, ignore):
+            try:
+                self.inotify.add_watch(path, CHANGES)
+            except OSError:
+                continue
+            self.ignores[path] = dir_ignore
+
+    def changes(self, timeout=None):
+        """Wait up to timeout seconds for changes, returning their paths"""
+        changed = set()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not changed:
+            remaining = (None if deadline is None else
+                         max(0, deadline - time.monotonic()))
+            if not select.select([self.inotify], [], [], remaining)[0]:
+                return changed
+
+            for directory, mask, name in self.inotify.read():
+                if mask & inotify.IN_Q_OVERFLOW:
+                    # Events were lost, so something changed somewhere
+                    changed.add(self.root)
+                    continue
+                ignore = self.ignores.get(directory)
+                if ignore is None or not name or ignored_name(name):
+                    continue
+                path = os.path.join(directory, name)
+                relpath = os.path.relpath(path, self.root)
+                is_dir = os.path.isdir(path)
+                if ((is_dir and name in IGNORED_DIRS) or
+                        ignore.ignores(relpath, is_dir)):
+                    continue
+                if is_dir and mask & (inotify.IN_CREATE |
+                                      inotify.IN_MOVED_TO):
+                    self.add(relpath, ignore)
+                if name == '.gitignore':
+                    # Start over with the new rules
+                    self.ignores = {}
+                    self.add('.')
+                changed.add(path)
+        return changed
+
+    def close(self):
+        self.inotify.close()
+
+
+def watcher(root):
+    try:
+        return InotifyWatcher(root)
+    except OSError:
+        return PollingWatcher(root)
+
+
+def wait_for_changes(watcher):
+    """
+    Wait for files to change and return their paths, once the burst of
+    changes that an editor save or a checkout causes is over
+    """
+    changed = watcher.changes()
+    deadline = time.monotonic() + MAX_DEBOUNCE
+    while time.monotonic() < deadline:
+        more = watcher.changes(DEBOUNCE)
+        if not more:
+            break
+        changed |= more
+    return changed
+
+
+def run_once(project, run, group):
+    """Run the action, with its commands cancelled along with group"""
+    local.group = group
+    try:
+        run(project)
+        return 0
+    except SystemExit as exit:
+        return system_exit_code(exit)
+    finally:
+        del local.group
+
+
+def watch(project, run, find):
+    """
+    Run run(project), and again whenever files change, cancelling a run
+    still in progress. The project is found again with find() when its
+    files (see Project.cache_paths()) change.
+    """
+    files = watcher(project.cwd)
+    try:
+        while True:
+            stamps = cache.stat_stamps(project.cache_paths())
+            group = JobGroup(fail_fast=True)
+            changed = set()
+
+            def wait():
+                changed.update(wait_for_changes(files))
+                group.cancel()
+
+            thread = threading.Thread(target=wait, daemon=True)
+            thread.start()
+            exit_code = run_once(project, run, group)
+
+            if group.cancelled:
+                click.secho('Cancelled, as files changed', fg='yellow',
+                            bold=True)
+            else:
+                if exit_code == 0:
+                    click.secho('Succeeded', fg='green', bold=True)
+                else:
+                    click.secho('Failed with exit code {}'.format(exit_code),
+                                fg='red', bold=True)
+                click.secho('Watching for changes (Ctrl-C to stop)',
+                            fg='white')
+            thread.join()
+
+            names = sorted(os.path.relpath(path, project.cwd)
+                           for path in changed)
+            click.echo()
+            click.secho('Changed: ' + ', '.join(names[:5]) +
+                        (' and {} more'.format(len(names) - 5)
+                         if len(names) > 5 else ''), fg='blue', bold=True)
+            if not cache.stamps_valid(stamps):
+                project = find()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        files.close()
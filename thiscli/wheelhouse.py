@@ -0,0 +1,200 @@
+"""
+Machine-wide caches for provisioning virtualenvs: a wheelhouse of built
+wheels that pinned requirements are installed from offline, and
+templates of fully installed virtualenvs, keyed by the requirements and
+the interpreter, that new virtualenvs are cloned from by hardlinking.
+
+Both are only used for requirements that don't refer to local paths,
+such as `-e .`, as those would differ between checkouts.
+"""
+
+import os
+import re
+import shutil
+
+from . import cache
+from .deps import files_digest
+
+# Most virtualenv templates kept, dropping the least recently used
+MAX_TEMPLATES = 8
+
+LOCAL_REQUIREMENT = re.compile(r'^\s*(-e|--editable|\.|/|~|file:)|@\s*file:')
+
+
+def wheelhouse_path():
+    return cache.cache_path('wheelhouse')
+
+
+def shareable(project, files):
+    """Whether requirements files only have requirements from an index"""
+    for filename in files:
+        try:
+            with open(project.path(filename)) as f:
+                if any(LOCAL_REQUIREMENT.search(line) for line in f):
+                    return False
+        except OSError:
+            return False
+    return True
+
+
+def virtualenv_python():
+    """
+    Return the interpreter `virtualenv` creates virtualenvs for, which is
+    the one it runs with, or None if it isn't found
+    """
+    executable = shutil.which('virtualenv')
+    if executable is None:
+        return None
+    try:
+        with open(executable, 'rb') as f:
+            shebang = f.readline().decode('utf-8', 'replace')
+    except OSError:
+        return None
+    if not shebang.startswith('#!'):
+        return None
+    args = shebang[2:].split()
+    if args and os.path.basename(args[0]) == 'env':
+        args = args[1:]
+    python = args and shutil.which(args[0])
+    return os.path.realpath(python) if python else None
+
+
+def requirements_key(project, kind, files):
+    """
+    Key for what installing the requirements files in a new virtualenv
+    produces, or None if it can't be shared
+    """
+    python = virtualenv_python()
+    if python is None or not shareable(project, files):
+        return None
+    return cache.cache_key(kind, files_digest(project, files), python,
+                           cache.stat_stamp(python))
+
+
+class Wheelhouse:
+    """
+    The machine-wide wheelhouse, for the requirements with a given
+    requirements_key(). Once `pip wheel` has built wheels for all of
+    them, they are installed without going to the index.
+    """
+
+    def __init__(self, key):
+        self.path = wheelhouse_path()
+        self.marker = cache.cache_path('wheelhouse-pins', key)
+
+    def complete(self):
+        return os.path.exists(self.marker)
+
+    def set_complete(self, complete):
+        if not complete:
+            if os.path.exists(self.marker):
+                os.remove(self.marker)
+            return
+        os.makedirs(os.path.dirname(self.marker), exist_ok=True)
+        with open(self.marker, 'w'):
+            pass
+
+    def build_args(self):
+        # Wheels already in the wheelhouse aren't downloaded or built again
+        return '--wheel-dir {0} --find-links {0}'.format(self.path)
+
+    def install_args(self):
+        return '--no-index --find-links ' + self.path
+
+
+def clone_venv(src, dst, final_path=None):
+    """
+    Clone the virtualenv at src to dst, hardlinking the installed
+    packages and rewriting the paths in its scripts and configuration to
+    final_path, which defaults to dst, for a clone that will be moved
+    """
+    old = os.fsencode(src)
+    new = os.fsencode(final_path or dst)
+    for dirpath, dirnames, filenames in os.walk(src):
+        relpath = os.path.relpath(dirpath, src)
+        target_dir = os.path.normpath(os.path.join(dst, relpath))
+        os.makedirs(target_dir, exist_ok=True)
+        top = relpath.split(os.sep)[0]
+        rewrite = relpath == '.' or top in ('bin', 'Scripts')
+
+        for name in dirnames + filenames:
+            path = os.path.join(dirpath, name)
+            target = os.path.join(target_dir, name)
+            if os.path.islink(path):
+                link = os.readlink(path)
+                if link.startswith(src + os.sep):
+                    link = (final_path or dst) + link[len(src):]
+                os.symlink(link, target)
+            elif name in dirnames:
+                continue
+            elif rewrite:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                with open(target, 'wb') as f:
+                    f.write(data.replace(old, new))
+                shutil.copymode(path, target)
+            else:
+                try:
+                    os.link(path, target)
+                except OSError:
+                    shutil.copy2(path, target)
+        # Symlinked directories (like lib64) were recreated as links
+        dirnames[:] = [name for name in dirnames
+                       if not os.path.islink(os.path.join(dirpath, name))]
+
+
+def replace_with_clone(src, dst):
+    """Clone the virtualenv at src to dst, replacing dst atomically"""
+    tmp_path = '{}.{}.tmp'.format(dst, os.getpid())
+    try:
+        clone_venv(src, tmp_path, final_path=dst)
+        if os.path.lexists(dst):
+            shutil.rmtree(dst)
+        os.rename(tmp_path, dst)
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+class VenvTemplates:
+    """Fully installed virtualenvs, by requirements_key()"""
+
+    def __init__(self):
+        self.root = cache.cache_path('venvs')
+
+    def path(self, key):
+        return os.path.join(self.root, key)
+
+    def materialize(self, key, venv):
+        """
+        Create the virtualenv at venv from the template for key,
+        returning whether there was one
+        """
+        template = self.path(key)
+        if not os.path.isfile(os.path.join(template, 'pyvenv.cfg')):
+            return False
+        # The modification time records when it was last used
+        os.utime(template)
+        replace_with_clone(template, venv)
+        return True
+
+    def save(self, key, venv):
+        """
+        Keep a copy of the virtualenv at venv as the template for key, if
+        it can be copied
+        """
+        if not os.path.isfile(os.path.join(venv, 'pyvenv.cfg')):
+            return
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            replace_with_clone(venv, self.path(key))
+            self.evict()
+        except OSError:
+            pass
+
+    def evict(self):
+        templates = []
+        for entry in os.scandir(self.root):
+            if entry.is_dir() and not entry.name.endswith('.tmp'):
+                templates.append((entry.stat().st_mtime, entry.path))
+        for mtime, path in sorted(templates, reverse=True)[MAX_TEMPLATES:]:
+            shutil.rmtree(path, ignore_errors=True)